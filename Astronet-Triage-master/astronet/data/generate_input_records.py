@@ -77,15 +77,21 @@ from __future__ import division
 from __future__ import print_function
 
 import argparse
+import collections
+from concurrent import futures
 import multiprocessing
 import os
 import sys
+import time as time_lib
 
 import numpy as np
 import pandas as pd
 import tensorflow as tf
 
 from astronet.data import preprocess
+from light_curve_util import light_curve_cache
+from light_curve_util import periodic_event
+from light_curve_util import tess_index
 from light_curve_util.median_filter import SparseLightCurveError
 import warnings
 
@@ -144,6 +150,56 @@ parser.add_argument(
     default=5,
     help="Number of subprocesses for processing the TCEs in parallel.")
 
+parser.add_argument(
+    "--gp_detrend",
+    action='store_true',
+    help="If specified, the stellar variability is fit by a Gaussian process "
+    "out of transit and subtracted from the light curve before the views are "
+    "generated.")
+
+parser.add_argument(
+    "--gp_timescale",
+    type=float,
+    default=1.0,
+    help="Correlation timescale (in days) of the --gp_detrend Gaussian process.")
+
+parser.add_argument(
+    "--cache_dir",
+    type=str,
+    default=None,
+    help="If specified, a local directory in which decoded and cleaned light "
+    "curves are cached between runs.")
+
+parser.add_argument(
+    "--cache_max_gb",
+    type=float,
+    default=10,
+    help="Maximum size of the light curve cache in --cache_dir, in GB.")
+
+parser.add_argument(
+    "--index_file",
+    type=str,
+    default=None,
+    help="If specified, light curve files are found through an index of "
+    "--tess_data_dir persisted in this file, instead of checking for each "
+    "expected filename. The index is built on the first run and refreshed "
+    "incrementally when new sector directories appear.")
+
+parser.add_argument(
+    "--stitch_sectors",
+    action='store_true',
+    help="If specified, the light curve of a multi-sector TCE (is_multi) is "
+    "stitched from the per-sector files of sectors 1 to Sectors, read "
+    "concurrently, instead of being trimmed to the latest sector. Sectors "
+    "without a file are skipped. Best used with --index_file.")
+
+parser.add_argument(
+    "--num_prefetch",
+    type=int,
+    default=4,
+    help="Number of light curves each worker process reads ahead on background "
+    "threads while the current TCE is processed. 0 disables prefetching.")
+
 parser.add_argument(
     "--make_test_set",
     action='store_true',
@@ -176,11 +232,105 @@ def _set_int64_feature(ex, name, value):
   ex.features.feature[name].int64_list.value.extend([int(v) for v in value])
 
 
-def _process_tce(tce):
+def _read_light_curve(tce, cache=None, index=None):
+  """Reads the light curve for a TESS TCE.
+
+  Args:
+    tce: Row of the input TCE table.
+    cache: Optional light_curve_cache.LightCurveCache of decoded light curves.
+    index: Optional tess_index.TessIndex of FLAGS.tess_data_dir.
+
+  Returns:
+    The arrays returned by preprocess.read_and_process_light_curve(), stitched
+    over the sectors if FLAGS.stitch_sectors is set and the TCE is multi-sector.
+  """
+  kwargs = dict(cache=cache, index=index, gp_detrend=FLAGS.gp_detrend,
+                events=[periodic_event.Event(tce.Period, tce.Duration, tce.Epoc)],
+                gp_timescale=FLAGS.gp_timescale)
+  if FLAGS.stitch_sectors and tce.is_multi:
+    return preprocess.read_and_process_multi_sector_light_curve(
+        tce.tic_id, FLAGS.tess_data_dir, range(1, tce.Sectors + 1), **kwargs)
+  return preprocess.read_and_process_light_curve(tce.tic_id, FLAGS.tess_data_dir, sector=tce.Sectors,
+                                                 is_multi=tce.is_multi, **kwargs)
+
+
+class _LightCurvePrefetcher(object):
+  """Reads the light curves of a sequence of TCEs ahead on background threads.
+
+  Iterating yields (tce, future) pairs in the original order. The future is
+  already done, so future.result() returns the light curve (or raises the
+  error from reading it) without blocking. Up to num_prefetch light curves are
+  queued while the current one is processed.
+  """
+
+  def __init__(self, tces, num_prefetch, cache=None, index=None):
+    self._tces = iter(tces)
+    self._cache = cache
+    self._index = index
+    self._executor = futures.ThreadPoolExecutor(max_workers=num_prefetch)
+    self._pending = collections.deque()
+    for _ in range(num_prefetch):
+      self._submit_next()
+
+    self.num_waits = 0
+    self.total_queue_depth = 0  # Summed over waits; see mean_queue_depth.
+    self.stall_secs = 0.0  # Time spent waiting for light curves to be read.
+
+  @property
+  def mean_queue_depth(self):
+    """Mean number of queued light curves already read when one is needed.
+
+    Close to 0 when reading is the bottleneck, close to num_prefetch when
+    processing is.
+    """
+    return self.total_queue_depth / max(self.num_waits, 1)
+
+  def _submit_next(self):
+    tce = next(self._tces, None)
+    if tce is not None:
+      self._pending.append((tce, self._executor.submit(
+          _read_light_curve, tce, self._cache, self._index)))
+
+  def close(self):
+    """Cancels the queued reads and shuts down the background threads.
+
+    Reads already in progress are not interrupted, but their results are
+    discarded.
+    """
+    for _, future in self._pending:
+      future.cancel()
+    self._pending.clear()
+    self._executor.shutdown(wait=False)
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    if not self._pending:
+      self._executor.shutdown()
+      raise StopIteration
+    self.total_queue_depth += sum(f.done() for _, f in self._pending)
+    self.num_waits += 1
+
+    tce, future = self._pending.popleft()
+    start = time_lib.time()
+    futures.wait([future])
+    self.stall_secs += time_lib.time() - start
+    self._submit_next()
+    return tce, future
+
+  next = __next__  # Python 2.
+
+
+def _process_tce(tce, cache=None, index=None, light_curve=None):
   """Processes the light curve for a TESS TCE and returns an Example proto.
 
   Args:
     tce: Row of the input TCE table.
+    cache: Optional light_curve_cache.LightCurveCache of decoded light curves.
+    index: Optional tess_index.TessIndex of FLAGS.tess_data_dir.
+    light_curve: Optional light curve already returned by _read_light_curve().
+        If None, it is read here.
 
   Returns:
     A tensorflow.train.Example proto containing TCE features.
@@ -189,17 +339,19 @@ def _process_tce(tce):
     IOError: If the light curve files for this TESS ID cannot be found.
   """
   # Read and process the light curve.
+  if light_curve is None:
+    light_curve = _read_light_curve(tce, cache, index)
 
-
-  time, flux = preprocess.read_and_process_light_curve(tce.tic_id, FLAGS.tess_data_dir, sector=tce.Sectors, is_multi=tce.is_multi)
+  time, flux = light_curve
   time, flux = preprocess.phase_fold_and_sort_light_curve(
     time, flux, tce.Period, tce.Epoc)
 
   # Generate the local and global views.
   try:
-    g_v = preprocess.global_view(time, flux, tce.Period)
-    l_v = preprocess.local_view(time, flux, tce.Period,
-                                     tce.Duration)
+    views = preprocess.generate_views(time, flux, {
+        "global_view": preprocess.global_view_spec(tce.Period),
+        "local_view": preprocess.local_view_spec(tce.Period, tce.Duration),
+    })
     # secondary_view = preprocess.secondary_view(time, flux, tce.Period, tce.Duration)
   except RuntimeWarning:
       tf.logging.info('Too many invalid values in TIC %s', tce.tic_id)
@@ -209,8 +361,8 @@ def _process_tce(tce):
   ex = tf.train.Example()
 
   # Set time series features.
-  _set_float_feature(ex, "global_view", g_v)
-  _set_float_feature(ex, "local_view", l_v)
+  _set_float_feature(ex, "global_view", views["global_view"])
+  _set_float_feature(ex, "local_view", views["local_view"])
   # _set_float_feature(ex, "secondary_view", secondary_view)
 
   # Set other columns.
@@ -239,26 +391,66 @@ def _process_file_shard(tce_table, file_name):
   tf.logging.info("%s: Processing %d items in shard %s", process_name,
                   shard_size, shard_name)
 
-  with tf.io.TFRecordWriter(file_name) as writer:
-    num_processed = 0
-    num_skipped = 0
-    for _, tce in tce_table.iterrows():
-        # skip light curves with no points in given time range
-      try:
-        example = _process_tce(tce)
-      except (IOError, preprocess.EmptyLightCurveError, SparseLightCurveError):
-        num_skipped += 1
-        continue
-      if example is not None:
-        writer.write(example.SerializeToString())
-
-      num_processed += 1
-      if not num_processed % 10:
-        tf.logging.info("%s: Processed %d/%d items in shard %s", process_name,
-                        num_processed, shard_size, shard_name)
+  cache = None
+  if FLAGS.cache_dir:
+    cache = light_curve_cache.LightCurveCache(
+        FLAGS.cache_dir, max_bytes=int(FLAGS.cache_max_gb * 1024**3))
+
+  index = None
+  if FLAGS.index_file:
+    index = tess_index.TessIndex(FLAGS.tess_data_dir, FLAGS.index_file)
+
+  tces = (tce for _, tce in tce_table.iterrows())
+  prefetcher = None
+  if FLAGS.num_prefetch > 0:
+    prefetcher = _LightCurvePrefetcher(tces, FLAGS.num_prefetch, cache, index)
+    tces = prefetcher
+  else:
+    tces = ((tce, None) for tce in tces)
+
+  start = time_lib.time()
+  try:
+    with tf.io.TFRecordWriter(file_name) as writer:
+      num_processed = 0
+      num_skipped = 0
+      for tce, light_curve in tces:
+          # skip light curves with no points in given time range
+        try:
+          if light_curve is not None:
+            light_curve = light_curve.result()
+          example = _process_tce(tce, cache, index, light_curve)
+        except (IOError, preprocess.EmptyLightCurveError, SparseLightCurveError):
+          num_skipped += 1
+          continue
+        if example is not None:
+          writer.write(example.SerializeToString())
+
+        num_processed += 1
+        if not num_processed % 10:
+          tf.logging.info("%s: Processed %d/%d items in shard %s", process_name,
+                          num_processed, shard_size, shard_name)
+          if prefetcher is not None:
+            tf.logging.info("%s: Prefetch queue depth %.1f/%d, stalled %.1fs", process_name,
+                            prefetcher.mean_queue_depth, FLAGS.num_prefetch, prefetcher.stall_secs)
+  finally:
+    # Stop reading ahead if processing the shard failed.
+    if prefetcher is not None:
+      prefetcher.close()
 
   tf.logging.info("%s: Wrote %d/%d items in shard %s. %d skipped.", process_name, num_processed, shard_size,
                   shard_name, num_skipped)
+  if prefetcher is not None:
+    tf.logging.info("%s: Mean prefetch queue depth %.1f/%d. Stalled on reads for %.1fs of %.1fs in shard %s.",
+                    process_name, prefetcher.mean_queue_depth, FLAGS.num_prefetch, prefetcher.stall_secs,
+                    time_lib.time() - start, shard_name)
+
+
+def _build_index():
+  """Builds or refreshes the persisted file index before the shards read it."""
+  if FLAGS.index_file:
+    index = tess_index.TessIndex(FLAGS.tess_data_dir, FLAGS.index_file)
+    tf.logging.info("Indexed %d light curve files in %s", len(index),
+                    FLAGS.tess_data_dir)
 
 
 def create_input_list():
@@ -314,6 +506,7 @@ def make_eval_set(argv):
 
     # Make the output directory if it doesn't already exist.
     tf.gfile.MakeDirs(FLAGS.output_dir)
+    _build_index()
 
     # create input table containing only sector 4 candidates
     tce_table = create_input_list()
@@ -366,6 +559,7 @@ def main(argv):
 
   # Make the output directory if it doesn't already exist.
   tf.gfile.MakeDirs(FLAGS.output_dir)
+  _build_index()
 
   tce_table = create_input_list()
   num_tces = len(tce_table)
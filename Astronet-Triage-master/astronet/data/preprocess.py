@@ -18,13 +18,23 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+from concurrent import futures
+
 import numpy as np
 import tensorflow as tf
 
+from light_curve_util import gaussian_process
 from light_curve_util import tess_io
 from light_curve_util import median_filter
+from light_curve_util import robust_stats
 from light_curve_util import util
-from statsmodels.robust import scale
+
+try:
+  # C++ median filter; built with `python setup.py build_ext --inplace`.
+  from light_curve_util.cc.python import median_filter as cc_median_filter
+except ImportError:
+  cc_median_filter = None
 
 
 # use this to trim multi-sector light curves to just the latest sector
@@ -36,13 +46,25 @@ class EmptyLightCurveError(Exception):
     pass
 
 
-def read_and_process_light_curve(tic, tess_data_dir, sector=43, injected=False, inject_dir='/pdo/users/yuliang', is_multi=False):
+def read_and_process_light_curve(tic, tess_data_dir, sector=43, injected=False, inject_dir='/pdo/users/yuliang', is_multi=False,
+                                 cache=None, index=None, gp_detrend=False, events=None, gp_timescale=1.0):
   """Reads an already detrended light curve.
 
   Args:
     tic: TIC id of the target star.
     tess_data_dir: Base directory containing TESS data. See
         tess_io.tess_filenames().
+    cache: Optional light_curve_cache.LightCurveCache. If given, the decoded and
+        cleaned arrays are looked up there before reading the FITS file, and
+        stored there after a miss.
+    index: Optional tess_index.TessIndex used to find the light curve file. See
+        tess_io.tess_filenames().
+    gp_detrend: Whether to subtract the stellar variability fit by a Gaussian
+        process from the flux. See detrend_with_gp(). The cache stores the
+        light curve before detrending.
+    events: Optional list of periodic_event.Event excluded from the Gaussian
+        process fit, e.g. the transits of the TCE.
+    gp_timescale: Correlation timescale of the Gaussian process, in days.
 
   Returns:
     time: 1D NumPy array; the time values of the light curve.
@@ -53,32 +75,138 @@ def read_and_process_light_curve(tic, tess_data_dir, sector=43, injected=False,
     EmptyLightCurveError: If light curve has no points in given time range.
   """
   # Read the TESS light curve.
-  file_names = tess_io.tess_filenames(tic, tess_data_dir, sector=sector, injected=injected, inject_dir=inject_dir)
+  file_names = tess_io.tess_filenames(tic, tess_data_dir, sector=sector, injected=injected, inject_dir=inject_dir,
+                                      index=index)
   if not file_names:
     tf.logging.info("Failed to find light curve files in %s for TIC ID %s" % (tess_data_dir, tic))
     raise IOError
 
-  all_time, all_mag = tess_io.read_tess_light_curve(file_names, invert=True)
+  cached = None
+  if cache is not None:
+    params = {"sector": int(sector), "is_multi": bool(is_multi)}
+    cached = cache.get(file_names, params)
+
+  if cached is not None:
+    all_time, all_flux = cached["time"], cached["flux"]
+  else:
+    all_time, all_flux = _read_and_clean_light_curve(tic, file_names, sector, is_multi)
+    if cache is not None:
+      cache.put(file_names, params, {"time": all_time, "flux": all_flux})
+
+  if gp_detrend:
+    all_flux, = detrend_with_gp(all_time, [all_flux], events, gp_timescale)
+  return all_time, all_flux
+
+
+def _read_and_clean_light_curve(tic, file_names, sector, is_multi):
+  """Reads a light curve file, removes outliers and normalizes the flux."""
+  # Multi-sector light curves are trimmed to the latest sector while reading,
+  # so earlier sectors are never decoded or cleaned.
+  t_min = sector_start[sector] if sector > 1 and is_multi else None
+  all_time, all_mag = tess_io.read_tess_light_curve(file_names, invert=True, t_min=t_min)
 
   if len(all_time) < 1:
       tf.logging.info("Empty light curve. Skipped TIC id %s" % (tic))
       raise EmptyLightCurveError
 
-  mad = scale.mad(all_mag)
-  valid_indices = np.where(all_mag > np.median(all_mag)-5*mad)
-  all_mag = all_mag[valid_indices]
-  all_time = all_time[valid_indices]
-  all_mag = (-(all_mag - np.median(all_mag))/2.5)
-  all_flux = all_mag
-
-  if sector > 1 and is_multi:
-      current = np.where(all_time >= sector_start[sector])
-      all_time = all_time[current]
-      all_flux = all_flux[current]
+  # Remove points more than 5 sigma below the median, then normalize by the
+  # median.
+  valid = robust_stats.sigma_clip(all_mag, lower=5)
+  all_time = all_time[valid]
+  all_flux = -robust_stats.subtract_median(all_mag[valid]) / 2.5
   return all_time, all_flux
 
 
-# Insert GP detrending
+def read_and_process_multi_sector_light_curve(tic, tess_data_dir, sectors, cache=None, index=None,
+                                              num_threads=None, gp_detrend=False, events=None, gp_timescale=1.0):
+  """Reads the light curves of a target in several sectors and stitches them.
+
+  The sectors are read concurrently on a thread pool. Each one is cleaned and
+  normalized independently by read_and_process_light_curve(), and the results
+  are stitched into one array per output without intermediate concatenations.
+  Sectors whose light curve is missing or empty are skipped.
+
+  Args:
+    tic: TIC id of the target star.
+    tess_data_dir: Base directory containing TESS data. See
+        tess_io.tess_filenames().
+    sectors: Sequence of sector numbers.
+    cache: Optional light_curve_cache.LightCurveCache. See
+        read_and_process_light_curve().
+    index: Optional tess_index.TessIndex. See read_and_process_light_curve().
+    num_threads: Number of threads to read with. Defaults to one per sector.
+    gp_detrend: Whether to detrend each sector with a Gaussian process. See
+        read_and_process_light_curve().
+    events: Optional list of periodic_event.Event excluded from the Gaussian
+        process fit.
+    gp_timescale: Correlation timescale of the Gaussian process, in days.
+
+  Returns:
+    The arrays returned by read_and_process_light_curve(), concatenated over
+    the sectors and sorted by time.
+
+  Raises:
+    IOError: If no light curve file for this TIC ID can be found.
+    EmptyLightCurveError: If all light curves have no points.
+  """
+  sectors = sorted(set(int(sector) for sector in sectors))
+
+  def read_sector(sector):
+    try:
+      return read_and_process_light_curve(tic, tess_data_dir, sector=sector, cache=cache,
+                                          index=index, gp_detrend=gp_detrend, events=events,
+                                          gp_timescale=gp_timescale)
+    except (IOError, EmptyLightCurveError) as e:
+      return e
+
+  with futures.ThreadPoolExecutor(max_workers=num_threads or max(len(sectors), 1)) as executor:
+    results = list(executor.map(read_sector, sectors))
+
+  segments = [r for r in results if not isinstance(r, Exception)]
+  if not segments:
+    if any(isinstance(r, EmptyLightCurveError) for r in results):
+      raise EmptyLightCurveError
+    tf.logging.info("Failed to find light curve files in %s for TIC ID %s in sectors %s" % (
+        tess_data_dir, tic, sectors))
+    raise IOError
+  return util.stitch(segments)
+
+
+def detrend_with_gp(time, all_flux, events=None, timescale=1.0, width_factor=1.5):
+  """Subtracts the stellar variability fit by a Gaussian process.
+
+  The variability of each flux array is fit by gaussian_process.fit_trend(),
+  in time linear in the number of cadences, excluding the given events and
+  any non-finite flux values.
+
+  Args:
+    time: 1D NumPy array; the time values of the light curve, in ascending
+        order.
+    all_flux: Sequence of 1D NumPy arrays; flux values at the time values,
+        e.g. of several apertures.
+    events: Optional list of periodic_event.Event to exclude from the fit.
+    timescale: Correlation timescale of the variability, in days.
+    width_factor: Fractional multiplier of the duration of each event to
+        exclude. See util.remove_events().
+
+  Returns:
+    List of 1D NumPy arrays; each flux array minus its fitted trend. Flux
+    arrays with fewer than 2 points to fit are returned unchanged.
+  """
+  out_of_events = np.ones_like(time, dtype=bool)
+  if events:
+    _, kept = util.remove_events(time, np.arange(len(time)), events, width_factor)
+    out_of_events[:] = False
+    out_of_events[kept] = True
+
+  detrended = []
+  for flux in all_flux:
+    mask = out_of_events & np.isfinite(flux)
+    if np.count_nonzero(mask) < 2:
+      detrended.append(flux)
+    else:
+      detrended.append(flux - gaussian_process.fit_trend(time, flux, timescale, mask))
+  return detrended
 
 
 def phase_fold_and_sort_light_curve(time, flux, period, t0):
@@ -108,6 +236,11 @@ def phase_fold_and_sort_light_curve(time, flux, period, t0):
   return time, flux
 
 
+# Binning of a view of a phase-folded light curve; see generate_view().
+ViewSpec = collections.namedtuple(
+    "ViewSpec", ["num_bins", "bin_width", "t_min", "t_max", "normalize"])
+
+
 def generate_view(time, flux, num_bins, bin_width, t_min, t_max,
                   normalize=True):
   """Generates a view of a phase-folded light curve using a median filter.
@@ -125,15 +258,142 @@ def generate_view(time, flux, num_bins, bin_width, t_min, t_max,
     1D NumPy array of size num_bins containing the median flux values of
     uniformly spaced bins on the phase-folded time axis.
   """
-  view = median_filter.median_filter(time, flux, num_bins, bin_width, t_min,
-                                     t_max)
+  view, = _median_filter_views(time, flux,
+                               [(num_bins, bin_width, t_min, t_max)])
   if normalize:
-    view -= np.median(view)
-    view /= np.abs(np.min(view))  # In pathological cases, min(view) is zero...
+    view = _normalize_view(view)
+
+  return view
+
+
+def generate_views(time, flux, specs):
+  """Generates several views of a phase-folded light curve at once.
+
+  The bin boundaries of all views are found in a single binary search over the
+  folded time axis, and the medians of all bins are computed together.
+
+  Args:
+    time: 1D array of time values, phase folded and sorted in ascending order.
+    flux: 1D array of flux values.
+    specs: Dict mapping view names to ViewSpecs, e.g. as returned by
+        global_view_spec() and local_view_spec().
+
+  Returns:
+    Dict mapping the names in specs to 1D NumPy arrays, equal to
+    generate_view(time, flux, *spec) for each spec.
+  """
+  names = list(specs)
+  views = _median_filter_views(time, flux,
+                               [specs[name][:4] for name in names])
+  return {
+      name: _normalize_view(view) if specs[name].normalize else view
+      for name, view in zip(names, views)
+  }
+
+
+def generate_views_batch(times, fluxes, specs):
+  """Generates the same views of many phase-folded light curves at once.
+
+  Each view is computed for all light curves with a single call to
+  median_filter.median_filter_batch().
+
+  Args:
+    times: Sequence of 1D arrays of time values, each phase folded and sorted
+        in ascending order.
+    fluxes: Sequence of 1D arrays of flux values with the same sizes as times.
+    specs: Sequence of dicts mapping view names to ViewSpecs, one per light
+        curve. All dicts must have the same names, and the ViewSpecs of a name
+        must have the same num_bins and normalize.
 
+  Returns:
+    Dict mapping the view names to 2D NumPy arrays of shape
+    [len(times), num_bins]. Row i is equal to
+    generate_views(times[i], fluxes[i], specs[i]) up to rounding, or all NaN if
+    the light curve is too sparse for the view.
+
+  Raises:
+    ValueError: If the ViewSpecs of a name differ in num_bins or normalize.
+  """
+  if not specs:
+    return {}
+  views = {}
+  for name in specs[0]:
+    num_bins, bin_width, t_min, t_max, normalize = zip(
+        *[spec[name] for spec in specs])
+    if len(set(num_bins)) != 1 or len(set(normalize)) != 1:
+      raise ValueError(
+          "ViewSpecs of '%s' must have the same num_bins and normalize" % name)
+    view = median_filter.median_filter_batch(
+        times, fluxes, num_bins[0], np.array(bin_width), np.array(t_min),
+        np.array(t_max))
+    if normalize[0]:
+      finite = np.isfinite(view).all(axis=1)
+      view[finite] = [_normalize_view(row) for row in view[finite]]
+    views[name] = view
+  return views
+
+
+def _median_filter_views(time, flux, views):
+  """Applies median_filter.median_filter_views(), in C++ when possible.
+
+  The C++ MedianFilter fills empty bins with the median of the whole window
+  rather than interpolating, doesn't check for sparse light curves, isn't
+  defined for NaN values and always works in double precision. It's used only
+  for float64 flux when the NumPy checks pass and every bin has points, so the
+  views match the NumPy ones up to rounding.
+  """
+  flux = np.asarray(flux)
+  if (cc_median_filter is None or flux.dtype != np.float64 or
+      np.isnan(flux).any()):
+    return median_filter.median_filter_views(time, flux, views)
+
+  counts = median_filter.view_bin_counts(time, flux, views)
+  if not all(np.all(view_counts) for view_counts in counts):
+    return median_filter.median_filter_views(time, flux, views)
+  return [cc_median_filter.median_filter(time, flux, *view) for view in views]
+
+
+def _normalize_view(view):
+  """Centers the median of a view at 0 and its minimum value at -1."""
+  view -= np.median(view)
+  view /= np.abs(np.min(view))  # In pathological cases, min(view) is zero...
   return view
 
 
+def global_view_spec(period, num_bins=201, bin_width_factor=1.2/201):
+  """Returns the ViewSpec of global_view()."""
+  return ViewSpec(
+      num_bins=num_bins,
+      bin_width=period * bin_width_factor,
+      t_min=-period / 2,
+      t_max=period / 2,
+      normalize=True)
+
+
+def twice_global_view_spec(period, num_bins=402, bin_width_factor=1.2 / 402):
+  """Returns the ViewSpec of twice_global_view()."""
+  return ViewSpec(
+      num_bins=num_bins,
+      bin_width=period * bin_width_factor,
+      t_min=-period,
+      t_max=period,
+      normalize=True)
+
+
+def local_view_spec(period,
+                    duration,
+                    num_bins=61,
+                    bin_width_factor=0.16,
+                    num_durations=2):
+  """Returns the ViewSpec of local_view()."""
+  return ViewSpec(
+      num_bins=num_bins,
+      bin_width=duration * bin_width_factor,
+      t_min=max(-period / 2, -duration * num_durations),
+      t_max=min(period / 2, duration * num_durations),
+      normalize=True)
+
+
 def global_view(time, flux, period, num_bins=201, bin_width_factor=1.2/201):
   """Generates a 'global view' of a phase folded light curve.
 
@@ -151,13 +411,8 @@ def global_view(time, flux, period, num_bins=201, bin_width_factor=1.2/201):
     1D NumPy array of size num_bins containing the median flux values of
     uniformly spaced bins on the phase-folded time axis.
   """
-  return generate_view(
-      time,
-      flux,
-      num_bins=num_bins,
-      bin_width=period * bin_width_factor,
-      t_min=-period / 2,
-      t_max=period / 2)
+  return generate_view(time, flux,
+                       *global_view_spec(period, num_bins, bin_width_factor))
 
 
 def twice_global_view(time, flux, period, num_bins=402, bin_width_factor=1.2 / 402):
@@ -179,12 +434,7 @@ def twice_global_view(time, flux, period, num_bins=402, bin_width_factor=1.2 / 4
     uniformly spaced bins on the phase-folded time axis.
   """
   return generate_view(
-      time,
-      flux,
-      num_bins=num_bins,
-      bin_width=period * bin_width_factor,
-      t_min=-period,
-      t_max=period)
+      time, flux, *twice_global_view_spec(period, num_bins, bin_width_factor))
 
 
 def local_view(time,
@@ -211,12 +461,9 @@ def local_view(time,
     uniformly spaced bins on the phase-folded time axis.
   """
   return generate_view(
-      time,
-      flux,
-      num_bins=num_bins,
-      bin_width=duration * bin_width_factor,
-      t_min=max(-period / 2, -duration * num_durations),
-      t_max=min(period / 2, duration * num_durations))
+      time, flux,
+      *local_view_spec(period, duration, num_bins, bin_width_factor,
+                       num_durations))
 
 
 def mask_transit(time, duration, period, mask_width=2, phase_limit=0.1):
@@ -229,8 +476,8 @@ def mask_transit(time, duration, period, mask_width=2, phase_limit=0.1):
     :param phase_limit: minimum phase to search for secondary eclipse.
     :return: mask: 1D array of booleans
     """
-    mask = [(abs(t) > duration*mask_width/2) and (abs(t) > period*phase_limit) for t in time]
-    return np.array(mask)
+    time = np.asarray(time)
+    return (np.abs(time) > duration*mask_width/2) & (np.abs(time) > period*phase_limit)
 
 
 def find_secondary(time, flux, duration, period, mask_width=2, phase_limit=0.1):
@@ -261,32 +508,13 @@ def find_secondary(time, flux, duration, period, mask_width=2, phase_limit=0.1):
     new_flux -= 1.  # centre flux at zero
 
     # grid search for secondary. Fix duration to duration of primary.
-    time_grid = np.arange(new_time[0]+duration, new_time[-1]-duration, duration*0.1)
-    min_index = 0
-    max_index = min_index
-    best_t0 = period / 2
-    best_SR = 0
-
-    for t0 in time_grid:
-        while new_time[min_index] < (t0 - duration):
-            min_index += 1
-        min_in_transit = min_index
-        max_in_transit = min_in_transit
-        while (new_time[max_index] < (t0 + duration)) and (max_index < len(new_time)):
-            max_index += 1
-        while new_time[min_in_transit] < (t0 - duration/2):
-            min_in_transit += 1
-        while new_time[max_in_transit] < (t0 + duration/2):
-            max_in_transit += 1
-        if max_index - min_index < 5:
-            continue
-        r = float(max_in_transit - min_in_transit + 1) / len(new_time)  # assuming identical uniform weights
-        s = sum(new_flux[min_in_transit:max_in_transit] / float(len(new_time)))
-
+    t0, _, r, s = util.box_search(new_time, new_flux, duration)
+    with np.errstate(divide='ignore', invalid='ignore'):
         SR = s**2 / (r*(1-r))
-        if SR > best_SR:
-            best_t0 = t0
-            best_SR = SR
+    SR = np.where(SR > 0, SR, 0)
+    best_t0 = period / 2
+    if np.any(SR > 0):
+        best_t0 = t0[np.argmax(SR)]
     return best_t0, new_time, new_flux+1.
 
 
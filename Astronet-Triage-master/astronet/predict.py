@@ -82,15 +82,21 @@ parser.add_argument(
     help="Name of file in which predictions will be saved.")
 
 
-def _process_tce(feature_config, tce):
-    """Reads and process the input features of a Threshold Crossing Event.
+# Number of TCEs whose views are generated together by
+# preprocess.generate_views_batch().
+_VIEW_BATCH_SIZE = 256
+
+
+def _process_tces(feature_config, tces):
+    """Reads and process the input features of several Threshold Crossing Events.
 
     Args:
-      tce: row from TCE CSV file, read in as a Pandas dataframe.
+      tces: rows from TCE CSV file, read in as a Pandas dataframe.
       feature_config: ConfigDict containing the feature configurations.
 
     Returns:
-      A dictionary of processed light curve features.
+      A list with a dictionary of processed light curve features per TCE, or
+      None for TCEs whose light curve is too sparse for one of the views.
 
     Raises:
       ValueError: If feature_config contains features other than 'global_view'
@@ -100,40 +106,54 @@ def _process_tce(feature_config, tce):
         raise ValueError(
             "Only 'global_view' and 'local_view' features are supported.")
 
-    # Read and process the light curve.
-    time, flux = preprocess.read_and_process_light_curve(tce.tic_id, FLAGS.tess_data_dir, sector=tce.Sectors)
-    time, flux = preprocess.phase_fold_and_sort_light_curve(
-        time, flux, tce.Period, tce.Epoc)
-
-    # Generate the local and global views.
-    features = {}
-
-    if "global_view" in feature_config:
-        global_view = preprocess.global_view(time, flux, tce.Period)
-        # Add a batch dimension.
-        features["global_view"] = np.expand_dims(global_view, 0)
-
-    if "local_view" in feature_config:
-        local_view = preprocess.local_view(time, flux, tce.Period, tce.Duration)
-        # Add a batch dimension.
-        features["local_view"] = np.expand_dims(local_view, 0)
-
-    # Possibly save plots.
-    if FLAGS.output_image_dir:
-        ncols = len(features)
-        fig, axes = plt.subplots(1, ncols, figsize=(10 * ncols, 5), squeeze=False)
-
-        for i, name in enumerate(sorted(features)):
-            ax = axes[0][i]
-            ax.plot(features[name][0], ".")
-            ax.set_title(name)
-            ax.set_xlabel("Bucketized Time (days)")
-            ax.set_ylabel("Normalized Flux")
-
-        fig.tight_layout()
-        fig.savefig(os.path.join(FLAGS.output_image_dir, str(tce.tic_id) + '.png'), bbox_inches="tight")
-
-    return features
+    # Read and process the light curves.
+    times, fluxes, specs = [], [], []
+    for _, tce in tces.iterrows():
+        time, flux = preprocess.read_and_process_light_curve(tce.tic_id, FLAGS.tess_data_dir, sector=tce.Sectors)
+        time, flux = preprocess.phase_fold_and_sort_light_curve(
+            time, flux, tce.Period, tce.Epoc)
+        times.append(time)
+        fluxes.append(flux)
+        specs.append({
+            "global_view": preprocess.global_view_spec(tce.Period),
+            "local_view": preprocess.local_view_spec(tce.Period, tce.Duration),
+        })
+
+    # Generate the local and global views of all TCEs at once.
+    views = preprocess.generate_views_batch(
+        times, fluxes, [{name: spec[name] for name in feature_config} for spec in specs])
+
+    all_features = []
+    for i, (_, tce) in enumerate(tces.iterrows()):
+        # Keep the batch dimension.
+        features = {name: view[i:i + 1] for name, view in views.items()}
+        if not all(np.isfinite(view).all() for view in features.values()):
+            tf.logging.info("Light curve too sparse. Skipped TIC id %s" % tce.tic_id)
+            all_features.append(None)
+            continue
+
+        # Possibly save plots.
+        if FLAGS.output_image_dir:
+            _plot_features(tce, features)
+        all_features.append(features)
+
+    return all_features
+
+
+def _plot_features(tce, features):
+    """Saves a plot of the features of a Threshold Crossing Event."""
+    ncols = len(features)
+    fig, axes = plt.subplots(1, ncols, figsize=(10 * ncols, 5), squeeze=False)
+
+    for i, name in enumerate(sorted(features)):
+        ax = axes[0][i]
+        ax.plot(features[name][0], ".")
+        ax.set_title(name)
+        ax.set_xlabel("Bucketized Time (days)")
+        ax.set_ylabel("Normalized Flux")
+
+    fig.tight_layout()
+    fig.savefig(os.path.join(FLAGS.output_image_dir, str(tce.tic_id) + '.png'), bbox_inches="tight")
 
 
 def main(_):
@@ -158,23 +178,28 @@ def main(_):
                                    'camera': int,
                                    'ccd': int})
 
-    for ind, tce in tce_table.iterrows():
-        features = _process_tce(config.inputs.features, tce)
+    for start in range(0, len(tce_table), _VIEW_BATCH_SIZE):
+        tces = tce_table.iloc[start:start + _VIEW_BATCH_SIZE]
+        all_features = _process_tces(config.inputs.features, tces)
+
+        for (_, tce), features in zip(tces.iterrows(), all_features):
+            if features is None:
+                continue
 
-        # Create an input function.
-        def input_fn():
-            return {
-                "time_series_features":
-                    tf.estimator.inputs.numpy_input_fn(
-                        features, batch_size=1, shuffle=False, queue_capacity=1)()
-            }
+            # Create an input function.
+            def input_fn():
+                return {
+                    "time_series_features":
+                        tf.estimator.inputs.numpy_input_fn(
+                            features, batch_size=1, shuffle=False, queue_capacity=1)()
+                }
 
-        # Generate the predictions.
-        for predictions in estimator.predict(input_fn):
-            assert len(predictions) == 1
-            print(tce.tic_id, "Prediction:", predictions[0])
+            # Generate the predictions.
+            for predictions in estimator.predict(input_fn):
+                assert len(predictions) == 1
+                print(tce.tic_id, "Prediction:", predictions[0])
 
-            print(str(tce.tic_id)+' '+str(predictions[0]), file=open(FLAGS.output_file, 'a'))
+                print(str(tce.tic_id)+' '+str(predictions[0]), file=open(FLAGS.output_file, 'a'))
 
 
 if __name__ == "__main__":
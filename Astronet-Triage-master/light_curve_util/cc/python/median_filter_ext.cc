@@ -0,0 +1,77 @@
+/* Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+// Python extension module for median_filter.h, with the same interface as
+// median_filter.clif. Built by setup.py.
+
+#include "light_curve_util/cc/median_filter.h"
+#include "light_curve_util/cc/python/numpy_util.h"
+
+using std::vector;
+
+namespace astronet {
+namespace {
+
+PyObject* PyMedianFilter(PyObject* self, PyObject* args, PyObject* kwargs) {
+  static const char* kwlist[] = {"x",         "y",     "num_bins",
+                                 "bin_width", "x_min", "x_max",
+                                 nullptr};
+  PyObject* x_obj;
+  PyObject* y_obj;
+  int num_bins;
+  double bin_width, x_min, x_max;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOiddd",
+                                   const_cast<char**>(kwlist), &x_obj, &y_obj,
+                                   &num_bins, &bin_width, &x_min, &x_max)) {
+    return nullptr;
+  }
+  vector<double> x, y;
+  if (!ToDoubleVector(x_obj, "x", &x) || !ToDoubleVector(y_obj, "y", &y)) {
+    return nullptr;
+  }
+
+  vector<double> result;
+  std::string error;
+  bool ok;
+  Py_BEGIN_ALLOW_THREADS;
+  ok = MedianFilter(x, y, num_bins, bin_width, x_min, x_max, &result, &error);
+  Py_END_ALLOW_THREADS;
+  if (!ok) {
+    return RaiseValueError(error);
+  }
+  return ToNumpyArray(result);
+}
+
+PyMethodDef kMethods[] = {
+    {"median_filter", reinterpret_cast<PyCFunction>(PyMedianFilter),
+     METH_VARARGS | METH_KEYWORDS,
+     "median_filter(x, y, num_bins, bin_width, x_min, x_max)\n\n"
+     "Computes the median y-value in uniform intervals along the x-axis.\n"
+     "Empty bins take the median y-value of all points in [x_min, x_max).\n"
+     "Raises ValueError if an argument is invalid."},
+    {nullptr, nullptr, 0, nullptr},
+};
+
+PyModuleDef kModule = {
+    PyModuleDef_HEAD_INIT, "median_filter",
+    "Python wrapping of the C++ median_filter library.", -1, kMethods,
+};
+
+}  // namespace
+}  // namespace astronet
+
+PyMODINIT_FUNC PyInit_median_filter() {
+  import_array();
+  return PyModule_Create(&astronet::kModule);
+}
@@ -21,6 +21,7 @@ from __future__ import print_function
 from absl.testing import absltest
 import numpy as np
 
+from light_curve_util import median_filter as py_median_filter
 from light_curve_util.cc.python import median_filter
 
 
@@ -43,6 +44,37 @@ class MedianFilterTest(absltest.TestCase):
     expected = [2.5, 4.5, 6.5, 8.5, 10.5]
     np.testing.assert_almost_equal(result, expected)
 
+  def testEmptyBins(self):
+    x = np.array([-1, 0, 1])
+    y = np.array([1, 2, 3])
+    result = median_filter.median_filter(
+        x, y, num_bins=5, bin_width=2, x_min=-5, x_max=5)
+
+    # Empty bins take the median of all points in [x_min, x_max), whereas the
+    # Python median filter interpolates between adjacent bins.
+    np.testing.assert_almost_equal(result, [2, 2, 1.5, 3, 2])
+
+  def testMatchesPython(self):
+    rng = np.random.RandomState(0)
+    for _ in range(100):
+      num_points = rng.randint(500, 5000)
+      x = np.sort(rng.uniform(-1, 1, num_points))
+      y = rng.normal(size=num_points)
+      num_bins = rng.randint(2, 100)
+      x_min = rng.uniform(-1, -0.5)
+      x_max = rng.uniform(0.5, 1)
+      bin_width = rng.uniform(0.05, 0.5) * (x_max - x_min)
+      args = (x, y, num_bins, bin_width, x_min, x_max)
+      if not np.all(py_median_filter.bin_counts(*args)):
+        continue
+
+      # Medians of an even number of points may differ in the last bit.
+      np.testing.assert_allclose(
+          py_median_filter.median_filter(*args),
+          median_filter.median_filter(*args),
+          rtol=1e-12,
+          atol=1e-15)
+
 
 if __name__ == '__main__':
   absltest.main()
@@ -0,0 +1,163 @@
+/* Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+// Python extension module for view_generator.h, with the same interface as
+// view_generator.clif. Built by setup.py.
+
+#include "light_curve_util/cc/view_generator.h"
+#include "light_curve_util/cc/python/numpy_util.h"
+
+using std::vector;
+
+namespace astronet {
+namespace {
+
+// Python object owning a ViewGenerator.
+struct PyViewGenerator {
+  PyObject_HEAD;
+  ViewGenerator* view_generator;
+};
+
+PyObject* PyViewGeneratorNew(PyTypeObject* type, PyObject* args,
+                             PyObject* kwargs) {
+  PyErr_SetString(PyExc_ValueError,
+                  "ViewGenerator can only be created by "
+                  "create_view_generator()");
+  return nullptr;
+}
+
+void PyViewGeneratorDealloc(PyObject* self) {
+  delete reinterpret_cast<PyViewGenerator*>(self)->view_generator;
+  Py_TYPE(self)->tp_free(self);
+}
+
+PyObject* PyGenerateView(PyObject* self, PyObject* args, PyObject* kwargs) {
+  static const char* kwlist[] = {"num_bins", "bin_width", "t_min",
+                                 "t_max",    "normalize", nullptr};
+  int num_bins, normalize;
+  double bin_width, t_min, t_max;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "idddp",
+                                   const_cast<char**>(kwlist), &num_bins,
+                                   &bin_width, &t_min, &t_max, &normalize)) {
+    return nullptr;
+  }
+
+  ViewGenerator* view_generator =
+      reinterpret_cast<PyViewGenerator*>(self)->view_generator;
+  vector<double> result;
+  std::string error;
+  bool ok;
+  Py_BEGIN_ALLOW_THREADS;
+  ok = view_generator->GenerateView(num_bins, bin_width, t_min, t_max,
+                                    normalize, &result, &error);
+  Py_END_ALLOW_THREADS;
+  if (!ok) {
+    return RaiseValueError(error);
+  }
+  return ToNumpyArray(result);
+}
+
+PyMethodDef kViewGeneratorMethods[] = {
+    {"generate_view", reinterpret_cast<PyCFunction>(PyGenerateView),
+     METH_VARARGS | METH_KEYWORDS,
+     "generate_view(num_bins, bin_width, t_min, t_max, normalize)\n\n"
+     "Generates a view of the phase-folded light curve using a median\n"
+     "filter. Raises ValueError if an argument is invalid."},
+    {nullptr, nullptr, 0, nullptr},
+};
+
+PyTypeObject kViewGeneratorType = {
+    PyVarObject_HEAD_INIT(nullptr, 0)  //
+    "light_curve_util.cc.python.view_generator.ViewGenerator",
+};
+
+PyObject* PyCreateViewGenerator(PyObject* self, PyObject* args,
+                                PyObject* kwargs) {
+  static const char* kwlist[] = {"time", "flux", "period", "t0", nullptr};
+  PyObject* time_obj;
+  PyObject* flux_obj;
+  double period, t0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOdd",
+                                   const_cast<char**>(kwlist), &time_obj,
+                                   &flux_obj, &period, &t0)) {
+    return nullptr;
+  }
+  vector<double> time, flux;
+  if (!ToDoubleVector(time_obj, "time", &time) ||
+      !ToDoubleVector(flux_obj, "flux", &flux)) {
+    return nullptr;
+  }
+
+  std::unique_ptr<ViewGenerator> view_generator;
+  std::string error;
+  Py_BEGIN_ALLOW_THREADS;
+  view_generator = ViewGenerator::Create(time, flux, period, t0, &error);
+  Py_END_ALLOW_THREADS;
+  if (view_generator == nullptr) {
+    return RaiseValueError(error);
+  }
+
+  PyObject* result = kViewGeneratorType.tp_alloc(&kViewGeneratorType, 0);
+  if (result != nullptr) {
+    reinterpret_cast<PyViewGenerator*>(result)->view_generator =
+        view_generator.release();
+  }
+  return result;
+}
+
+PyMethodDef kMethods[] = {
+    {"create_view_generator",
+     reinterpret_cast<PyCFunction>(PyCreateViewGenerator),
+     METH_VARARGS | METH_KEYWORDS,
+     "create_view_generator(time, flux, period, t0)\n\n"
+     "Phase folds a light curve and returns a ViewGenerator holding the\n"
+     "folded curve. Raises ValueError if an argument is invalid."},
+    {nullptr, nullptr, 0, nullptr},
+};
+
+PyModuleDef kModule = {
+    PyModuleDef_HEAD_INIT, "view_generator",
+    "Python wrapping of the C++ view_generator library.", -1, kMethods,
+};
+
+}  // namespace
+}  // namespace astronet
+
+PyMODINIT_FUNC PyInit_view_generator() {
+  import_array();
+
+  PyTypeObject* type = &astronet::kViewGeneratorType;
+  type->tp_basicsize = sizeof(astronet::PyViewGenerator);
+  type->tp_flags = Py_TPFLAGS_DEFAULT;
+  type->tp_doc = "Phase-folded light curve from which views are generated.";
+  type->tp_new = astronet::PyViewGeneratorNew;
+  type->tp_dealloc = astronet::PyViewGeneratorDealloc;
+  type->tp_methods = astronet::kViewGeneratorMethods;
+  if (PyType_Ready(type) < 0) {
+    return nullptr;
+  }
+
+  PyObject* module = PyModule_Create(&astronet::kModule);
+  if (module == nullptr) {
+    return nullptr;
+  }
+  Py_INCREF(type);
+  if (PyModule_AddObject(module, "ViewGenerator",
+                         reinterpret_cast<PyObject*>(type)) < 0) {
+    Py_DECREF(type);
+    Py_DECREF(module);
+    return nullptr;
+  }
+  return module;
+}
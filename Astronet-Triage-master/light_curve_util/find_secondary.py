@@ -20,6 +20,8 @@ from __future__ import division
 from __future__ import print_function
 import numpy as np
 
+from light_curve_util import util
+
 
 def mask_transit(time, duration, period, mask_width=2, phase_limit=0.1):
     """
@@ -31,8 +33,8 @@ def mask_transit(time, duration, period, mask_width=2, phase_limit=0.1):
     :param phase_limit: minimum phase to search for secondary eclipse.
     :return: mask: 1D array of booleans
     """
-    mask = [(abs(t) > duration*mask_width/2) and (abs(t) > period*phase_limit) for t in time]
-    return np.array(mask)
+    time = np.asarray(time)
+    return (np.abs(time) > duration*mask_width/2) & (np.abs(time) > period*phase_limit)
 
 
 def square_error(x, model):
@@ -83,30 +85,11 @@ def find_secondary(time, flux, duration, period, mask_width=2, phase_limit=0.1):
     new_flux -= 1.  # centre flux at zero
 
     # grid search for secondary. Fix duration to duration of primary.
-    time_grid = np.arange(new_time[0]+duration, new_time[-1]-duration, duration*0.1)
-    min_index = 0
-    max_index = min_index
+    t0, _, r, s = util.box_search(new_time, new_flux, duration)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        SR = -s*np.abs(s) / (r*(1-r))  # negative signals should give large positive s
+    SR = np.where(SR > 0, SR, 0)
     best_t0 = period / 2
-    best_SR = 0
-
-    for t0 in time_grid:
-        while new_time[min_index] < (t0 - duration):
-            min_index += 1
-        min_in_transit = min_index
-        max_in_transit = min_in_transit
-        while (new_time[max_index] < (t0 + duration)) and (max_index < len(new_time)):
-            max_index += 1
-        while new_time[min_in_transit] < (t0 - duration/2):
-            min_in_transit += 1
-        while new_time[max_in_transit] < (t0 + duration/2):
-            max_in_transit += 1
-        if max_index - min_index < 5:
-            continue
-        r = float(max_in_transit - min_in_transit + 1) / len(new_time)  # assuming identical uniform weights
-        s = sum(new_flux[min_in_transit:max_in_transit] / float(len(new_time)))
-
-        SR = -s*abs(s) / (r*(1-r))  # negative signals should give large positive s
-        if SR > best_SR:
-            best_t0 = t0
-            best_SR = SR
+    if np.any(SR > 0):
+        best_t0 = t0[np.argmax(SR)]
     return best_t0, new_time, new_flux+1.
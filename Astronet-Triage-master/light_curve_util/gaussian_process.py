@@ -0,0 +1,222 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Gaussian process regression of light curves in linear time.
+
+The kernel amplitude * exp(-|dt| / timescale) is semiseparable, so the
+covariance matrix of N points plus white noise has a Cholesky factorization
+that is computed and applied in O(N) time by the recursions of celerite
+(Foreman-Mackey et al. 2017, AJ 154, 220), rather than in O(N^3) time.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+from light_curve_util import robust_stats
+
+
+def _kernel_dot(time, x, amplitude, timescale):
+  """Multiplies the kernel matrix of sorted time values by a vector.
+
+  Returns:
+    Numpy array; amplitude * sum_m exp(-|time[n] - time[m]| / timescale) * x[m]
+    for each n.
+  """
+  decay = np.exp(-np.diff(time) / timescale).tolist()
+  x_list = x.tolist()
+  n = len(x_list)
+
+  # Contributions of the earlier points, and then of the later points.
+  earlier = [0.0] * n
+  total = 0.0
+  for i, d in enumerate(decay):
+    total = d * (total + x_list[i])
+    earlier[i + 1] = total
+  later = [0.0] * n
+  total = 0.0
+  for i in range(n - 2, -1, -1):
+    total = decay[i] * (total + x_list[i + 1])
+    later[i] = total
+  return amplitude * (x + np.array(earlier) + np.array(later))
+
+
+class ExponentialGP(object):
+  """Gaussian process with an exponential kernel, conditioned on time values.
+
+  The covariance of the flux values at time values t1 and t2 is
+  amplitude * exp(-|t1 - t2| / timescale), plus noise_var if t1 and t2 are the
+  same point.
+  """
+
+  def __init__(self, time, amplitude, timescale, noise_var):
+    """Computes the Cholesky factorization of the covariance matrix.
+
+    Args:
+      time: 1D numpy array; the time values, in ascending order.
+      amplitude: Variance of the correlated part of the flux.
+      timescale: Correlation timescale, in the units of time.
+      noise_var: Variance of the white noise in each flux value.
+
+    Raises:
+      ValueError: If time is empty or not sorted, or a parameter is not
+          positive.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    if not time.size:
+      raise ValueError("time is empty")
+    if np.any(np.diff(time) < 0):
+      raise ValueError("time must be sorted in ascending order")
+    if amplitude <= 0 or timescale <= 0 or noise_var <= 0:
+      raise ValueError(
+          "amplitude, timescale and noise_var must be positive. Got: %s, %s, "
+          "%s" % (amplitude, timescale, noise_var))
+
+    self._time = time
+    self._amplitude = amplitude
+    self._timescale = timescale
+    self._decay = np.exp(-np.diff(time) / timescale).tolist()
+
+    # The covariance matrix is L * diag(D) * L^T, where the strictly lower
+    # triangle of L is L[n, m] = amplitude * W[m] * prod(decay[m:n]).
+    d = amplitude + noise_var
+    w = 1 / d
+    s = 0.0
+    diag = [d]
+    weights = [w]
+    for decay in self._decay:
+      s = decay**2 * (s + d * w**2)
+      d = amplitude + noise_var - amplitude**2 * s
+      w = (1 - amplitude * s) / d
+      diag.append(d)
+      weights.append(w)
+    self._diag = np.array(diag)
+    self._weights = weights
+
+  def apply_inverse(self, y):
+    """Multiplies the inverse of the covariance matrix by a vector.
+
+    Args:
+      y: 1D numpy array; the flux values at the time values of the process.
+
+    Returns:
+      Numpy array; the solution x of K * x = y, where K is the covariance
+      matrix.
+    """
+    y_list = np.asarray(y, dtype=np.float64).tolist()
+    amplitude = self._amplitude
+    weights = self._weights
+    n = len(y_list)
+
+    # Solve L * z = y.
+    z = [0.0] * n
+    z[0] = z_prev = y_list[0]
+    f = 0.0
+    for i, decay in enumerate(self._decay):
+      f = decay * (f + weights[i] * z_prev)
+      z[i + 1] = z_prev = y_list[i + 1] - amplitude * f
+
+    # Solve diag(D) * L^T * x = z.
+    z = (np.array(z) / self._diag).tolist()
+    x = [0.0] * n
+    x[-1] = x_next = z[-1]
+    g = 0.0
+    for i in range(n - 2, -1, -1):
+      g = self._decay[i] * (g + amplitude * x_next)
+      x[i] = x_next = z[i] - weights[i] * g
+    return np.array(x)
+
+  def log_likelihood(self, y):
+    """Computes the log likelihood of flux values under the process.
+
+    Args:
+      y: 1D numpy array; the flux values at the time values of the process.
+
+    Returns:
+      The log of the multivariate normal density of y.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    return -0.5 * (np.dot(y, self.apply_inverse(y)) + np.sum(
+        np.log(self._diag)) + len(y) * np.log(2 * np.pi))
+
+  def predict(self, y, time=None):
+    """Computes the posterior mean of the correlated part of the flux.
+
+    Args:
+      y: 1D numpy array; the flux values at the time values of the process.
+      time: Optional 1D numpy array of time values at which to predict, in any
+          order. Defaults to the time values of the process.
+
+    Returns:
+      Numpy array with the same length as time; the posterior mean.
+    """
+    alpha = self.apply_inverse(y)
+    if time is None:
+      return _kernel_dot(self._time, alpha, self._amplitude, self._timescale)
+
+    # Sum the kernel over the points of the process at all time values at
+    # once, giving zero weight to the new time values.
+    time = np.asarray(time, dtype=np.float64)
+    all_time = np.concatenate([self._time, time])
+    order = np.argsort(all_time, kind="mergesort")
+    weights = np.concatenate([alpha, np.zeros_like(time)])[order]
+    result = np.empty_like(all_time)
+    result[order] = _kernel_dot(all_time[order], weights, self._amplitude,
+                                self._timescale)
+    return result[len(self._time):]
+
+
+def fit_trend(time, flux, timescale, mask=None):
+  """Fits the correlated variability of a light curve with ExponentialGP.
+
+  The white noise variance is estimated from the differences of consecutive
+  flux values, and the amplitude from the remaining robust variance of the
+  flux.
+
+  Args:
+    time: 1D numpy array; the time values of the light curve, in ascending
+        order.
+    flux: 1D numpy array; the flux values of the light curve.
+    timescale: Correlation timescale of the variability, in the units of time.
+    mask: Optional boolean numpy array with the same length as time. If given,
+        only the points where mask is True are used to fit the trend, e.g. to
+        exclude transits.
+
+  Returns:
+    Numpy array with the same length as time; the posterior mean of the flux
+    at each time value.
+
+  Raises:
+    ValueError: If fewer than 2 points are used to fit the trend.
+  """
+  fit_time, fit_flux = (time, flux) if mask is None else (time[mask],
+                                                          flux[mask])
+  if len(fit_time) < 2:
+    raise ValueError("Cannot fit a trend on less than 2 points. Got %d points."
+                     % len(fit_time))
+
+  # Assuming the variability is slow compared to the cadence, the differences
+  # of consecutive flux values are white noise with twice its variance. The
+  # factor of 1.48 takes their median absolute value to a standard deviation.
+  noise_var = (robust_stats.median(np.abs(np.diff(fit_flux))) * 1.48)**2 / 2
+  noise_var = max(noise_var, 1e-20)  # E.g. if the flux is constant.
+  center, mad = robust_stats.median_and_mad(fit_flux)
+  amplitude = max(mad**2 - noise_var, 1e-3 * noise_var)
+
+  gp = ExponentialGP(fit_time, amplitude, timescale, noise_var)
+  if mask is None:
+    return center + gp.predict(fit_flux - center)
+  return center + gp.predict(fit_flux - center, time)
@@ -0,0 +1,87 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for gaussian_process.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from absl.testing import absltest
+import numpy as np
+
+from light_curve_util import gaussian_process
+
+
+class ExponentialGPTest(absltest.TestCase):
+
+  def testMatchesDense(self):
+    rng = np.random.RandomState(0)
+    time = np.sort(rng.uniform(0, 10, 300))
+    time[100] = time[101]  # Repeated time value.
+    y = rng.normal(size=300)
+    amplitude, timescale, noise_var = 2.0, 1.5, 0.3
+    gp = gaussian_process.ExponentialGP(time, amplitude, timescale, noise_var)
+
+    kernel = amplitude * np.exp(-np.abs(time[:, None] - time) / timescale)
+    cov = kernel + noise_var * np.eye(300)
+    alpha = np.linalg.solve(cov, y)
+    np.testing.assert_allclose(alpha, gp.apply_inverse(y), atol=1e-10)
+    np.testing.assert_allclose(kernel.dot(alpha), gp.predict(y), atol=1e-10)
+
+    expected_log_likelihood = -0.5 * (
+        y.dot(alpha) + np.linalg.slogdet(cov)[1] + 300 * np.log(2 * np.pi))
+    self.assertAlmostEqual(expected_log_likelihood, gp.log_likelihood(y))
+
+    # Predict at new, unsorted time values.
+    new_time = rng.uniform(-1, 11, 50)
+    new_kernel = amplitude * np.exp(
+        -np.abs(new_time[:, None] - time) / timescale)
+    np.testing.assert_allclose(
+        new_kernel.dot(alpha), gp.predict(y, new_time), atol=1e-10)
+
+  def testErrors(self):
+    with self.assertRaises(ValueError):
+      gaussian_process.ExponentialGP([], 1, 1, 1)
+    with self.assertRaises(ValueError):
+      gaussian_process.ExponentialGP([1, 0], 1, 1, 1)
+    with self.assertRaises(ValueError):
+      gaussian_process.ExponentialGP([0, 1], 1, 1, 0)
+
+
+class FitTrendTest(absltest.TestCase):
+
+  def testFitTrend(self):
+    rng = np.random.RandomState(1)
+    time = np.arange(0, 20, 0.01)
+    variability = 0.01 * np.sin(2 * np.pi * time / 5)
+    flux = 1 + variability + rng.normal(scale=1e-3, size=len(time))
+    transit = np.abs(time - 10) < 0.1
+    flux[transit] -= 0.005
+
+    # The trend follows the variability, but not the masked transit.
+    trend = gaussian_process.fit_trend(time, flux, timescale=1, mask=~transit)
+    self.assertLess(np.std(flux[~transit] - trend[~transit]), 1.1e-3)
+    self.assertAlmostEqual(-0.005, np.mean(flux[transit] - trend[transit]),
+                           delta=1e-3)
+
+    trend = gaussian_process.fit_trend(time, flux, timescale=1)
+    self.assertLess(np.std(flux - trend), 1.1e-3)
+
+    with self.assertRaises(ValueError):
+      gaussian_process.fit_trend(time, flux, 1, mask=time < 0.01)
+
+
+if __name__ == "__main__":
+  absltest.main()
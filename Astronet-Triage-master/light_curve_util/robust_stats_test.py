@@ -0,0 +1,83 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for robust_stats.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from absl.testing import absltest
+import numpy as np
+
+from light_curve_util import robust_stats
+
+
+class RobustStatsTest(absltest.TestCase):
+
+  def testMedian(self):
+    self.assertEqual(3, robust_stats.median([5, 1, 3, 4, 2]))
+    self.assertEqual(2.5, robust_stats.median([4, 1, 3, 2]))
+    self.assertTrue(np.isnan(robust_stats.median([])))
+    x = [[1, np.nan, 3], [3, 2, 1]]
+    np.testing.assert_array_equal([np.nan, 2], robust_stats.median(x))
+
+    rng = np.random.RandomState(0)
+    for shape in [(7, 10), (6, 11), (1, 1)]:
+      x = rng.normal(size=shape).astype(rng.choice([np.float32, np.float64]))
+      for axis in [0, 1, -1]:
+        expected = np.median(x, axis=axis)
+        result = robust_stats.median(x, axis=axis)
+        self.assertEqual(expected.dtype, result.dtype)
+        np.testing.assert_array_equal(expected, result)
+
+  def testMedianAndMad(self):
+    # Absolute deviations from the median 4 are [3, 1, 1, 0, 6].
+    center, mad = robust_stats.median_and_mad([1, 5, 3, 4, 10])
+    self.assertEqual(4, center)
+    self.assertAlmostEqual(1 / 0.6744897501960817, mad)
+
+    # The median absolute deviation estimates the standard deviation.
+    x = np.random.RandomState(1).normal(1, 2, size=(3, 100000))
+    center, mad = robust_stats.median_and_mad(x)
+    np.testing.assert_allclose([1, 1, 1], center, atol=0.03)
+    np.testing.assert_allclose([2, 2, 2], mad, atol=0.03)
+
+  def testSigmaClip(self):
+    x = np.array([[-30, -5, -1, 0, 1, 2, 10], [0, 0, 0, 0, 0, 0, 1]])
+    # The scaled median absolute deviations are 2.965 and 0.
+    np.testing.assert_array_equal(
+        [[False, False, True, True, True, True, True],
+         [False, False, False, False, False, False, True]],
+        robust_stats.sigma_clip(x, lower=1.5))
+    np.testing.assert_array_equal(
+        [[False, False, True, True, True, True, False],
+         [False, False, False, False, False, False, False]],
+        robust_stats.sigma_clip(x, lower=1.5, upper=1.5))
+    np.testing.assert_array_equal(
+        [[True, True, True, True, True, True, False],
+         [False, False, False, False, False, False, False]],
+        robust_stats.sigma_clip(x, upper=1.5))
+    self.assertTrue(np.all(robust_stats.sigma_clip(x)))
+
+  def testSubtractMedian(self):
+    x = np.array([[1., 2., 6.], [4., -1., 0.]])
+    np.testing.assert_array_equal([[-1, 0, 4], [4, -1, 0]],
+                                  robust_stats.subtract_median(x))
+    np.testing.assert_array_equal([[-1.5, 1.5, 3], [1.5, -1.5, -3]],
+                                  robust_stats.subtract_median(x, axis=0))
+
+
+if __name__ == "__main__":
+  absltest.main()
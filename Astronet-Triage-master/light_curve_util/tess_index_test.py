@@ -0,0 +1,136 @@
+# Copyright 2018 Liang Yu.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tess_index.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+
+from absl.testing import absltest
+
+from light_curve_util import tess_index
+
+
+class TessIndexTest(absltest.TestCase):
+
+  def setUp(self):
+    super(TessIndexTest, self).setUp()
+    self.base_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.base_dir)
+    self.index_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.index_dir)
+
+  def _touch(self, *path):
+    filename = os.path.join(self.base_dir, *path)
+    if not os.path.isdir(os.path.dirname(filename)):
+      os.makedirs(os.path.dirname(filename))
+    open(filename, "w").close()
+    return filename
+
+  def testParseFilename(self):
+    f = tess_index.parse_filename(
+        "tess2021258175143-s0043-0000000012345678-0214-s_lc.fits", "cam1-ccd3")
+    self.assertEqual(
+        f,
+        tess_index.TessFile(
+            tic=12345678,
+            sector=43,
+            camera=1,
+            ccd=3,
+            cadence="120s",
+            product="lc",
+            path="tess2021258175143-s0043-0000000012345678-0214-s_lc.fits"))
+
+    f = tess_index.parse_filename(
+        "tess2020186164531-s0027-0000000000000042-0189-a_fast-tp.fits")
+    self.assertEqual((42, 27, 0, 0, "20s", "tp"), f[:-1])
+
+    f = tess_index.parse_filename(
+        "hlsp_tess-spoc_tess_phot_0000000000000007-s0014_tess_v1_lc.fits")
+    self.assertEqual((7, 14, "ffi", "lc"), (f.tic, f.sector, f.cadence,
+                                            f.product))
+
+    self.assertIsNone(tess_index.parse_filename("README.txt"))
+
+  def testLookup(self):
+    lc_43 = self._touch(
+        "sector-43", "tess2021258175143-s0043-0000000012345678-0214-s_lc.fits")
+    tp_43 = self._touch(
+        "sector-43", "tess2021258175143-s0043-0000000012345678-0214-s_tp.fits")
+    lc_44 = self._touch(
+        "sector-44", "tess2021284114741-s0044-0000000012345678-0215-s_lc.fits")
+    self._touch("sector-44", "notes.txt")
+
+    index = tess_index.TessIndex(self.base_dir)
+    self.assertLen(index, 3)
+    self.assertEqual([lc_43, tp_43, lc_44],
+                     [f.path for f in index.lookup("0000000012345678")])
+    self.assertEqual([lc_44], [f.path for f in index.lookup(12345678, 44)])
+    self.assertEqual([tp_43],
+                     [f.path for f in index.lookup(12345678, product="tp")])
+    self.assertEmpty(index.lookup(12345678, sector=45))
+    self.assertEmpty(index.lookup(1))
+
+  def testPersistAndRefresh(self):
+    index_file = os.path.join(self.index_dir, "index.npz")
+    self._touch("sector-43",
+                "tess2021258175143-s0043-0000000012345678-0214-s_lc.fits")
+    index = tess_index.TessIndex(self.base_dir, index_file)
+    self.assertLen(index, 1)
+    self.assertTrue(os.path.exists(index_file))
+
+    # Reloading an unchanged directory doesn't list anything.
+    index = tess_index.TessIndex(self.base_dir, index_file)
+    self.assertLen(index, 1)
+    self.assertFalse(index.refresh())
+
+    # A new sector directory is found by a lookup that misses.
+    lc_44 = self._touch(
+        "sector-44", "tess2021284114741-s0044-0000000099999999-0215-s_lc.fits")
+    self.assertEqual([lc_44], [f.path for f in index.lookup(99999999)])
+    self.assertLen(tess_index.TessIndex(self.base_dir, index_file), 2)
+
+    # So is a new file in an existing sector directory, which doesn't change
+    # the modification time of the data directory.
+    os.utime(os.path.join(self.base_dir, "sector-44"), (0, 0))
+    index.refresh()
+    base_mtime = os.stat(self.base_dir).st_mtime_ns
+    tp_44 = self._touch(
+        "sector-44", "tess2021284114741-s0044-0000000099999999-0215-s_tp.fits")
+    self.assertEqual(base_mtime, os.stat(self.base_dir).st_mtime_ns)
+    self.assertEqual([tp_44],
+                     [f.path for f in index.lookup(99999999, product="tp")])
+
+    # Removed directories are dropped.
+    shutil.rmtree(os.path.join(self.base_dir, "sector-43"))
+    self.assertTrue(index.refresh())
+    self.assertEmpty(index.lookup(12345678))
+    self.assertLen(tess_index.TessIndex(self.base_dir, index_file), 2)
+
+  def testIgnoresIndexForOtherDirectory(self):
+    index_file = os.path.join(self.index_dir, "index.npz")
+    self._touch("a", "tess2021258175143-s0043-0000000012345678-0214-s_lc.fits")
+    tess_index.TessIndex(os.path.join(self.base_dir, "a"), index_file)
+    os.makedirs(os.path.join(self.base_dir, "b"))
+    index = tess_index.TessIndex(os.path.join(self.base_dir, "b"), index_file)
+    self.assertLen(index, 0)
+
+
+if __name__ == "__main__":
+  absltest.main()
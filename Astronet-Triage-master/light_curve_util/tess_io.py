@@ -26,12 +26,67 @@ from light_curve_util import util
 from tensorflow import io
 
 
+def _is_local_path(filename):
+    """Returns True if filename refers to the local filesystem."""
+    return "://" not in filename
+
+
+def open_fits(filename, memmap=True):
+    """Opens a FITS file exactly once.
+
+    Local files are memory-mapped so only the pages backing the columns that are
+    actually accessed get read. Other paths (e.g. gs://) are streamed through
+    GFile, which astropy cannot memory-map.
+
+    Args:
+      filename: str name of the fits file.
+      memmap: Whether to memory-map local files.
+
+    Returns:
+      An astropy HDUList.
+    """
+    if memmap and _is_local_path(filename):
+        return fits.open(filename, memmap=True, lazy_load_hdus=True)
+    return fits.open(io.gfile.GFile(filename, mode="rb"))
+
+
+def _to_native(array):
+    """Copies a (big-endian) FITS column into a native byte order array."""
+    array = np.asarray(array)
+    return np.array(array, dtype=array.dtype.newbyteorder("="))
+
+
+def time_window(time, t_min=None, t_max=None):
+    """Returns the slice of rows of a time column within [t_min, t_max].
+
+    The time column of a light curve is ascending apart from NaN gaps, so the
+    window is found by binary search rather than by comparing every row. Rows
+    with NaN time inside the window are part of the slice.
+
+    Args:
+      time: 1D Numpy array of time values, ascending apart from NaNs.
+      t_min: Optional minimum time, inclusive.
+      t_max: Optional maximum time, inclusive.
+
+    Returns:
+      A slice object.
+    """
+    if t_min is None and t_max is None:
+        return slice(None)
+    # Running maximum with NaNs skipped, which is non-decreasing.
+    running_max = np.fmax.accumulate(np.where(np.isnan(time), -np.inf, time))
+    start = 0 if t_min is None else np.searchsorted(running_max, t_min, side='left')
+    end = len(time) if t_max is None else np.searchsorted(running_max, t_max, side='right')
+    return slice(start, max(start, end))
+
+
 def tess_filenames(tic,
                      base_dir='D:/ExoplanetMLFiles/Alt_Exoplanet/TESSExoplanetData/Astronet-Triage-master/Astronet-Triage-master/astronet/tess',
                      sector=43,
                      injected=False,
                      inject_dir='/sector-43',
-                     check_existence=True):
+                     check_existence=True,
+                     index=None):
     """Returns the light curve filename for a TESS target star.
 
     Args:
@@ -45,10 +100,18 @@ def tess_filenames(tic,
       injected_dir: Directory containing light curves with injected transits.
       check_existence: If True, only return filenames corresponding to files that
           exist.
+      index: Optional tess_index.TessIndex of base_dir. If given, the filename
+          is looked up in the index instead of being built from a fixed pattern
+          and checked for existence, and the latest file for the sector is
+          returned.
 
     Returns:
       filename for given TIC.
     """
+    if index is not None and not injected:
+        files = index.lookup(tic, sector=sector, product='lc')
+        return files[-1].path if files else None
+
     tic = str(tic).rjust(16, '0')
 
     if not injected:
@@ -64,24 +127,34 @@ def tess_filenames(tic,
     return
 
 
-def read_tess_light_curve(filename, flux_key='KSPMagnitude', invert=True):
+def read_tess_light_curve(filename, flux_key='KSPMagnitude', invert=True, memmap=True, t_min=None, t_max=None):
     """Reads time and flux measurements for a TESS target star.
 
     Args:
       filename: str name of .fits file containing time and flux measurements.
       invert: Whether to reflect flux values around the median flux value. This is
         performed separately for each .fits file.
+      memmap: Whether to memory-map local files. See open_fits().
+      t_min: Optional minimum time. If t_min or t_max is given, only the rows of
+          the FITS table within [t_min, t_max] are decoded (see time_window()),
+          and cadences without a valid time are dropped.
+      t_max: Optional maximum time.
 
     Returns:
       time: The time values of the light curve.
       flux: The flux values of the light curve.
     """
-    with fits.open(io.gfile.GFile(filename, mode="rb")) as hdu_list:
-        time = hdu_list[1].data['TIME']
-        flux = hdu_list[1].data['PDCSAP_FLUX']
-
-        if 'QUALITY' in fits.getdata(filename, ext=1).columns.names:
-            quality_flag = np.where(np.array(hdu_list[1].data['QUALITY']) == 0)
+    with open_fits(filename, memmap=memmap) as hdu_list:
+        table = hdu_list[1].data
+        time = _to_native(table['TIME'])
+        rows = time_window(time, t_min, t_max)
+        # Only the rows in the window are decoded from here on.
+        table = table[rows]
+        time = time[rows]
+        flux = _to_native(table['PDCSAP_FLUX'])
+
+        if 'QUALITY' in hdu_list[1].columns.names:
+            quality_flag = np.where(_to_native(table['QUALITY']) == 0)
 
             # Remove outliers
             time = time[quality_flag]
@@ -92,6 +165,11 @@ def read_tess_light_curve(filename, flux_key='KSPMagnitude', invert=True):
             time = time[valid_indices]
             flux = flux[valid_indices]
 
+    if t_min is not None or t_max is not None:
+        timed = np.isfinite(time)
+        time = time[timed]
+        flux = flux[timed]
+
     if invert:
         flux *= -1
 
@@ -152,6 +152,23 @@ class LightCurveUtilTest(absltest.TestCase):
     self.assertSequenceAlmostEqual([10, 17, 18], output_time[1])
     self.assertSequenceAlmostEqual([100, 170, 180], output_flux[1])
 
+    # Events masked in several chunks.
+    time = np.arange(0, 100, 0.5)
+    events = [
+        periodic_event.Event(period=p, duration=0.2, t0=0.1 * p)
+        for p in np.linspace(3, 10, 50)
+    ]
+    expected = np.ones_like(time, dtype=bool)
+    for event in events:
+      expected &= np.abs(util.phase_fold_time(time, event.period,
+                                              event.t0)) > 0.1
+    self.addCleanup(setattr, util, "_EVENT_MASK_CHUNK_SIZE",
+                    util._EVENT_MASK_CHUNK_SIZE)
+    util._EVENT_MASK_CHUNK_SIZE = 1000
+    output_time, output_flux = util.remove_events(time, 10 * time, events)
+    np.testing.assert_array_equal(time[expected], output_time)
+    np.testing.assert_array_equal(10 * time[expected], output_flux)
+
   def testInterpolateMaskedSpline(self):
     all_time = [
         np.arange(0, 10, dtype=np.float),
@@ -186,6 +203,149 @@ class LightCurveUtilTest(absltest.TestCase):
     np.testing.assert_array_equal([25, 50, 25, 0, 25, 50, 50, 50, 50],
                                   points_in_transit)
 
+    with self.assertRaises(ValueError):
+      util.count_transit_points(time, event, max_transits=5)
+
+    # By default, at most 10**6 transits are allowed.
+    with self.assertRaises(ValueError):
+      util.count_transit_points(time, periodic_event.Event(1e-5, 1e-6, 0))
+
+  def testTransitStats(self):
+    rng = np.random.RandomState(2)
+    time = np.sort(rng.uniform(0, 20, 2000))
+    flux = rng.normal(1, 0.01, 2000)
+    flux[rng.randint(2000, size=10)] = np.nan
+    event = periodic_event.Event(period=2.5, duration=0.3, t0=1.1)
+    in_transit = np.abs(util.phase_fold_time(time, 2.5, 1.1)) <= 0.15
+    flux[in_transit] -= 0.05
+
+    stats = util.transit_stats(time, flux, event, baseline_durations=0.5)
+    np.testing.assert_allclose(np.arange(1.1, 20, 2.5), stats.midpoint)
+
+    # Brute force.
+    valid = np.isfinite(flux)
+    for k, midpoint in enumerate(stats.midpoint):
+      distance = np.abs(time - midpoint)
+      points_in = flux[valid & (distance <= 0.15)]
+      points_out = flux[valid & (distance > 0.15) & (distance <= 0.3)]
+      self.assertEqual(len(points_in), stats.num_points[k])
+      self.assertEqual(len(points_out), stats.num_baseline_points[k])
+      self.assertAlmostEqual(np.mean(points_in), stats.mean_flux[k])
+      self.assertAlmostEqual(np.mean(points_out), stats.baseline[k])
+      self.assertAlmostEqual(
+          (np.mean(points_out) - np.mean(points_in)) /
+          (np.std(points_out, ddof=1) / np.sqrt(len(points_in))),
+          stats.snr[k])
+      self.assertGreater(stats.snr[k], 10)
+
+    # Transits without points.
+    outside_gap = (time < 5) | (time > 9)
+    stats = util.transit_stats(time[outside_gap], flux[outside_gap], event)
+    np.testing.assert_array_equal([0, 0], stats.num_points[2:4])
+    self.assertTrue(np.all(np.isnan(stats.mean_flux[2:4])))
+    self.assertTrue(np.all(np.isnan(stats.snr[2:4])))
+
+
+  def testStitch(self):
+    segments = [
+        (np.array([20., 21., 22.]), np.array([2., 2., 2.]),
+         np.array([[1., 2., 3.], [4., 5., 6.]])),
+        (np.array([0., np.nan, 2.]), np.array([0., 0., 0.]),
+         np.array([[7., 8., 9.], [10., 11., 12.]])),
+        (np.array([10., 11.]), np.array([1., 1.]),
+         np.array([[13., 14.], [15., 16.]])),
+    ]
+    time, flux, flux_2d = util.stitch(segments)
+    np.testing.assert_array_equal([0, np.nan, 2, 10, 11, 20, 21, 22], time)
+    np.testing.assert_array_equal([0, 0, 0, 1, 1, 2, 2, 2], flux)
+    np.testing.assert_array_equal(
+        [[7, 8, 9, 13, 14, 1, 2, 3], [10, 11, 12, 15, 16, 4, 5, 6]], flux_2d)
+
+  def testStitchOverlapping(self):
+    time, flux = util.stitch([(np.array([0., 2., 4.]), np.array([0., 2., 4.])),
+                              (np.array([1., 3.]), np.array([1., 3.]))])
+    np.testing.assert_array_equal([0, 1, 2, 3, 4], time)
+    np.testing.assert_array_equal([0, 1, 2, 3, 4], flux)
+
+  def testBoxSearch(self):
+    rng = np.random.RandomState(0)
+    time = np.sort(rng.uniform(0, 10, 200))
+    flux = rng.normal(0, 0.1, 200)
+    flux[np.abs(time - 6) < 0.3] -= 1
+
+    t0, duration, r, s = util.box_search(time, flux, 0.6)
+    self.assertTrue(np.all(duration == 0.6))
+    self.assertAlmostEqual(6, t0[np.argmin(s)], delta=0.1)
+
+    # Brute force.
+    grid = np.arange(time[0] + 0.6, time[-1] - 0.6, 0.06)
+    enough = [np.sum(np.abs(time - t) < 0.6) >= 5 for t in grid]
+    np.testing.assert_array_equal(grid[enough], t0)
+    for i, t in enumerate(t0):
+      in_box = (time >= t - 0.3) & (time < t + 0.3)
+      self.assertAlmostEqual(np.sum(flux[in_box]) / 200, s[i])
+      self.assertAlmostEqual((np.sum(in_box) + 1) / 200, r[i])
+
+    # Several durations; trials with too few points are dropped.
+    t0, duration, _, _ = util.box_search(time, flux, [0.05, 2.0],
+                                         min_points=20)
+    np.testing.assert_array_equal([2.0], np.unique(duration))
+    np.testing.assert_array_equal(
+        np.arange(time[0] + 2, time[-1] - 2, 0.2), t0)
+
+  def testTransitEpochs(self):
+    time = np.array([-3.5, -2., -0.1, 0., 2.5, 2.9, 10.])
+    np.testing.assert_array_equal([-1, 0, 0, 1, 2, 2, 6],
+                                  util.transit_epochs(time, period=2, t0=-1))
+
+  def testEpochDepths(self):
+    rng = np.random.RandomState(1)
+    time = np.sort(rng.uniform(0, 30, 3000))
+    flux = rng.normal(1, 0.001, 3000)
+    epoch = util.transit_epochs(time, period=3, t0=1)
+    distance = np.abs(util.phase_fold_time(time, period=3, t0=1))
+    in_transit = distance < 0.1
+    flux[in_transit & (epoch % 2 == 0)] -= 0.01
+    flux[in_transit & (epoch % 2 == 1)] -= 0.005
+
+    depth, depth_err, num_in_transit = util.epoch_depths(
+        time, flux, period=3, t0=1, duration=0.2)
+    for parity in [0, 1]:
+      group = epoch % 2 == parity
+      points_in = flux[group & in_transit]
+      points_out = flux[group & ~in_transit]
+      self.assertAlmostEqual(
+          np.mean(points_out) - np.mean(points_in), depth[parity])
+      self.assertAlmostEqual(
+          np.sqrt(np.var(points_in, ddof=1) / len(points_in) +
+                  np.var(points_out, ddof=1) / len(points_out)),
+          depth_err[parity])
+      self.assertEqual(len(points_in), num_in_transit[parity])
+    self.assertAlmostEqual(0.01, depth[0], delta=5 * depth_err[0])
+    self.assertAlmostEqual(0.005, depth[1], delta=5 * depth_err[1])
+
+    # The flat bottom is used if it has enough points.
+    full = distance < 0.05
+    depth, _, num_in_transit = util.epoch_depths(
+        time, flux, period=3, t0=1, duration=0.2, full_duration=0.1)
+    self.assertEqual(np.sum(full & (epoch % 2 == 0)), num_in_transit[0])
+    depth, _, num_in_transit = util.epoch_depths(
+        time, flux, period=3, t0=1, duration=0.2, full_duration=0.1,
+        min_full_points=1000)
+    self.assertEqual(np.sum(in_transit & (epoch % 2 == 0)), num_in_transit[0])
+
+    # Arbitrary groups; empty groups have undefined depths.
+    groups = (time > 15).astype(int) * 2
+    depth, depth_err, num_in_transit = util.epoch_depths(
+        time, flux, period=3, t0=1, duration=0.2, groups=groups)
+    self.assertLen(depth, 3)
+    self.assertEqual(0, num_in_transit[1])
+    self.assertTrue(np.isnan(depth[1]))
+    self.assertTrue(np.isnan(depth_err[1]))
+    late = time > 15
+    self.assertAlmostEqual(
+        np.mean(flux[late & ~in_transit]) - np.mean(flux[late & in_transit]),
+        depth[2])
 
 if __name__ == "__main__":
   absltest.main()
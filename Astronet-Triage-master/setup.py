@@ -0,0 +1,81 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Builds the Python extension modules over the C++ light curve library.
+
+The modules in light_curve_util/cc/python have the same interface as the CLIF
+wrappers in that directory. preprocess.py uses them when they are importable
+and falls back to NumPy otherwise. Requires a C++17 compiler and Abseil, which
+is found with pkg-config (e.g. the libabsl-dev package on Debian and Ubuntu).
+
+Usage:
+  python setup.py build_ext --inplace
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import subprocess
+
+import numpy as np
+from setuptools import Extension
+from setuptools import setup
+
+_CC_DIR = "light_curve_util/cc/"
+
+# Sources of the C++ library, as in light_curve_util/cc/BUILD.
+_MEDIAN_FILTER_SRCS = [_CC_DIR + "median_filter.cc"]
+_PHASE_FOLD_SRCS = [_CC_DIR + "phase_fold.cc"]
+_VIEW_GENERATOR_SRCS = [
+    _CC_DIR + "view_generator.cc",
+    _CC_DIR + "median_filter.cc",
+    _CC_DIR + "normalize.cc",
+    _CC_DIR + "phase_fold.cc",
+]
+
+
+def _abseil_flags():
+  """Returns (compile_args, link_args) for the Abseil strings library."""
+  try:
+    cflags, libs = [
+        subprocess.check_output(["pkg-config", flag, "absl_strings"],
+                                universal_newlines=True).split()
+        for flag in ("--cflags", "--libs")
+    ]
+  except (OSError, subprocess.CalledProcessError):
+    cflags, libs = [], ["-labsl_strings", "-labsl_strings_internal",
+                        "-labsl_int128", "-labsl_throw_delegate",
+                        "-labsl_raw_logging_internal"]
+  return cflags, libs
+
+
+def _extension(name, sources):
+  cflags, libs = _abseil_flags()
+  return Extension(
+      "light_curve_util.cc.python." + name,
+      sources=[_CC_DIR + "python/%s_ext.cc" % name] + sources,
+      include_dirs=[".", np.get_include()],
+      extra_compile_args=["-std=c++17", "-O3"] + cflags,
+      extra_link_args=libs,
+      language="c++")
+
+
+setup(
+    name="astronet-light-curve-util-cc",
+    ext_modules=[
+        _extension("median_filter", _MEDIAN_FILTER_SRCS),
+        _extension("phase_fold", _PHASE_FOLD_SRCS),
+        _extension("view_generator", _VIEW_GENERATOR_SRCS),
+    ])
@@ -4,10 +4,12 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import functools
 import warnings
 
 import numpy as np
 from pydl.pydlutils import bspline
+from scipy import linalg
 
 from third_party.robust_mean import robust_mean
 
@@ -22,7 +24,121 @@ class SplineError(Exception):
   pass
 
 
-def kepler_spline(time, flux, bkspace=1.5, maxiter=5, outlier_cut=3):
+class _BandedBSpline(object):
+  """Cubic B-spline least-squares fitter for one light curve segment.
+
+  The break points are placed as in pydlutils.bspline: uniformly spaced over
+  [t_min, t_max] at the largest spacing no larger than bkspace, and extended by
+  3 break points on either side. Each time value is in the support of 4
+  consecutive basis functions, so the design matrix is stored as the index of
+  the first of them and the 4 basis values. The products of the basis values,
+  which make up the normal equations, are computed once, so that each fit only
+  reweights the rows and solves a banded system with bandwidth 3. Time values
+  outside [t_min, t_max] are extrapolated from the first or last interval.
+  """
+
+  def __init__(self, time, bkspace, t_min, t_max):
+    """Computes the design matrix.
+
+    Args:
+      time: Numpy array; the time values of the segment.
+      bkspace: Spline break point spacing in time units.
+      t_min: The first break point.
+      t_max: The last break point.
+
+    Raises:
+      SplineError: If t_min is not less than t_max.
+    """
+    if t_min >= t_max:
+      raise SplineError("Cannot fit a spline on points with equal time values.")
+    self.t_range = (t_min, t_max)
+    nintervals = max(int((t_max - t_min) / bkspace), 1)
+    self.num_coeffs = nintervals + 3
+
+    # Index and fractional position of the interval containing each time.
+    u = (time - t_min) * (nintervals / (t_max - t_min))
+    self.first = np.clip(np.floor(u).astype(np.int64), 0, nintervals - 1)
+    u -= self.first
+
+    # Values of the 4 nonzero uniform cubic B-splines.
+    v = 1 - u
+    self.basis = np.stack([
+        v**3, 4 - 3 * u**2 * (1 + v), 4 - 3 * v**2 * (1 + u), u**3
+    ]) / 6
+
+    # Products of the basis values making up the normal equations. The product
+    # of basis[i] and basis[j] for i <= j is added to the entry in row
+    # first + i and column first + j, which is on the superdiagonal j - i.
+    self.products = [(j - i, j, self.basis[i] * self.basis[j])
+                     for i in range(4)
+                     for j in range(i, 4)]
+
+  def _bincount(self, i, weights):
+    return np.bincount(
+        self.first + i, weights=weights, minlength=self.num_coeffs)
+
+  def fit(self, flux, weights):
+    """Fits the spline by weighted least squares.
+
+    Args:
+      flux: Numpy array; the flux values of the segment.
+      weights: Numpy array; the weight of each flux value, e.g. a boolean mask.
+
+    Returns:
+      The values of the fitted spline at the time values of the segment.
+
+    Raises:
+      SplineError: If the normal equations are singular, e.g. if a basis
+          function has no weighted points in its support.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+
+    # Normal equations, with the matrix in the upper banded form of
+    # linalg.solveh_banded().
+    normal = np.zeros((4, self.num_coeffs))
+    for offset, j, product in self.products:
+      normal[3 - offset] += self._bincount(j, weights * product)
+    rhs = sum(
+        self._bincount(i, weights * flux * self.basis[i]) for i in range(4))
+
+    # Treat basis functions with negligible weight as singular, as in
+    # pydlutils.bspline.
+    min_weight = 1e-10 * np.sum(weights) / self.num_coeffs
+    bad_coeffs = np.flatnonzero(normal[3] <= min_weight)
+    if bad_coeffs.size:
+      raise SplineError(
+          "Spline coefficients %s have negligible weight. There are "
+          "insufficient points in their support." % bad_coeffs)
+    try:
+      coeffs = linalg.solveh_banded(normal, rhs, check_finite=False)
+    except linalg.LinAlgError as e:
+      raise SplineError(str(e))
+
+    return sum(coeffs[self.first + i] * self.basis[i] for i in range(4))
+
+
+def _fit_banded(banded_spline, time, flux, bkspace, mask):
+  """Fits a _BandedBSpline on the non-outlier points of a segment.
+
+  The break points span the non-outlier points, so the design matrix of the
+  previous iteration is reused unless the first or last point is an outlier.
+
+  Returns:
+    banded_spline: The _BandedBSpline used for the fit.
+    spline: The values of the fitted spline at the time values.
+  """
+  t_range = (np.min(time[mask]), np.max(time[mask]))
+  if banded_spline is None or banded_spline.t_range != t_range:
+    banded_spline = _BandedBSpline(time, bkspace, *t_range)
+  return banded_spline, banded_spline.fit(flux, mask)
+
+
+def kepler_spline(time,
+                  flux,
+                  bkspace=1.5,
+                  maxiter=5,
+                  outlier_cut=3,
+                  backend="pydl"):
   """Computes a best-fit spline curve for a light curve segment.
 
   The spline is fit using an iterative process to remove outliers that may cause
@@ -40,6 +156,13 @@ def kepler_spline(time, flux, bkspace=1.5, maxiter=5, outlier_cut=3):
         fit points.
     outlier_cut: The maximum number of standard deviations from the median
         spline residual before a point is considered an outlier.
+    backend: The spline fitting implementation; either "pydl", which refits
+        the spline with pydlutils.bspline.iterfit() in each iteration, or
+        "banded", which computes the B-spline design matrix once and solves the
+        banded normal equations with the outliers given zero weight. The
+        results agree to within rounding, except that "banded" raises
+        SplineError where pydl would drop the break points of intervals with
+        insufficient points.
 
   Returns:
     spline: The values of the fitted spline corresponding to the input time
@@ -51,7 +174,11 @@ def kepler_spline(time, flux, bkspace=1.5, maxiter=5, outlier_cut=3):
         outliers) for spline fitting.
     SplineError: If the spline could not be fit, for example if the breakpoint
         spacing is too small.
+    ValueError: If backend is not recognized.
   """
+  if backend not in ("pydl", "banded"):
+    raise ValueError("Unrecognized spline backend: %s" % backend)
+
   if len(time) < 4:
     raise InsufficientPointsError(
         "Cannot fit a spline on less than 4 points. Got %d points." % len(time))
@@ -62,6 +189,8 @@ def kepler_spline(time, flux, bkspace=1.5, maxiter=5, outlier_cut=3):
   time = (time - t_min) / (t_max - t_min)
   bkspace /= (t_max - t_min)  # Rescale bucket spacing.
 
+  banded_spline = None
+
   # Values of the best fitting spline evaluated at the time points.
   spline = None
 
@@ -93,22 +222,27 @@ def kepler_spline(time, flux, bkspace=1.5, maxiter=5, outlier_cut=3):
           "Cannot fit a spline on less than 4 points. After removing "
           "outliers, got %d points." % np.sum(mask))
 
-    try:
-      with warnings.catch_warnings():
-        # Suppress warning messages printed by pydlutils.bspline. Instead we
-        # catch any exception and raise a more informative error.
-        warnings.simplefilter("ignore")
-
-        # Fit the spline on non-outlier points.
-        curve = bspline.iterfit(time[mask], flux[mask], bkspace=bkspace)[0]
-
-      # Evaluate spline at the time points.
-      spline = curve.value(time)[0]
-    except (IndexError, TypeError) as e:
-      raise SplineError(
-          "Fitting spline failed with error: '%s'. This might be caused by the "
-          "breakpoint spacing being too small, and/or there being insufficient "
-          "points to fit the spline in one of the intervals." % e)
+    if backend == "banded":
+      banded_spline, spline = _fit_banded(banded_spline, time, flux, bkspace,
+                                          mask)
+    else:
+      try:
+        with warnings.catch_warnings():
+          # Suppress warning messages printed by pydlutils.bspline. Instead we
+          # catch any exception and raise a more informative error.
+          warnings.simplefilter("ignore")
+
+          # Fit the spline on non-outlier points.
+          curve = bspline.iterfit(time[mask], flux[mask], bkspace=bkspace)[0]
+
+        # Evaluate spline at the time points.
+        spline = curve.value(time)[0]
+      except (IndexError, TypeError) as e:
+        raise SplineError(
+            "Fitting spline failed with error: '%s'. This might be caused by "
+            "the breakpoint spacing being too small, and/or there being "
+            "insufficient points to fit the spline in one of the intervals." %
+            e)
 
   return spline, mask
 
@@ -138,12 +272,149 @@ class SplineMetadata(object):
     self.bic = None
 
 
+def _cancel_after_spline_error(later_fits, fit):
+  """Cancels later_fits if fit raised a SplineError."""
+  if not fit.cancelled() and isinstance(fit.exception(), SplineError):
+    for later_fit in later_fits:
+      later_fit.cancel()
+
+
+def _submit_fits(executor, all_time, all_flux, bkspace, maxiter, backend):
+  """Submits the fits of all segments for one break-point spacing.
+
+  Once a segment raises SplineError, the bkspace is skipped, so the fits of the
+  later segments are cancelled if they haven't started yet.
+
+  Returns:
+    List of callables returning the result of kepler_spline() on each segment.
+  """
+  fits = [
+      executor.submit(kepler_spline, time, flux, bkspace=bkspace,
+                      maxiter=maxiter, backend=backend)
+      for time, flux in zip(all_time, all_flux)
+  ]
+  for i, fit in enumerate(fits):
+    fit.add_done_callback(
+        functools.partial(_cancel_after_spline_error, fits[i + 1:]))
+  return [fit.result for fit in fits]
+
+
+# Segments with up to this many points are fit in lockstep by
+# _fit_banded_segments(). Longer ones are fit one at a time, which is faster at
+# that size.
+_MAX_BATCH_SEGMENT_SIZE = 2048
+
+
+def _fit_banded_segments(all_time, all_flux, bkspaces, maxiter, outlier_cut=3):
+  """Fits the banded kepler_spline() of all segments and bkspaces in lockstep.
+
+  The outlier iterations of all fits advance together, so that the outliers of
+  every fit that hasn't converged are found with a single
+  robust_mean.robust_mean_batch() call on the padded residuals. Segments with
+  more than _MAX_BATCH_SEGMENT_SIZE points are left to kepler_spline().
+
+  Returns:
+    For each bkspace, a list of callables returning the result of
+    kepler_spline(time, flux, bkspace, maxiter, outlier_cut, backend="banded")
+    on each segment, or raising its error.
+  """
+  # The result or error of each fit, or a callable for the long segments.
+  results = [[None] * len(all_time) for _ in bkspaces]
+
+  # (bkspace index, segment index) to [time, flux, bkspace, banded_spline,
+  # spline, mask] for the fits still iterating.
+  fits = {}
+  for i, (time, flux) in enumerate(zip(all_time, all_flux)):
+    if len(time) > _MAX_BATCH_SEGMENT_SIZE:
+      for j, bkspace in enumerate(bkspaces):
+        results[j][i] = functools.partial(
+            kepler_spline, time, flux, bkspace=bkspace, maxiter=maxiter,
+            outlier_cut=outlier_cut, backend="banded")
+      continue
+
+    if len(time) < 4:
+      error = InsufficientPointsError(
+          "Cannot fit a spline on less than 4 points. Got %d points." %
+          len(time))
+      for j in range(len(bkspaces)):
+        results[j][i] = error
+      continue
+
+    # Rescale time into [0, 1].
+    t_min = np.min(time)
+    t_max = np.max(time)
+    time = (time - t_min) / (t_max - t_min)
+    mask = np.ones_like(time, dtype=np.bool)  # Try to fit all points.
+    for j, bkspace in enumerate(bkspaces):
+      segment_bkspace = bkspace / (t_max - t_min)  # Rescale bucket spacing.
+      try:
+        banded_spline, spline = _fit_banded(None, time, flux, segment_bkspace,
+                                            mask)
+      except SplineError as e:
+        results[j][i] = e
+        continue
+      fits[j, i] = [time, flux, segment_bkspace, banded_spline, spline, mask]
+
+  for _ in range(maxiter - 1):
+    if not fits:
+      break
+
+    # Pad the residuals of the remaining fits to the same length.
+    keys = sorted(fits)
+    lengths = np.array([len(fits[key][0]) for key in keys])
+    residuals = np.zeros((len(keys), np.max(lengths)))
+    valid = np.arange(np.max(lengths)) < lengths[:, np.newaxis]
+    for row, key in enumerate(keys):
+      _, flux, _, _, spline, _ = fits[key]
+      residuals[row, :lengths[row]] = flux - spline
+    new_masks = robust_mean.robust_mean_batch(
+        residuals, cut=outlier_cut, valid=valid)[2]
+
+    for row, (j, i) in enumerate(keys):
+      time, flux, segment_bkspace, banded_spline, spline, mask = fits.pop(
+          (j, i))
+      new_mask = new_masks[row, :lengths[row]]
+      if np.all(new_mask == mask):
+        results[j][i] = (spline, mask)  # Spline converged.
+        continue
+
+      if np.sum(new_mask) < 4:
+        results[j][i] = InsufficientPointsError(
+            "Cannot fit a spline on less than 4 points. After removing "
+            "outliers, got %d points." % np.sum(new_mask))
+        continue
+
+      try:
+        banded_spline, spline = _fit_banded(banded_spline, time, flux,
+                                            segment_bkspace, new_mask)
+      except SplineError as e:
+        results[j][i] = e
+        continue
+      fits[j, i] = [time, flux, segment_bkspace, banded_spline, spline,
+                    new_mask]
+
+  for (j, i), (_, _, _, _, spline, mask) in fits.items():
+    results[j][i] = (spline, mask)
+  return [[result if callable(result) else
+           functools.partial(_result_or_raise, result) for result in row]
+          for row in results]
+
+
+def _result_or_raise(result):
+  """Returns result, or raises it if it is an exception."""
+  if isinstance(result, Exception):
+    raise result
+  return result
+
+
 def choose_kepler_spline(all_time,
                          all_flux,
                          bkspaces,
                          maxiter=5,
                          penalty_coeff=1.0,
-                         verbose=True):
+                         verbose=True,
+                         executor=None,
+                         backend="pydl"):
   """Computes the best-fit Kepler spline across a break-point spacings.
 
   Some Kepler light curves have low-frequency variability, while others have
@@ -171,6 +442,15 @@ def choose_kepler_spline(all_time,
     verbose: Whether to log individual spline errors. Note that if bkspaces
         contains many values (particularly small ones) then this may cause
         logging pollution if calling this function for many light curves.
+    executor: Optional concurrent.futures.Executor, e.g. a
+        ProcessPoolExecutor. If given, the splines of all (bkspace, segment)
+        pairs are fit concurrently in the executor, and the BIC of each
+        bkspace is computed from the results. Fits of a bkspace that already
+        failed with SplineError are cancelled. The results are the same as
+        without an executor.
+    backend: The spline fitting implementation passed to kepler_spline().
+        Without an executor, the "banded" fits of all segments and bkspaces
+        find their outliers together with robust_mean.robust_mean_batch().
 
   Returns:
     spline: List of numpy arrays; values of the best-fit spline corresponding to
@@ -201,7 +481,22 @@ def choose_kepler_spline(all_time,
   # https://www.mathworks.com/help/stats/mad.html.
   sigma = np.median(np.abs(scaled_diffs)) * 1.48
 
-  for bkspace in bkspaces:
+  # For each bkspace, a list of callables returning the fit of each segment.
+  if executor is None and backend == "banded":
+    all_fits = _fit_banded_segments(all_time, all_flux, bkspaces, maxiter)
+  elif executor is None:
+    all_fits = (
+        [functools.partial(kepler_spline, time, flux, bkspace=bkspace,
+                           maxiter=maxiter, backend=backend)
+         for time, flux in zip(all_time, all_flux)]
+        for bkspace in bkspaces)
+  else:
+    all_fits = [
+        _submit_fits(executor, all_time, all_flux, bkspace, maxiter, backend)
+        for bkspace in bkspaces
+    ]
+
+  for bkspace, fits in zip(bkspaces, all_fits):
     nparams = 0  # Total number of free parameters in the piecewise spline.
     npoints = 0  # Total number of data points used to fit the piecewise spline.
     ssr = 0  # Sum of squared residuals between the model and the spline.
@@ -209,11 +504,10 @@ def choose_kepler_spline(all_time,
     spline = []
     light_curve_mask = []
     bad_bkspace = False  # Indicates that the current bkspace should be skipped.
-    for time, flux in zip(all_time, all_flux):
+    for time, flux, fit in zip(all_time, all_flux, fits):
       # Fit B-spline to this light-curve segment.
       try:
-        spline_piece, mask = kepler_spline(
-            time, flux, bkspace=bkspace, maxiter=maxiter)
+        spline_piece, mask = fit()
       except InsufficientPointsError as e:
         # It's expected to occasionally see intervals with insufficient points,
         # especially if periodic signals have been removed from the light curve.
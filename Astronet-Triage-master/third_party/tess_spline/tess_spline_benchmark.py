@@ -0,0 +1,98 @@
+r"""Benchmarks the spline fitting backends of tess_spline.py.
+
+Splines are fit to synthetic light curves (stellar variability, white noise
+and a few outliers), with kepler_spline() for a single break-point spacing and
+with choose_kepler_spline() over a range of break-point spacings. The maximum
+absolute difference between the splines of the two backends is also reported.
+
+Usage:
+  python third_party/tess_spline/tess_spline_benchmark.py --points 1000 20000
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import functools
+import timeit
+import warnings
+
+import numpy as np
+
+from third_party.tess_spline import tess_spline
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument(
+    "--points",
+    type=int,
+    nargs="+",
+    default=[1000, 5000, 20000, 100000],
+    help="Numbers of light curve points to benchmark.")
+
+parser.add_argument(
+    "--repeats",
+    type=int,
+    default=3,
+    help="Number of timing repeats; the best time is reported.")
+
+
+def _synthetic_light_curve(rng, num_points):
+  """Returns the segments of a synthetic 27-day light curve."""
+  time = np.linspace(0, 27, num_points)
+  flux = 1 + 0.01 * np.sin(2 * np.pi * time / 3.7) + 0.003 * np.sin(time)
+  flux += rng.normal(scale=1e-3, size=num_points)
+  flux[rng.randint(num_points, size=num_points // 200)] -= 0.01
+
+  # Split at the orbit gap, as for TESS.
+  gap = (time > 13) & (time < 14)
+  before = ~gap & (time < 14)
+  after = ~gap & (time > 13)
+  return [time[before], time[after]], [flux[before], flux[after]]
+
+
+def _max_diff(pydl_splines, banded_splines):
+  return max(
+      np.max(np.abs(a - b)) for a, b in zip(pydl_splines, banded_splines))
+
+
+def main():
+  flags = parser.parse_args()
+  rng = np.random.RandomState(0)
+  bkspaces = np.logspace(np.log10(0.5), np.log10(5), num=20)
+
+  print("%10s %16s %12s %12s %10s %12s" % ("points", "function", "pydl (s)",
+                                           "banded (s)", "speedup",
+                                           "max diff"))
+  for num_points in flags.points:
+    all_time, all_flux = _synthetic_light_curve(rng, num_points)
+
+    def fit_segments(backend):
+      return [
+          tess_spline.kepler_spline(t, f, bkspace=0.5, backend=backend)[0]
+          for t, f in zip(all_time, all_flux)
+      ]
+
+    def choose_spline(backend):
+      return tess_spline.choose_kepler_spline(
+          all_time, all_flux, bkspaces, verbose=False, backend=backend)[0]
+
+    for name, fn in [("kepler_spline", fit_segments),
+                     ("choose_spline", choose_spline)]:
+      times = [
+          min(
+              timeit.repeat(
+                  functools.partial(fn, backend),
+                  number=1,
+                  repeat=flags.repeats)) for backend in ("pydl", "banded")
+      ]
+      max_diff = _max_diff(fn("pydl"), fn("banded"))
+      print("%10d %16s %12.4f %12.4f %9.1fx %12.2g" %
+            (num_points, name, times[0], times[1], times[0] / times[1],
+             max_diff))
+
+
+if __name__ == "__main__":
+  warnings.simplefilter("ignore")
+  main()
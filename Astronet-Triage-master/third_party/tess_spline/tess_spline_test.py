@@ -1,13 +1,15 @@
-"""Tests for kepler_spline.py."""
+"""Tests for tess_spline.py."""
 
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from concurrent import futures
+
 from absl.testing import absltest
 import numpy as np
 
-from third_party.kepler_spline import kepler_spline
+from third_party.tess_spline import tess_spline
 
 
 class KeplerSplineTest(absltest.TestCase):
@@ -18,7 +20,7 @@ class KeplerSplineTest(absltest.TestCase):
     flux = np.sin(time)
 
     # Expect very close fit with no outliers removed.
-    spline, mask = kepler_spline.kepler_spline(time, flux, bkspace=0.5)
+    spline, mask = tess_spline.kepler_spline(time, flux, bkspace=0.5)
     rmse = np.sqrt(np.mean((flux[mask] - spline[mask])**2))
     self.assertLess(rmse, 1e-4)
     self.assertTrue(np.all(mask))
@@ -29,7 +31,7 @@ class KeplerSplineTest(absltest.TestCase):
     flux[95] = 2.9
 
     # Expect a close fit with outliers removed.
-    spline, mask = kepler_spline.kepler_spline(time, flux, bkspace=0.5)
+    spline, mask = tess_spline.kepler_spline(time, flux, bkspace=0.5)
     rmse = np.sqrt(np.mean((flux[mask] - spline[mask])**2))
     self.assertLess(rmse, 1e-4)
     self.assertEqual(np.sum(mask), 97)
@@ -38,7 +40,7 @@ class KeplerSplineTest(absltest.TestCase):
     self.assertFalse(mask[95])
 
     # Increase breakpoint spacing. Fit is not quite as close.
-    spline, mask = kepler_spline.kepler_spline(time, flux, bkspace=1)
+    spline, mask = tess_spline.kepler_spline(time, flux, bkspace=1)
     rmse = np.sqrt(np.mean((flux[mask] - spline[mask])**2))
     self.assertLess(rmse, 2e-3)
     self.assertEqual(np.sum(mask), 97)
@@ -55,7 +57,7 @@ class KeplerSplineTest(absltest.TestCase):
     # because a cubic spline will fit a cubic polynomial ~exactly, so the
     # standard deviation of residuals will be ~0, which will cause some closely
     # fit points to be rejected.
-    spline, mask = kepler_spline.kepler_spline(
+    spline, mask = tess_spline.kepler_spline(
         time, flux, bkspace=0.5, maxiter=1)
     rmse = np.sqrt(np.mean((flux[mask] - spline[mask])**2))
     self.assertLess(rmse, 1e-12)
@@ -66,15 +68,44 @@ class KeplerSplineTest(absltest.TestCase):
     time = np.array([])
     flux = np.array([])
 
-    with self.assertRaises(kepler_spline.InsufficientPointsError):
-      kepler_spline.kepler_spline(time, flux, bkspace=0.5)
+    with self.assertRaises(tess_spline.InsufficientPointsError):
+      tess_spline.kepler_spline(time, flux, bkspace=0.5)
 
     # Only 3 points.
     time = np.array([0.1, 0.2, 0.3])
     flux = np.sin(time)
 
-    with self.assertRaises(kepler_spline.InsufficientPointsError):
-      kepler_spline.kepler_spline(time, flux, bkspace=0.5)
+    with self.assertRaises(tess_spline.InsufficientPointsError):
+      tess_spline.kepler_spline(time, flux, bkspace=0.5)
+
+  def testBandedBackend(self):
+    rng = np.random.RandomState(0)
+    for _ in range(20):
+      num_points = rng.randint(50, 2000)
+      time = np.sort(rng.uniform(0, rng.uniform(1, 30), num_points))
+      flux = 1 + 0.01 * np.sin(time * rng.uniform(0.5, 5))
+      flux += rng.normal(scale=1e-3, size=num_points)
+      # Add outliers, including the first point.
+      flux[rng.randint(num_points, size=3)] += 0.05
+      flux[0] -= 0.05
+      bkspace = rng.uniform(0.3, 3)
+
+      expected_spline, expected_mask = tess_spline.kepler_spline(
+          time, flux, bkspace=bkspace)
+      spline, mask = tess_spline.kepler_spline(
+          time, flux, bkspace=bkspace, backend="banded")
+      np.testing.assert_allclose(expected_spline, spline, rtol=0, atol=1e-6)
+      np.testing.assert_array_equal(expected_mask, mask)
+      self.assertFalse(mask[0])
+
+    # No points between 1 and 9.
+    time = np.concatenate([np.arange(0, 1, 0.1), np.arange(9, 10, 0.1)])
+    with self.assertRaises(tess_spline.SplineError):
+      tess_spline.kepler_spline(
+          time, np.sin(time), bkspace=0.5, backend="banded")
+
+    with self.assertRaises(ValueError):
+      tess_spline.kepler_spline(time, np.sin(time), backend="cubic")
 
 
 class ChooseKeplerSplineTest(absltest.TestCase):
@@ -86,7 +117,7 @@ class ChooseKeplerSplineTest(absltest.TestCase):
     # Logarithmically sample candidate break point spacings.
     bkspaces = np.logspace(np.log10(0.5), np.log10(5), num=20)
 
-    spline, metadata = kepler_spline.choose_kepler_spline(
+    spline, metadata = tess_spline.choose_kepler_spline(
         all_time, all_flux, bkspaces, penalty_coeff=1.0, verbose=False)
     np.testing.assert_array_equal(spline, [[]])
     np.testing.assert_array_equal(metadata.light_curve_mask, [[]])
@@ -103,7 +134,7 @@ class ChooseKeplerSplineTest(absltest.TestCase):
     # Logarithmically sample candidate break point spacings.
     bkspaces = np.logspace(np.log10(0.5), np.log10(5), num=20)
 
-    spline, metadata = kepler_spline.choose_kepler_spline(
+    spline, metadata = tess_spline.choose_kepler_spline(
         all_time, all_flux, bkspaces, penalty_coeff=1.0, verbose=False)
 
     # All segments are NaN.
@@ -119,7 +150,7 @@ class ChooseKeplerSplineTest(absltest.TestCase):
     all_time.append(np.arange(0.7, 2.0, 0.1))
     all_flux.append(np.sin(all_time[-1]))
 
-    spline, metadata = kepler_spline.choose_kepler_spline(
+    spline, metadata = tess_spline.choose_kepler_spline(
         all_time, all_flux, bkspaces, penalty_coeff=1.0, verbose=False)
 
     # First 3 segments are NaN.
@@ -149,7 +180,7 @@ class ChooseKeplerSplineTest(absltest.TestCase):
       return np.sqrt(np.mean((f - s)**2))
 
     # Penalty coefficient 1.0.
-    spline, metadata = kepler_spline.choose_kepler_spline(
+    spline, metadata = tess_spline.choose_kepler_spline(
         all_time, all_flux, bkspaces, penalty_coeff=1.0)
     self.assertAlmostEqual(_rmse(all_flux, spline), 0.013013)
     self.assertTrue(np.all(metadata.light_curve_mask))
@@ -160,7 +191,7 @@ class ChooseKeplerSplineTest(absltest.TestCase):
     self.assertAlmostEqual(metadata.bic, -5743.13027358158)
 
     # Decrease penalty coefficient; allow smaller spacing for closer fit.
-    spline, metadata = kepler_spline.choose_kepler_spline(
+    spline, metadata = tess_spline.choose_kepler_spline(
         all_time, all_flux, bkspaces, penalty_coeff=0.1)
     self.assertAlmostEqual(_rmse(all_flux, spline), 0.0066376)
     self.assertTrue(np.all(metadata.light_curve_mask))
@@ -172,7 +203,7 @@ class ChooseKeplerSplineTest(absltest.TestCase):
 
     # Increase penalty coefficient; require larger spacing at the cost of worse
     # fit.
-    spline, metadata = kepler_spline.choose_kepler_spline(
+    spline, metadata = tess_spline.choose_kepler_spline(
         all_time, all_flux, bkspaces, penalty_coeff=2)
     self.assertAlmostEqual(_rmse(all_flux, spline), 0.026215449)
     self.assertTrue(np.all(metadata.light_curve_mask))
@@ -182,6 +213,83 @@ class ChooseKeplerSplineTest(absltest.TestCase):
     self.assertAlmostEqual(metadata.penalty_term, 836.099270549629)
     self.assertAlmostEqual(metadata.bic, -4823.45710177978)
 
+  def testExecutor(self):
+    # Sine wave with a segment too short to fit.
+    all_time = [np.arange(0, 20, 0.1), np.arange(20, 40, 0.3),
+                np.arange(40, 60, 0.1), np.array([60.1, 60.2])]
+    all_flux = [np.sin(t) for t in all_time]
+    bkspaces = np.logspace(np.log10(0.5), np.log10(5), num=20)
+
+    expected_spline, expected_metadata = tess_spline.choose_kepler_spline(
+        all_time, all_flux, bkspaces, verbose=False)
+
+    with futures.ProcessPoolExecutor(max_workers=2) as executor:
+      spline, metadata = tess_spline.choose_kepler_spline(
+          all_time, all_flux, bkspaces, verbose=False, executor=executor)
+    for expected, actual in zip(expected_spline, spline):
+      np.testing.assert_array_equal(expected, actual)
+    for expected, actual in zip(expected_metadata.light_curve_mask,
+                                metadata.light_curve_mask):
+      np.testing.assert_array_equal(expected, actual)
+    self.assertEqual(expected_metadata.bkspace, metadata.bkspace)
+    self.assertEqual(expected_metadata.bad_bkspaces, metadata.bad_bkspaces)
+    self.assertEqual(expected_metadata.bic, metadata.bic)
+
+  def testBandedBackend(self):
+    all_time = [np.arange(0, 100, 0.1), np.arange(100, 200, 0.1)]
+    all_flux = [np.sin(t) for t in all_time]
+    bkspaces = np.logspace(np.log10(0.5), np.log10(5), num=20)
+
+    expected_spline, expected_metadata = tess_spline.choose_kepler_spline(
+        all_time, all_flux, bkspaces)
+    spline, metadata = tess_spline.choose_kepler_spline(
+        all_time, all_flux, bkspaces, backend="banded")
+    for expected, actual in zip(expected_spline, spline):
+      np.testing.assert_allclose(expected, actual, rtol=0, atol=1e-6)
+    self.assertTrue(np.all(metadata.light_curve_mask))
+    self.assertEqual(expected_metadata.bkspace, metadata.bkspace)
+    self.assertEmpty(metadata.bad_bkspaces)
+    self.assertAlmostEqual(expected_metadata.bic, metadata.bic, places=3)
+
+  def testBandedBackendSegmentsInLockstep(self):
+    # Segments with noise and outliers, one too short to fit and one with a
+    # gap too wide for small spacings.
+    rng = np.random.RandomState(0)
+    all_time = [np.arange(0, 20, 0.05), np.arange(20, 30, 0.02),
+                np.array([30.1, 30.2]),
+                np.concatenate([np.arange(40, 42, 0.05),
+                                np.arange(48, 50, 0.05)])]
+    all_flux = []
+    for time in all_time:
+      flux = np.sin(time) + rng.normal(scale=0.01, size=len(time))
+      flux[rng.randint(len(time), size=len(time) // 50)] += 0.2
+      all_flux.append(flux)
+    bkspaces = np.logspace(np.log10(0.3), np.log10(5), num=10)
+
+    # With an executor, each segment is fit by kepler_spline().
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+      expected_spline, expected_metadata = tess_spline.choose_kepler_spline(
+          all_time, all_flux, bkspaces, verbose=False, executor=executor,
+          backend="banded")
+
+    # Also fit the two long segments one at a time.
+    self.addCleanup(setattr, tess_spline, "_MAX_BATCH_SEGMENT_SIZE",
+                    tess_spline._MAX_BATCH_SEGMENT_SIZE)
+    for max_batch_segment_size in [tess_spline._MAX_BATCH_SEGMENT_SIZE, 100]:
+      tess_spline._MAX_BATCH_SEGMENT_SIZE = max_batch_segment_size
+      spline, metadata = tess_spline.choose_kepler_spline(
+          all_time, all_flux, bkspaces, verbose=False, backend="banded")
+      for expected, actual in zip(expected_spline, spline):
+        np.testing.assert_allclose(expected, actual, rtol=0, atol=1e-12)
+      for expected, actual in zip(expected_metadata.light_curve_mask,
+                                  metadata.light_curve_mask):
+        np.testing.assert_array_equal(expected, actual)
+      self.assertFalse(np.all(metadata.light_curve_mask[0]))
+      self.assertEqual(expected_metadata.bkspace, metadata.bkspace)
+      self.assertNotEmpty(metadata.bad_bkspaces)
+      self.assertEqual(expected_metadata.bad_bkspaces, metadata.bad_bkspaces)
+      self.assertAlmostEqual(expected_metadata.bic, metadata.bic)
+
 
 if __name__ == "__main__":
   absltest.main()
@@ -18,14 +18,24 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+from concurrent import futures
+
 import numpy as np
 import tensorflow as tf
 
+from light_curve_util import gaussian_process
 from light_curve_util import tess_io
 from light_curve_util import median_filter
+from light_curve_util import robust_stats
 from light_curve_util import util
 from light_curve_util.median_filter import SparseLightCurveError
-from statsmodels.robust import scale
+
+try:
+  # C++ median filter; built with `python setup.py build_ext --inplace`.
+  from light_curve_util.cc.python import median_filter as cc_median_filter
+except ImportError:
+  cc_median_filter = None
 
 # use this to trim multi-sector light curves to just the latest sector
 sector_start = {2: 1354.10475587519, 3: 1381.70892156158, 4: 1410.91724195171, 5: 1437.97973532546}
@@ -36,60 +46,238 @@ class EmptyLightCurveError(Exception):
 
 
 def read_and_process_light_curve(tic, tess_data_dir, sector=43, injected=False, inject_dir='/pdo/users/yuliang',
-                                 is_multi=False):
+                                 is_multi=False, app_sizes=None, cache=None, index=None, centroids=False,
+                                 gp_detrend=False, events=None, gp_timescale=1.0):
   """Reads an already detrended light curve.
 
   Args:
     tic: TIC id of the target star.
     tess_data_dir: Base directory containing TESS data. See
         tess_io.tess_filenames().
+    app_sizes: Optional sequence of additional centered aperture sizes. See
+        tess_io.read_tess_light_curve().
+    cache: Optional light_curve_cache.LightCurveCache. If given, the decoded and
+        cleaned arrays are looked up there before reading the FITS file, and
+        stored there after a miss.
+    index: Optional tess_index.TessIndex used to find the light curve file. See
+        tess_io.tess_filenames().
+    centroids: Whether to also return the shift of the flux-weighted centroid.
+    gp_detrend: Whether to subtract the stellar variability fit by a Gaussian
+        process from each flux output. See detrend_with_gp(). The cache stores
+        the light curve before detrending.
+    events: Optional list of periodic_event.Event excluded from the Gaussian
+        process fit, e.g. the transits of the TCE.
+    gp_timescale: Correlation timescale of the Gaussian process, in days.
 
   Returns:
     time: 1D NumPy array; the time values of the light curve.
     flux: 1D NumPy array; the normalized flux values of the light curve.
+    flux_small: 1D NumPy array; the normalized flux in the small aperture.
+    flux_big: 1D NumPy array; the normalized flux in the big aperture.
+    flux_apertures: Only returned if app_sizes is not None. 2D NumPy array with
+        one row of normalized flux values for each entry of app_sizes.
+    centroid: Only returned if centroids is True. 1D NumPy array; the distance
+        of the flux-weighted centroid from its median position, in pixels. See
+        centroid_shift().
 
   Raises:
     IOError: If the light curve files for this TIC ID cannot be found.
     EmptyLightCurveError: If light curve has no points in given time range.
   """
   # Read the TESS light curve.
-  file_names = tess_io.tess_filenames(tic, tess_data_dir, sector=sector, injected=injected, inject_dir=inject_dir)
+  file_names = tess_io.tess_filenames(tic, tess_data_dir, sector=sector, injected=injected, inject_dir=inject_dir,
+                                      index=index)
   if not file_names:
     tf.logging.info("Failed to find light curve files in %s for TIC ID %s" % (tess_data_dir, tic))
     raise IOError
 
-  all_time, all_mag, mag_small, mag_big = tess_io.read_tess_light_curve(file_names, invert=True)
+  names = ["time", "flux", "flux_small", "flux_big"]
+  if app_sizes is not None:
+    app_sizes = list(app_sizes)
+    names.append("flux_apertures")
+  if centroids:
+    names.append("centroid")
+
+  outputs = None
+  if cache is not None:
+    params = {"sector": int(sector), "is_multi": bool(is_multi), "app_sizes": app_sizes,
+              "centroids": bool(centroids)}
+    cached = cache.get(file_names, params)
+    if cached is not None:
+      outputs = tuple(cached[name] for name in names)
+
+  if outputs is None:
+    outputs = _read_and_clean_light_curve(tic, file_names, sector, is_multi, app_sizes, centroids)
+    if cache is not None:
+      cache.put(file_names, params, dict(zip(names, outputs)))
+
+  if gp_detrend:
+    # Detrend flux, flux_small, flux_big and each aperture at once, so the
+    # events are masked only once.
+    outputs = list(outputs)
+    all_flux = outputs[1:4]
+    if app_sizes is not None:
+      all_flux.extend(outputs[4])
+    all_flux = detrend_with_gp(outputs[0], all_flux, events, gp_timescale)
+    outputs[1:4] = all_flux[:3]
+    if app_sizes is not None:
+      outputs[4] = np.reshape(all_flux[3:], outputs[4].shape)
+    outputs = tuple(outputs)
+  return outputs
+
+
+def _read_and_clean_light_curve(tic, file_names, sector, is_multi, app_sizes, centroids):
+  """Reads a light curve file, removes outliers and normalizes each aperture."""
+  # Multi-sector light curves are trimmed to the latest sector while reading,
+  # so earlier sectors are never photometered or cleaned.
+  t_min = sector_start[sector] if sector > 1 and is_multi else None
+  light_curve = list(tess_io.read_tess_light_curve(
+      file_names, invert=True, app_sizes=app_sizes, t_min=t_min, centroids=centroids))
+  all_time, all_mag, mag_small, mag_big = light_curve[:4]
+  if centroids:
+    centroid = light_curve.pop()
+  if app_sizes is not None:
+    mag_apertures = light_curve.pop()
 
   if len(all_time) < 1:
       tf.logging.info("Empty light curve. Skipped TIC id %s" % (tic))
       raise EmptyLightCurveError
 
-  mad = scale.mad(all_mag)
-  valid_indices = np.where(all_mag > np.median(all_mag)-5*mad)
-  all_mag = all_mag[valid_indices]
-  all_time = all_time[valid_indices]
-  mag_small = mag_small[valid_indices]
-  mag_big = mag_big[valid_indices]
-  all_flux = (-(all_mag - np.median(all_mag))/2.5)
-  flux_small = (-(mag_small - np.median(mag_small)) / 2.5)
-  flux_big = (-(mag_big - np.median(mag_big)) / 2.5)
+  # Remove points more than 5 sigma below the median, then normalize
+  # each aperture by its median.
+  valid = robust_stats.sigma_clip(all_mag, lower=5)
+  outputs = [all_time[valid]]
+  for mag in (all_mag, mag_small, mag_big):
+      outputs.append(-robust_stats.subtract_median(mag[valid]) / 2.5)
+  if app_sizes is not None:
+      outputs.append(-robust_stats.subtract_median(mag_apertures[:, valid]) / 2.5)
+  if centroids:
+      outputs.append(centroid_shift(centroid[:, valid]))
+  return tuple(outputs)
+
+
+def centroid_shift(centroid):
+  """Returns the distance of a centroid time series from its median position.
+
+  Args:
+    centroid: 2D NumPy array of shape [2, num_cadences]; the row and column of
+        the centroid. See tess_io.read_tess_light_curve().
+
+  Returns:
+    1D NumPy array of distances, in pixels.
+  """
+  offset = centroid - np.nanmedian(centroid, axis=1, keepdims=True)
+  return np.hypot(offset[0], offset[1])
+
+
+def read_and_process_multi_sector_light_curve(tic, tess_data_dir, sectors, app_sizes=None, cache=None, index=None,
+                                              num_threads=None, centroids=False, gp_detrend=False, events=None,
+                                              gp_timescale=1.0):
+  """Reads the light curves of a target in several sectors and stitches them.
+
+  The sectors are read concurrently on a thread pool. Each one is cleaned and
+  normalized independently by read_and_process_light_curve(), and the results
+  are stitched into one array per output without intermediate concatenations.
+  Sectors whose light curve is missing or empty are skipped.
+
+  Args:
+    tic: TIC id of the target star.
+    tess_data_dir: Base directory containing TESS data. See
+        tess_io.tess_filenames().
+    sectors: Sequence of sector numbers.
+    app_sizes: Optional sequence of additional centered aperture sizes. See
+        tess_io.read_tess_light_curve().
+    cache: Optional light_curve_cache.LightCurveCache. See
+        read_and_process_light_curve().
+    index: Optional tess_index.TessIndex. See read_and_process_light_curve().
+    num_threads: Number of threads to read with. Defaults to one per sector.
+    centroids: Whether to also return the centroid shift. See
+        read_and_process_light_curve().
+    gp_detrend: Whether to detrend each sector with a Gaussian process. See
+        read_and_process_light_curve().
+    events: Optional list of periodic_event.Event excluded from the Gaussian
+        process fit.
+    gp_timescale: Correlation timescale of the Gaussian process, in days.
+
+  Returns:
+    The arrays returned by read_and_process_light_curve(), concatenated over
+    the sectors and sorted by time.
+
+  Raises:
+    IOError: If no light curve file for this TIC ID can be found.
+    EmptyLightCurveError: If all light curves have no points.
+  """
+  sectors = sorted(set(int(sector) for sector in sectors))
+
+  def read_sector(sector):
+    try:
+      return read_and_process_light_curve(tic, tess_data_dir, sector=sector, app_sizes=app_sizes, cache=cache,
+                                          index=index, centroids=centroids, gp_detrend=gp_detrend, events=events,
+                                          gp_timescale=gp_timescale)
+    except (IOError, EmptyLightCurveError) as e:
+      return e
+
+  with futures.ThreadPoolExecutor(max_workers=num_threads or max(len(sectors), 1)) as executor:
+    results = list(executor.map(read_sector, sectors))
+
+  segments = [r for r in results if not isinstance(r, Exception)]
+  if not segments:
+    if any(isinstance(r, EmptyLightCurveError) for r in results):
+      raise EmptyLightCurveError
+    tf.logging.info("Failed to find light curve files in %s for TIC ID %s in sectors %s" % (
+        tess_data_dir, tic, sectors))
+    raise IOError
+  return util.stitch(segments)
+
 
-  if sector > 1 and is_multi:
-      current = np.where(all_time >= sector_start[sector])
-      all_time = all_time[current]
-      all_flux = all_flux[current]
-  return all_time, all_flux, flux_small, flux_big
+def detrend_with_gp(time, all_flux, events=None, timescale=1.0, width_factor=1.5):
+  """Subtracts the stellar variability fit by a Gaussian process.
 
+  The variability of each flux array is fit by gaussian_process.fit_trend(),
+  in time linear in the number of cadences, excluding the given events and
+  any non-finite flux values.
 
-# Insert GP detrending
+  Args:
+    time: 1D NumPy array; the time values of the light curve, in ascending
+        order.
+    all_flux: Sequence of 1D NumPy arrays; flux values at the time values,
+        e.g. of several apertures.
+    events: Optional list of periodic_event.Event to exclude from the fit.
+    timescale: Correlation timescale of the variability, in days.
+    width_factor: Fractional multiplier of the duration of each event to
+        exclude. See util.remove_events().
+
+  Returns:
+    List of 1D NumPy arrays; each flux array minus its fitted trend. Flux
+    arrays with fewer than 2 points to fit are returned unchanged.
+  """
+  out_of_events = np.ones_like(time, dtype=bool)
+  if events:
+    _, kept = util.remove_events(time, np.arange(len(time)), events, width_factor)
+    out_of_events[:] = False
+    out_of_events[kept] = True
+
+  detrended = []
+  for flux in all_flux:
+    mask = out_of_events & np.isfinite(flux)
+    if np.count_nonzero(mask) < 2:
+      detrended.append(flux)
+    else:
+      detrended.append(flux - gaussian_process.fit_trend(time, flux, timescale, mask))
+  return detrended
 
 
 def phase_fold_and_sort_light_curve(time, flux, period, t0):
   """Phase folds a light curve and sorts by ascending time.
 
+  Several flux channels measured at the same times (e.g. fluxes in different
+  apertures) can be folded together by stacking them along the first axis of
+  flux; time is then folded and sorted only once.
+
   Args:
     time: 1D NumPy array of time values.
-    flux: 1D NumPy array of flux values.
+    flux: 1D NumPy array of flux values, or 2D NumPy array of shape
+        [num_channels, len(time)].
     period: A positive real scalar; the period to fold over.
     t0: The center of the resulting folded vector; this value is mapped to 0.
 
@@ -97,8 +285,9 @@ def phase_fold_and_sort_light_curve(time, flux, period, t0):
     folded_time: 1D NumPy array of phase folded time values in
         [-period / 2, period / 2), where 0 corresponds to t0 in the original
         time array. Values are sorted in ascending order.
-    folded_flux: 1D NumPy array. Values are the same as the original input
-        array, but sorted by folded_time.
+    folded_flux: NumPy array with the same shape as flux. Values are the same
+        as the original input array, but sorted by folded_time along the last
+        axis.
   """
   # Phase fold time.
   time = util.phase_fold_time(time, period, t0)
@@ -106,11 +295,16 @@ def phase_fold_and_sort_light_curve(time, flux, period, t0):
   # Sort by ascending time.
   sorted_i = np.argsort(time)
   time = time[sorted_i]
-  flux = flux[sorted_i]
+  flux = flux[..., sorted_i]
 
   return time, flux
 
 
+# Binning of a view of a phase-folded light curve; see generate_view().
+ViewSpec = collections.namedtuple(
+    "ViewSpec", ["num_bins", "bin_width", "t_min", "t_max", "normalize"])
+
+
 def generate_view(time, flux, num_bins, bin_width, t_min, t_max,
                   normalize=True):
   """Generates a view of a phase-folded light curve using a median filter.
@@ -128,19 +322,104 @@ def generate_view(time, flux, num_bins, bin_width, t_min, t_max,
     1D NumPy array of size num_bins containing the median flux values of
     uniformly spaced bins on the phase-folded time axis.
   """
-  view = median_filter.median_filter(time, flux, num_bins, bin_width, t_min,
-                                     t_max)
+  view, = _median_filter_views(time, flux,
+                               [(num_bins, bin_width, t_min, t_max)])
   if normalize:
-    view -= np.median(view)
-    if np.min(view) == 0:
-        tf.logging.info("# points in light curve: %s" % (len(view)))
-        raise SparseLightCurveError
+    view = _normalize_view(view)
+
+  return view
+
+
+def generate_views(time, flux, specs):
+  """Generates several views of a phase-folded light curve at once.
+
+  The bin boundaries of all views are found in a single binary search over the
+  folded time axis, and the medians of all bins are computed together.
 
-    view /= np.abs(np.min(view))  # In pathological cases, min(view) is zero...
+  Args:
+    time: 1D array of time values, phase folded and sorted in ascending order.
+    flux: 1D array of flux values.
+    specs: Dict mapping view names to ViewSpecs, e.g. as returned by
+        global_view_spec() and local_view_spec().
+
+  Returns:
+    Dict mapping the names in specs to 1D NumPy arrays, equal to
+    generate_view(time, flux, *spec) for each spec.
+  """
+  names = list(specs)
+  views = _median_filter_views(time, flux,
+                               [specs[name][:4] for name in names])
+  return {
+      name: _normalize_view(view) if specs[name].normalize else view
+      for name, view in zip(names, views)
+  }
+
+
+def _median_filter_views(time, flux, views):
+  """Applies median_filter.median_filter_views(), in C++ when possible.
+
+  The C++ MedianFilter fills empty bins with the median of the whole window
+  rather than interpolating, doesn't check for sparse light curves, isn't
+  defined for NaN values and always works in double precision. It's used only
+  for float64 flux when the NumPy checks pass and every bin has points, so the
+  views match the NumPy ones up to rounding.
+  """
+  flux = np.asarray(flux)
+  if (cc_median_filter is None or flux.dtype != np.float64 or
+      np.isnan(flux).any()):
+    return median_filter.median_filter_views(time, flux, views)
 
+  counts = median_filter.view_bin_counts(time, flux, views)
+  if not all(np.all(view_counts) for view_counts in counts):
+    return median_filter.median_filter_views(time, flux, views)
+  return [cc_median_filter.median_filter(time, flux, *view) for view in views]
+
+
+def _normalize_view(view):
+  """Centers the median of a view at 0 and its minimum value at -1."""
+  view -= np.median(view)
+  if np.min(view) == 0:
+      tf.logging.info("# points in light curve: %s" % (len(view)))
+      raise SparseLightCurveError
+
+  view /= np.abs(np.min(view))  # In pathological cases, min(view) is zero...
   return view
 
 
+def global_view_spec(period, num_bins=201, bin_width_factor=1.2/201):
+  """Returns the ViewSpec of global_view()."""
+  return ViewSpec(
+      num_bins=num_bins,
+      bin_width=period * bin_width_factor,
+      t_min=-period / 2,
+      t_max=period / 2,
+      normalize=True)
+
+
+def twice_global_view_spec(period, num_bins=402, bin_width_factor=1.2 / 402):
+  """Returns the ViewSpec of twice_global_view()."""
+  return ViewSpec(
+      num_bins=num_bins,
+      bin_width=period * bin_width_factor,
+      t_min=-period,
+      t_max=period,
+      normalize=True)
+
+
+def local_view_spec(period,
+                    duration,
+                    num_bins=61,
+                    bin_width_factor=0.16,
+                    num_durations=2):
+  """Returns the ViewSpec of local_view()."""
+  return ViewSpec(
+      num_bins=num_bins,
+      bin_width=duration * bin_width_factor,
+      t_min=max(-period / 2, -duration * num_durations),
+      t_max=min(period / 2, duration * num_durations),
+      normalize=True)
+
+
 def global_view(time, flux, period, num_bins=201, bin_width_factor=1.2/201):
   """Generates a 'global view' of a phase folded light curve.
 
@@ -158,13 +437,8 @@ def global_view(time, flux, period, num_bins=201, bin_width_factor=1.2/201):
     1D NumPy array of size num_bins containing the median flux values of
     uniformly spaced bins on the phase-folded time axis.
   """
-  return generate_view(
-      time,
-      flux,
-      num_bins=num_bins,
-      bin_width=period * bin_width_factor,
-      t_min=-period / 2,
-      t_max=period / 2)
+  return generate_view(time, flux,
+                       *global_view_spec(period, num_bins, bin_width_factor))
 
 
 def twice_global_view(time, flux, period, num_bins=402, bin_width_factor=1.2 / 402):
@@ -186,12 +460,7 @@ def twice_global_view(time, flux, period, num_bins=402, bin_width_factor=1.2 / 4
     uniformly spaced bins on the phase-folded time axis.
   """
   return generate_view(
-      time,
-      flux,
-      num_bins=num_bins,
-      bin_width=period * bin_width_factor,
-      t_min=-period,
-      t_max=period)
+      time, flux, *twice_global_view_spec(period, num_bins, bin_width_factor))
 
 
 def local_view(time,
@@ -218,12 +487,70 @@ def local_view(time,
     uniformly spaced bins on the phase-folded time axis.
   """
   return generate_view(
+      time, flux,
+      *local_view_spec(period, duration, num_bins, bin_width_factor,
+                       num_durations))
+
+
+def global_centroid_view(time, centroid, period, num_bins=201, bin_width_factor=1.2/201):
+  """Generates a 'global view' of the phase folded centroid shift.
+
+  Args:
+    time: 1D array of time values, phase folded and sorted in ascending order.
+    centroid: 1D array of centroid shifts. See centroid_shift().
+    period: The period of the event (in days).
+    num_bins: The number of intervals to divide the time axis into.
+    bin_width_factor: Width of the bins, as a fraction of period.
+
+  Returns:
+    1D NumPy array of size num_bins containing the median centroid shift of
+    uniformly spaced bins on the phase-folded time axis, relative to the median
+    over all bins.
+  """
+  view = generate_view(
       time,
-      flux,
+      centroid,
+      num_bins=num_bins,
+      bin_width=period * bin_width_factor,
+      t_min=-period / 2,
+      t_max=period / 2,
+      normalize=False)
+  return view - np.median(view)
+
+
+def local_centroid_view(time,
+                        centroid,
+                        period,
+                        duration,
+                        num_bins=61,
+                        bin_width_factor=0.16,
+                        num_durations=2):
+  """Generates a 'local view' of the phase folded centroid shift.
+
+  Args:
+    time: 1D array of time values, phase folded and sorted in ascending order.
+    centroid: 1D array of centroid shifts. See centroid_shift().
+    period: The period of the event (in days).
+    duration: The duration of the event (in days).
+    num_bins: The number of intervals to divide the time axis into.
+    bin_width_factor: Width of the bins, as a fraction of duration.
+    num_durations: The number of durations to consider on either side of 0 (the
+        event is assumed to be centered at 0).
+
+  Returns:
+    1D NumPy array of size num_bins containing the median centroid shift of
+    uniformly spaced bins on the phase-folded time axis, relative to the median
+    over all bins.
+  """
+  view = generate_view(
+      time,
+      centroid,
       num_bins=num_bins,
       bin_width=duration * bin_width_factor,
       t_min=max(-period / 2, -duration * num_durations),
-      t_max=min(period / 2, duration * num_durations))
+      t_max=min(period / 2, duration * num_durations),
+      normalize=False)
+  return view - np.median(view)
 
 
 def mask_transit(time, duration, period, mask_width=2, phase_limit=0.1):
@@ -236,8 +563,8 @@ def mask_transit(time, duration, period, mask_width=2, phase_limit=0.1):
     :param phase_limit: minimum phase to search for secondary eclipse.
     :return: mask: 1D array of booleans
     """
-    mask = [(abs(t) > duration*mask_width/2) and (abs(t) > period*phase_limit) for t in time]
-    return np.array(mask)
+    time = np.asarray(time)
+    return (np.abs(time) > duration*mask_width/2) & (np.abs(time) > period*phase_limit)
 
 
 def find_secondary(time, flux, duration, period, mask_width=2, phase_limit=0.1):
@@ -275,32 +602,13 @@ def find_secondary(time, flux, duration, period, mask_width=2, phase_limit=0.1):
     new_flux -= mean_flux  # flux should have arithmetic mean of zero
 
     # grid search for secondary. Fix duration to duration of primary.
-    time_grid = np.arange(new_time[0]+duration, new_time[-1]-duration, duration*0.1)
-    min_index = 0
-    max_index = min_index
+    t0, _, r, s = util.box_search(new_time, new_flux, duration)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        SR = -s*np.abs(s) / (r*(1-r))  # negative signals should give large positive s
+    SR = np.where(SR > 0, SR, 0)
     best_t0 = period / 2
-    best_SR = 0
-
-    for t0 in time_grid:
-        while new_time[min_index] < (t0 - duration):
-            min_index += 1
-        min_in_transit = min_index
-        max_in_transit = min_in_transit
-        while (new_time[max_index] < (t0 + duration)) and (max_index < len(new_time)):
-            max_index += 1
-        while new_time[min_in_transit] < (t0 - duration/2):
-            min_in_transit += 1
-        while new_time[max_in_transit] < (t0 + duration/2):
-            max_in_transit += 1
-        if max_index - min_index < 5:
-            continue
-        r = float(max_in_transit - min_in_transit + 1) / len(new_time)  # assuming identical uniform weights
-        s = sum(new_flux[min_in_transit:max_in_transit] / float(len(new_time)))
-
-        SR = -s * abs(s) / (r * (1 - r))  # negative signals should give large positive s
-        if SR > best_SR:
-            best_t0 = t0
-            best_SR = SR
+    if np.any(SR > 0):
+        best_t0 = t0[np.argmax(SR)]
     return best_t0, new_time, new_flux+mean_flux
 
 
@@ -378,6 +686,9 @@ def measure_odd_even(time, flux, duration, Qingress, period, t0):
     """
     Measure difference in depth between odd and even transits. For some reason the depths returned are not always
     reliable.
+
+    The depths are measured as in measure_eclipse_depth(), from the in-transit and out-of-transit sums of each epoch
+    parity; see util.epoch_depths().
     :param time: Non-phase folded time
     :param flux:
     :param duration:
@@ -385,22 +696,12 @@ def measure_odd_even(time, flux, duration, Qingress, period, t0):
     :param period:
     :param t0:
     :return:
+    Absolute difference between the odd and even depths, or 0 if either has fewer than 5 points in transit.
     """
-    zero = t0 - period /2
-    transit_index = np.floor((time - zero) / period)
-    odd = np.where(transit_index % 2 == 0)
-    even = np.where(transit_index % 2 == 1)
-
-    if (len(odd) < 5) or len(even < 5):
-        return 0
-
-    try:
-        odd_time, odd_flux = phase_fold_and_sort_light_curve(time[odd], flux[odd], period, t0)
-        even_time, even_flux = phase_fold_and_sort_light_curve(time[even], flux[even], period, t0)
-    except ValueError:
+    depth, _, num_in_transit = util.epoch_depths(time, flux, period, t0, duration,
+                                                 full_duration=duration * (1 - 2 * Qingress))
+    if np.any(num_in_transit < 5):
         return 0
 
-    odd_depth = measure_eclipse_depth(odd_time, odd_flux, duration, Qingress)
-    even_depth = measure_eclipse_depth(even_time, even_flux, duration, Qingress)
-
+    odd_depth, even_depth = depth
     return abs(odd_depth - even_depth)
@@ -0,0 +1,100 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for preprocess.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from astronet.data import preprocess
+from light_curve_util import periodic_event
+
+
+class DetrendWithGpTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(DetrendWithGpTest, self).setUp()
+    # Sine variability, white noise and a single transit at t = 10.
+    rng = np.random.RandomState(0)
+    self.time = np.arange(0, 20, 0.01)
+    self.in_transit = np.abs(self.time - 10) < 0.1
+    self.flux = 0.01 * np.sin(2 * np.pi * self.time / 5)
+    self.flux += rng.normal(scale=1e-3, size=len(self.time))
+    self.flux[self.in_transit] -= 0.005
+    self.events = [periodic_event.Event(period=100, duration=0.2, t0=10)]
+
+  def testDetrendWithGp(self):
+    flux_with_nan = self.flux.copy()
+    flux_with_nan[[5, 1000]] = np.nan
+    sparse_flux = np.full_like(self.flux, np.nan)
+    sparse_flux[3] = 1
+
+    flux, flux_with_nan, sparse_flux = preprocess.detrend_with_gp(
+        self.time, [self.flux, flux_with_nan, sparse_flux], self.events)
+
+    # The variability is removed, but not the masked transit.
+    self.assertLess(np.std(flux[~self.in_transit]), 1.1e-3)
+    self.assertAllClose(-0.005, np.mean(flux[self.in_transit]), atol=1e-3)
+
+    # Non-finite flux values stay so, and are not used in the fit.
+    self.assertTrue(np.isnan(flux_with_nan[[5, 1000]]).all())
+    finite = np.isfinite(flux_with_nan)
+    self.assertEqual(len(self.time) - 2, np.count_nonzero(finite))
+    self.assertLess(np.std(flux_with_nan[finite & ~self.in_transit]), 1.1e-3)
+
+    # Flux with fewer than 2 points to fit is returned unchanged.
+    self.assertEqual(1, sparse_flux[3])
+    self.assertEqual(1, np.count_nonzero(np.isfinite(sparse_flux)))
+
+  def testEventsAreMasked(self):
+    masked, = preprocess.detrend_with_gp(self.time, [self.flux], self.events)
+    unmasked, = preprocess.detrend_with_gp(self.time, [self.flux])
+
+    # Without the mask, the trend partly fits the transit.
+    self.assertLess(np.mean(masked[self.in_transit]),
+                    np.mean(unmasked[self.in_transit]) - 1e-3)
+
+  def testReadAndProcessLightCurve(self):
+    flux_apertures = np.stack([self.flux, 2 * self.flux])
+    light_curve = (self.time, self.flux, self.flux, self.flux, flux_apertures)
+
+    self.addCleanup(setattr, preprocess.tess_io, "tess_filenames",
+                    preprocess.tess_io.tess_filenames)
+    self.addCleanup(setattr, preprocess, "_read_and_clean_light_curve",
+                    preprocess._read_and_clean_light_curve)
+    preprocess.tess_io.tess_filenames = lambda *args, **kwargs: ["lc.fits"]
+    preprocess._read_and_clean_light_curve = lambda *args: light_curve
+
+    outputs = preprocess.read_and_process_light_curve(
+        "tic", "dir", app_sizes=[5, 7], gp_detrend=True, events=self.events)
+    self.assertLen(outputs, 5)
+    self.assertIs(self.time, outputs[0])
+    expected = preprocess.detrend_with_gp(
+        self.time, [self.flux, 2 * self.flux], self.events)
+    for flux in outputs[1:4]:
+      self.assertAllClose(expected[0], flux)
+    self.assertEqual((2, len(self.time)), outputs[4].shape)
+    self.assertAllClose(expected, outputs[4])
+
+    # Without gp_detrend, the light curve is returned as read.
+    self.assertIs(light_curve, preprocess.read_and_process_light_curve(
+        "tic", "dir", app_sizes=[5, 7]))
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -108,17 +108,15 @@ def _process_tce(feature_config):
       time, flux, FLAGS.period, FLAGS.t0)
 
   # Generate the local and global views.
-  features = {}
-
-  if "global_view" in feature_config:
-    global_view = preprocess.global_view(time, flux, FLAGS.period)
-    # Add a batch dimension.
-    features["global_view"] = np.expand_dims(global_view, 0)
-
-  if "local_view" in feature_config:
-    local_view = preprocess.local_view(time, flux, FLAGS.period, FLAGS.duration)
-    # Add a batch dimension.
-    features["local_view"] = np.expand_dims(local_view, 0)
+  specs = {
+      "global_view": preprocess.global_view_spec(FLAGS.period),
+      "local_view": preprocess.local_view_spec(FLAGS.period, FLAGS.duration),
+  }
+  views = preprocess.generate_views(
+      time, flux, {name: specs[name] for name in feature_config})
+
+  # Add a batch dimension.
+  features = {name: np.expand_dims(view, 0) for name, view in views.items()}
 
   # Possibly save plots.
   if FLAGS.output_image_file:
@@ -0,0 +1,76 @@
+/* Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+// Conversions between NumPy arrays and std::vector for the Python extension
+// modules in this directory. Each module must call import_array() in its
+// initialization function before using these helpers.
+
+#ifndef TENSORFLOW_MODELS_ASTRONET_LIGHT_CURVE_UTIL_CC_PYTHON_NUMPY_UTIL_H_
+#define TENSORFLOW_MODELS_ASTRONET_LIGHT_CURVE_UTIL_CC_PYTHON_NUMPY_UTIL_H_
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
+#include <numpy/arrayobject.h>
+
+#include <algorithm>
+#include <string>
+#include <vector>
+
+namespace astronet {
+
+// Converts a 1D array-like Python object to a vector of doubles.
+//
+// Returns false and sets a Python exception if obj can't be converted.
+inline bool ToDoubleVector(PyObject* obj, const char* name,
+                           std::vector<double>* result) {
+  PyArrayObject* array = reinterpret_cast<PyArrayObject*>(PyArray_FROM_OTF(
+      obj, NPY_DOUBLE, NPY_ARRAY_IN_ARRAY | NPY_ARRAY_FORCECAST));
+  if (array == nullptr) {
+    return false;
+  }
+  if (PyArray_NDIM(array) != 1) {
+    PyErr_Format(PyExc_ValueError, "%s must be 1D. Got %d dimensions", name,
+                 PyArray_NDIM(array));
+    Py_DECREF(array);
+    return false;
+  }
+  const double* data = static_cast<const double*>(PyArray_DATA(array));
+  result->assign(data, data + PyArray_DIM(array, 0));
+  Py_DECREF(array);
+  return true;
+}
+
+// Returns a new 1D NumPy array of doubles with the contents of values.
+inline PyObject* ToNumpyArray(const std::vector<double>& values) {
+  npy_intp size = values.size();
+  PyObject* array = PyArray_SimpleNew(1, &size, NPY_DOUBLE);
+  if (array != nullptr) {
+    std::copy(values.begin(), values.end(),
+              static_cast<double*>(
+                  PyArray_DATA(reinterpret_cast<PyArrayObject*>(array))));
+  }
+  return array;
+}
+
+// Raises ValueError(error) and returns nullptr.
+inline PyObject* RaiseValueError(const std::string& error) {
+  PyErr_SetString(PyExc_ValueError, error.c_str());
+  return nullptr;
+}
+
+}  // namespace astronet
+
+#endif  // TENSORFLOW_MODELS_ASTRONET_LIGHT_CURVE_UTIL_CC_PYTHON_NUMPY_UTIL_H_
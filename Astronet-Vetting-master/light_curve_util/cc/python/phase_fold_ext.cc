@@ -0,0 +1,110 @@
+/* Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+// Python extension module for phase_fold.h, with the same interface as
+// phase_fold.clif. Built by setup.py.
+
+#include "light_curve_util/cc/phase_fold.h"
+#include "light_curve_util/cc/python/numpy_util.h"
+
+using std::vector;
+
+namespace astronet {
+namespace {
+
+PyObject* PyPhaseFoldTime(PyObject* self, PyObject* args, PyObject* kwargs) {
+  static const char* kwlist[] = {"time", "period", "t0", nullptr};
+  PyObject* time_obj;
+  double period, t0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Odd",
+                                   const_cast<char**>(kwlist), &time_obj,
+                                   &period, &t0)) {
+    return nullptr;
+  }
+  vector<double> time;
+  if (!ToDoubleVector(time_obj, "time", &time)) {
+    return nullptr;
+  }
+
+  vector<double> result;
+  Py_BEGIN_ALLOW_THREADS;
+  PhaseFoldTime(time, period, t0, &result);
+  Py_END_ALLOW_THREADS;
+  return ToNumpyArray(result);
+}
+
+PyObject* PyPhaseFoldAndSortLightCurve(PyObject* self, PyObject* args,
+                                       PyObject* kwargs) {
+  static const char* kwlist[] = {"time", "flux", "period", "t0", nullptr};
+  PyObject* time_obj;
+  PyObject* flux_obj;
+  double period, t0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOdd",
+                                   const_cast<char**>(kwlist), &time_obj,
+                                   &flux_obj, &period, &t0)) {
+    return nullptr;
+  }
+  vector<double> time, flux;
+  if (!ToDoubleVector(time_obj, "time", &time) ||
+      !ToDoubleVector(flux_obj, "flux", &flux)) {
+    return nullptr;
+  }
+
+  vector<double> folded_time, folded_flux;
+  std::string error;
+  bool ok;
+  Py_BEGIN_ALLOW_THREADS;
+  ok = PhaseFoldAndSortLightCurve(std::move(time), flux, period, t0,
+                                  &folded_time, &folded_flux, &error);
+  Py_END_ALLOW_THREADS;
+  if (!ok) {
+    return RaiseValueError(error);
+  }
+  PyObject* time_array = ToNumpyArray(folded_time);
+  PyObject* flux_array = ToNumpyArray(folded_flux);
+  if (time_array == nullptr || flux_array == nullptr) {
+    Py_XDECREF(time_array);
+    Py_XDECREF(flux_array);
+    return nullptr;
+  }
+  return Py_BuildValue("(NN)", time_array, flux_array);
+}
+
+PyMethodDef kMethods[] = {
+    {"phase_fold_time", reinterpret_cast<PyCFunction>(PyPhaseFoldTime),
+     METH_VARARGS | METH_KEYWORDS,
+     "phase_fold_time(time, period, t0)\n\n"
+     "Creates a phase-folded time vector in [-period / 2, period / 2)."},
+    {"phase_fold_and_sort_light_curve",
+     reinterpret_cast<PyCFunction>(PyPhaseFoldAndSortLightCurve),
+     METH_VARARGS | METH_KEYWORDS,
+     "phase_fold_and_sort_light_curve(time, flux, period, t0)\n\n"
+     "Phase folds a light curve and sorts by ascending time. Returns\n"
+     "(folded_time, folded_flux). Raises ValueError if an argument is\n"
+     "invalid."},
+    {nullptr, nullptr, 0, nullptr},
+};
+
+PyModuleDef kModule = {
+    PyModuleDef_HEAD_INIT, "phase_fold",
+    "Python wrapping of the C++ phase_fold library.", -1, kMethods,
+};
+
+}  // namespace
+}  // namespace astronet
+
+PyMODINIT_FUNC PyInit_phase_fold() {
+  import_array();
+  return PyModule_Create(&astronet::kModule);
+}
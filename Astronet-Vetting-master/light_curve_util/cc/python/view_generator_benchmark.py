@@ -0,0 +1,109 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Benchmarks the C++ extension modules against the NumPy implementations.
+
+The global and local views are generated as in preprocess.py, both from an
+already folded light curve (median filter only) and from the unfolded light
+curve (phase folding followed by the median filter, as in ViewGenerator).
+
+Build the extension modules first:
+  python setup.py build_ext --inplace
+
+Usage:
+  python light_curve_util/cc/python/view_generator_benchmark.py \
+      --points 1000 100000
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import numpy as np
+
+from light_curve_util import median_filter
+from light_curve_util import util
+from light_curve_util.cc.python import median_filter as cc_median_filter
+from light_curve_util.cc.python import view_generator
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument(
+    "--points",
+    type=int,
+    nargs="+",
+    default=[1000, 10000, 100000, 500000],
+    help="Numbers of light curve points to benchmark.")
+
+parser.add_argument(
+    "--repeats",
+    type=int,
+    default=5,
+    help="Number of timing repeats; the best time is reported.")
+
+
+def _numpy_views(time, flux, period, t0, views):
+  """Folds a light curve and generates views with NumPy."""
+  time = util.phase_fold_time(time, period, t0)
+  sorted_i = np.argsort(time)
+  return median_filter.median_filter_views(time[sorted_i], flux[sorted_i],
+                                           views)
+
+
+def _cc_views(time, flux, period, t0, views):
+  """Folds a light curve and generates views with ViewGenerator."""
+  vg = view_generator.create_view_generator(time, flux, period, t0)
+  return [vg.generate_view(*view, normalize=False) for view in views]
+
+
+def main():
+  flags = parser.parse_args()
+  rng = np.random.RandomState(0)
+  period = 3.
+  t0 = 0.7
+  duration = 0.1
+  views = [
+      (201, period * 1.2 / 201, -period / 2, period / 2),
+      (61, duration * 0.16, -2 * duration, 2 * duration),
+  ]
+
+  print("%10s %14s %12s %12s %10s" % ("points", "stage", "numpy (s)",
+                                      "c++ (s)", "speedup"))
+  for num_points in flags.points:
+    time = np.sort(rng.uniform(0, 27, num_points))
+    flux = rng.normal(size=num_points)
+    folded_time = np.sort(rng.uniform(-period / 2, period / 2, num_points))
+
+    stages = [
+        ("median filter",
+         lambda: median_filter.median_filter_views(folded_time, flux, views),
+         lambda: [cc_median_filter.median_filter(folded_time, flux, *view)
+                  for view in views]),
+        ("fold + filter",
+         lambda: _numpy_views(time, flux, period, t0, views),
+         lambda: _cc_views(time, flux, period, t0, views)),
+    ]
+    for name, numpy_fn, cc_fn in stages:
+      numpy_time = min(timeit.repeat(numpy_fn, number=1, repeat=flags.repeats))
+      cc_time = min(timeit.repeat(cc_fn, number=1, repeat=flags.repeats))
+      print("%10d %14s %12.4f %12.4f %9.1fx" % (num_points, name, numpy_time,
+                                                cc_time, numpy_time / cc_time))
+
+
+if __name__ == "__main__":
+  main()
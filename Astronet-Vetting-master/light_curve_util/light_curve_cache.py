@@ -0,0 +1,207 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""On-disk cache of decoded and cleaned light curves.
+
+Each entry holds the arrays produced for one light curve file, stored as one
+.npy file per array so that cache hits can be memory-mapped. Entries are keyed
+by the path, size and modification time of the source file together with the
+reader parameters, so a changed file or a different reader configuration never
+hits a stale entry. The total size of the cache is bounded; when it grows past
+the limit the least recently used entries are evicted.
+
+The cache directory is scanned when the cache is created and again only when
+the running total of its size exceeds the limit, so storing an entry does not
+cost a scan of every entry. Other processes sharing the directory are only
+accounted for at these scans, so the limit is approximate in that case.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+# Increment to invalidate all existing entries when the cached arrays change.
+_CACHE_VERSION = 2
+
+# Eviction shrinks the cache to this fraction of its maximum size, so that the
+# directory is not rescanned on every following put().
+_LOW_WATER_FRACTION = 0.9
+
+# Temporary entry directories older than this many seconds were left by a
+# writer that crashed, and are removed when the cache directory is scanned.
+_STALE_TMP_SECS = 3600
+
+
+def _file_identity(filename):
+  """Returns (path, size, mtime) of a file, or None if it can't be stat-ed.
+
+  Local files are stat-ed directly, and other paths (e.g. gs://) through
+  tf.io.gfile.
+  """
+  try:
+    if "://" in filename:
+      stat = tf.io.gfile.stat(filename)
+      return filename, stat.length, stat.mtime_nsec
+    stat = os.stat(filename)
+  except (OSError, TypeError, tf.errors.OpError):
+    return None
+  return os.path.abspath(filename), stat.st_size, stat.st_mtime_ns
+
+
+def _dir_size(path):
+  """Returns the total size in bytes of the files directly inside path."""
+  total = 0
+  for name in os.listdir(path):
+    total += os.path.getsize(os.path.join(path, name))
+  return total
+
+
+class LightCurveCache(object):
+  """Size-bounded LRU cache of light curve arrays on the local filesystem.
+
+  An instance may be shared by several threads.
+  """
+
+  def __init__(self, cache_dir, max_bytes=10 * 1024**3, mmap=True):
+    """Initializes the LightCurveCache.
+
+    Args:
+      cache_dir: Directory in which to store the cache. Created if necessary.
+      max_bytes: Maximum total size of the cache, in bytes.
+      mmap: Whether cache hits are returned as read-only memory-mapped arrays.
+    """
+    self._cache_dir = cache_dir
+    self._max_bytes = max_bytes
+    self._mmap = mmap
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    # Guards _total_bytes and the eviction scans.
+    self._lock = threading.Lock()
+    self._total_bytes = 0  # Estimated total size of the entries.
+    self._evict()
+
+  @property
+  def cache_dir(self):
+    return self._cache_dir
+
+  def _entry_path(self, filename, params):
+    """Returns the entry directory for filename and params, or None."""
+    identity = _file_identity(filename)
+    if identity is None:
+      return None
+    key = repr((_CACHE_VERSION, identity, sorted(params.items())))
+    return os.path.join(self._cache_dir,
+                        hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+  def get(self, filename, params):
+    """Looks up the arrays cached for a light curve file.
+
+    Args:
+      filename: Path of the source light curve file.
+      params: Dict of reader parameters that affect the cached arrays. Values
+          must have a deterministic repr().
+
+    Returns:
+      A dict mapping array names to numpy arrays, or None on a cache miss.
+    """
+    path = self._entry_path(filename, params)
+    if path is None or not os.path.isdir(path):
+      return None
+
+    arrays = {}
+    try:
+      for name in os.listdir(path):
+        if name.endswith(".npy"):
+          arrays[name[:-len(".npy")]] = np.load(
+              os.path.join(path, name), mmap_mode="r" if self._mmap else None)
+      # Mark the entry as recently used.
+      os.utime(path, None)
+    except (IOError, OSError, ValueError):
+      # The entry was evicted or is corrupt; treat it as a miss.
+      return None
+    return arrays
+
+  def put(self, filename, params, arrays):
+    """Stores the arrays for a light curve file and evicts old entries.
+
+    Args:
+      filename: Path of the source light curve file.
+      params: Dict of reader parameters; see get().
+      arrays: Dict mapping array names to numpy arrays.
+    """
+    path = self._entry_path(filename, params)
+    if path is None:
+      return
+
+    # Write to a temporary directory first so that readers (possibly in other
+    # processes) never see a partially written entry.
+    tmp_path = tempfile.mkdtemp(dir=self._cache_dir, prefix=".tmp-")
+    for name, array in arrays.items():
+      np.save(os.path.join(tmp_path, name + ".npy"), np.asarray(array))
+    size = _dir_size(tmp_path)
+    try:
+      os.rename(tmp_path, path)
+    except OSError:
+      # Another process stored the same entry first.
+      shutil.rmtree(tmp_path, ignore_errors=True)
+      return
+
+    with self._lock:
+      self._total_bytes += size
+      if self._total_bytes > self._max_bytes:
+        self._evict()
+
+  def _evict(self):
+    """Scans the cache directory and removes least recently used entries.
+
+    Entries are removed until the cache fits in a fraction _LOW_WATER_FRACTION
+    of max_bytes. Stale temporary directories are removed too. Called with
+    _lock held, except from __init__().
+    """
+    entries = []
+    total = 0
+    now = time.time()
+    for name in os.listdir(self._cache_dir):
+      path = os.path.join(self._cache_dir, name)
+      try:
+        if not os.path.isdir(path):
+          continue
+        mtime = os.path.getmtime(path)
+        if name.startswith(".tmp-"):
+          if now - mtime > _STALE_TMP_SECS:
+            shutil.rmtree(path, ignore_errors=True)
+          continue
+        size = _dir_size(path)
+      except OSError:
+        continue  # Concurrently evicted or renamed.
+      entries.append((mtime, size, path))
+      total += size
+
+    if total > self._max_bytes:
+      for _, size, path in sorted(entries):
+        if total <= self._max_bytes * _LOW_WATER_FRACTION:
+          break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+    self._total_bytes = total
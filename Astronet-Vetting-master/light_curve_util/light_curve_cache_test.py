@@ -0,0 +1,141 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for light_curve_cache.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from concurrent import futures
+import os
+import shutil
+import tempfile
+
+from absl.testing import absltest
+import numpy as np
+
+from light_curve_util import light_curve_cache
+
+
+class LightCurveCacheTest(absltest.TestCase):
+
+  def setUp(self):
+    super(LightCurveCacheTest, self).setUp()
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+    self.cache_dir = os.path.join(self.tmp_dir, "cache")
+
+  def _make_file(self, name, contents=b"light curve"):
+    filename = os.path.join(self.tmp_dir, name)
+    with open(filename, "wb") as f:
+      f.write(contents)
+    return filename
+
+  def testRoundTrip(self):
+    cache = light_curve_cache.LightCurveCache(self.cache_dir)
+    filename = self._make_file("a.fits")
+    params = {"sector": 5, "is_multi": False}
+    self.assertIsNone(cache.get(filename, params))
+
+    time = np.arange(10, dtype=np.float64)
+    flux = np.sin(time)
+    cache.put(filename, params, {"time": time, "flux": flux})
+
+    arrays = cache.get(filename, params)
+    self.assertCountEqual(["time", "flux"], arrays.keys())
+    np.testing.assert_array_equal(time, arrays["time"])
+    np.testing.assert_array_equal(flux, arrays["flux"])
+    self.assertIsInstance(arrays["time"], np.memmap)
+
+    # Different reader parameters miss.
+    self.assertIsNone(cache.get(filename, {"sector": 6, "is_multi": False}))
+
+  def testModifiedFileMisses(self):
+    cache = light_curve_cache.LightCurveCache(self.cache_dir)
+    filename = self._make_file("a.fits")
+    cache.put(filename, {}, {"time": np.arange(3.)})
+    self.assertIsNotNone(cache.get(filename, {}))
+
+    self._make_file("a.fits", b"a longer light curve")
+    self.assertIsNone(cache.get(filename, {}))
+
+  def testMissingFile(self):
+    cache = light_curve_cache.LightCurveCache(self.cache_dir)
+    filename = os.path.join(self.tmp_dir, "missing.fits")
+    cache.put(filename, {}, {"time": np.arange(3.)})
+    self.assertIsNone(cache.get(filename, {}))
+
+  def testEvictsLeastRecentlyUsed(self):
+    # Each entry is a little over 8 KB, so the cache holds two of them.
+    cache = light_curve_cache.LightCurveCache(self.cache_dir, max_bytes=20000)
+    filenames = [self._make_file("%d.fits" % i) for i in range(3)]
+    array = {"flux": np.zeros(1000)}
+
+    cache.put(filenames[0], {}, array)
+    cache.put(filenames[1], {}, array)
+    for name in os.listdir(cache.cache_dir):
+      os.utime(os.path.join(cache.cache_dir, name), (0, 0))
+    self.assertIsNotNone(cache.get(filenames[0], {}))  # Marks 0 as recent.
+
+    cache.put(filenames[2], {}, array)
+    self.assertIsNotNone(cache.get(filenames[0], {}))
+    self.assertIsNone(cache.get(filenames[1], {}))
+    self.assertIsNotNone(cache.get(filenames[2], {}))
+
+  def testCountsExistingEntries(self):
+    filenames = [self._make_file("%d.fits" % i) for i in range(3)]
+    array = {"flux": np.zeros(1000)}
+    cache = light_curve_cache.LightCurveCache(self.cache_dir)
+    cache.put(filenames[0], {}, array)
+    cache.put(filenames[1], {}, array)
+    os.utime(os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0]),
+             (0, 0))
+
+    # A new cache over the same directory starts from the size of the existing
+    # entries, and evicts the least recently used one when it grows too big.
+    cache = light_curve_cache.LightCurveCache(self.cache_dir, max_bytes=20000)
+    cache.put(filenames[2], {}, array)
+    self.assertLen(os.listdir(self.cache_dir), 2)
+    self.assertIsNotNone(cache.get(filenames[2], {}))
+
+  def testConcurrentPuts(self):
+    cache = light_curve_cache.LightCurveCache(self.cache_dir)
+    filenames = [self._make_file("%d.fits" % i) for i in range(100)]
+    with futures.ThreadPoolExecutor(max_workers=8) as executor:
+      list(executor.map(
+          lambda f: cache.put(f, {}, {"flux": np.zeros(100)}), filenames))
+
+    # The running total matches a fresh scan of the directory.
+    self.assertEqual(
+        light_curve_cache.LightCurveCache(self.cache_dir)._total_bytes,
+        cache._total_bytes)
+    for filename in filenames:
+      self.assertIsNotNone(cache.get(filename, {}))
+
+  def testRemovesStaleTemporaryDirectories(self):
+    stale = os.path.join(self.cache_dir, ".tmp-stale")
+    fresh = os.path.join(self.cache_dir, ".tmp-fresh")
+    os.makedirs(stale)
+    os.makedirs(fresh)
+    os.utime(stale, (0, 0))
+
+    # Fresh temporary directories may belong to a concurrent writer.
+    light_curve_cache.LightCurveCache(self.cache_dir)
+    self.assertFalse(os.path.exists(stale))
+    self.assertTrue(os.path.exists(fresh))
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -56,6 +56,122 @@ def median_filter(x, y, num_bins, bin_width=None, x_min=None, x_max=None):
     ValueError: If an argument has an inappropriate value.
     SparseLightCurveError: If light curve has too few points within given window.
   """
+  bin_min, bin_max = _bin_edges(x, y, num_bins, bin_width, x_min, x_max)
+
+  # The bin at index i is the median of all elements y[j] such that
+  # bin_min <= x[j] < bin_max, where bin_min and bin_max are the endpoints of
+  # bin i. All bin boundaries are found with a single binary search.
+  bounds = np.searchsorted(x, np.concatenate([bin_min, bin_max]))
+
+  # For sparse light curves, empty bins are NaN to be interpolated over later.
+  result = bin_medians(y, bounds[:num_bins], bounds[num_bins:])
+
+  result = fill_empty_bin(result)
+  return result
+
+
+def median_filter_views(x, y, views):
+  """Applies median_filter() to the same light curve with several binnings.
+
+  The bin boundaries of all views are found with a single binary search, and
+  the medians of all bins are computed together.
+
+  Args:
+    x: 1D array of x-coordinates sorted in ascending order.
+    y: 1D array of y-coordinates with the same size as x.
+    views: Sequence of (num_bins, bin_width, x_min, x_max) tuples; see
+        median_filter().
+
+  Returns:
+    List of 1D NumPy arrays; element i is equal to
+    median_filter(x, y, *views[i]).
+
+  Raises:
+    ValueError: If an argument has an inappropriate value.
+    SparseLightCurveError: If light curve has too few points within the window
+        of any view.
+  """
+  if not views:
+    return []
+  starts, ends, splits = _view_bounds(x, y, views)
+  medians = bin_medians(y, starts, ends)
+  return [fill_empty_bin(view) for view in np.split(medians, splits)]
+
+
+def view_bin_counts(x, y, views):
+  """Counts the points in each bin of several views, without the medians.
+
+  Like median_filter_views(), the bin boundaries of all views are found with
+  a single binary search.
+
+  Args:
+    x: 1D array of x-coordinates sorted in ascending order.
+    y: 1D array of y-coordinates with the same size as x.
+    views: Sequence of (num_bins, bin_width, x_min, x_max) tuples; see
+        median_filter().
+
+  Returns:
+    List of 1D NumPy arrays; element i is equal to bin_counts(x, y, *views[i]).
+
+  Raises:
+    ValueError: If an argument has an inappropriate value.
+    SparseLightCurveError: If light curve has too few points within the window
+        of any view.
+  """
+  if not views:
+    return []
+  starts, ends, splits = _view_bounds(x, y, views)
+  return np.split(np.maximum(ends - starts, 0), splits)
+
+
+def _view_bounds(x, y, views):
+  """Finds the bin boundaries of several views with one binary search.
+
+  Returns:
+    starts: 1D NumPy array; the index in x of the first point of each bin of
+        all views.
+    ends: 1D NumPy array; the index in x after the last point of each bin.
+    splits: Indices at which starts and ends are split into views.
+  """
+  bin_min, bin_max = zip(*[_bin_edges(x, y, *view) for view in views])
+  splits = np.cumsum([len(edges) for edges in bin_min])[:-1]
+  bin_min = np.concatenate(bin_min)
+  bin_max = np.concatenate(bin_max)
+  bounds = np.searchsorted(x, np.concatenate([bin_min, bin_max]))
+  return bounds[:len(bin_min)], bounds[len(bin_min):], splits
+
+
+def bin_counts(x, y, num_bins, bin_width=None, x_min=None, x_max=None):
+  """Counts the points in each bin of median_filter(), without the medians.
+
+  Args:
+    x: 1D array of x-coordinates sorted in ascending order.
+    y: 1D array of y-coordinates with the same size as x.
+    num_bins: See median_filter().
+    bin_width: See median_filter().
+    x_min: See median_filter().
+    x_max: See median_filter().
+
+  Returns:
+    1D NumPy array of size num_bins containing the number of x-values in each
+    bin.
+
+  Raises:
+    ValueError: If an argument has an inappropriate value.
+    SparseLightCurveError: If light curve has too few points within given window.
+  """
+  bin_min, bin_max = _bin_edges(x, y, num_bins, bin_width, x_min, x_max)
+  bounds = np.searchsorted(x, np.concatenate([bin_min, bin_max]))
+  return np.maximum(bounds[num_bins:] - bounds[:num_bins], 0)
+
+
+def _bin_edges(x, y, num_bins, bin_width=None, x_min=None, x_max=None):
+  """Validates the arguments of median_filter() and computes the bin edges.
+
+  Returns:
+    bin_min: 1D NumPy array of size num_bins; the inclusive left edges.
+    bin_max: 1D NumPy array of size num_bins; the exclusive right edges.
+  """
   if num_bins < 2:
     raise ValueError("num_bins must be at least 2. Got: %d" % num_bins)
 
@@ -81,8 +197,9 @@ def median_filter(x, y, num_bins, bin_width=None, x_min=None, x_max=None):
   #       "(got: %d)" % (x_min, x[-1]))
 
   # Drop light curves with no/few points in time range considered, or too little coverage in time
-  in_range = np.where((x >= x_min) & (x <= x_max))[0]
-  if (len(in_range) < 5) or (x[-1] - x[0] < (x_max - x_min) / 2 ):
+  in_range = (np.searchsorted(x, x_max, side="right") -
+              np.searchsorted(x, x_min, side="left"))
+  if (in_range < 5) or (x[-1] - x[0] < (x_max - x_min) / 2 ):
     raise SparseLightCurveError('Too few points near transit')
 
   # Validate bin_width.
@@ -96,72 +213,225 @@ def median_filter(x, y, num_bins, bin_width=None, x_min=None, x_max=None):
 
   bin_spacing = (x_max - x_min - bin_width) / (num_bins - 1)
 
-  # # Bins with no y-values will fall back to the global median. - Don't do this for sparse light curves
-  # result = np.repeat(np.median(y), num_bins)
-  result = np.repeat(np.nan, num_bins)
-  # For sparse light curves, fill empty bins with NaN to be interpolated over later.
+  # The endpoints are accumulated one spacing at a time.
+  steps = np.repeat(bin_spacing, num_bins - 1)
+  bin_min = np.add.accumulate(np.concatenate([[x_min], steps]))
+  bin_max = np.add.accumulate(np.concatenate([[x_min + bin_width], steps]))
+  return bin_min, bin_max
 
-  # Find the first element of x >= x_min. This loop is guaranteed to produce
-  # a valid index because we know that x_min <= x[-1].
-  x_start = 0
-  while x[x_start] < x_min:
-    x_start += 1
 
-  # The bin at index i is the median of all elements y[j] such that
-  # bin_min <= x[j] < bin_max, where bin_min and bin_max are the endpoints of
-  # bin i.
-  bin_min = x_min  # Left endpoint of the current bin.
-  bin_max = x_min + bin_width  # Right endpoint of the current bin.
-  j_start = x_start  # Inclusive left index of the current bin.
-  j_end = x_start  # Exclusive end index of the current bin.
+def median_filter_batch(xs, ys, num_bins, bin_width=None, x_min=None,
+                        x_max=None):
+  """Applies median_filter() to a ragged batch of light curves at once.
 
-  for i in range(num_bins):
-    # Move j_start to the first index of x >= bin_min.
-    while j_start < x_len and x[j_start] < bin_min:
-      j_start += 1
+  The bin boundaries of each light curve are found with one binary search, and
+  the medians of all bins of all light curves are then computed together.
 
-    # Move j_end to the first index of x >= bin_max (exclusive end index).
-    while j_end < x_len and x[j_end] < bin_max:
-      j_end += 1
+  Args:
+    xs: Sequence of 1D arrays of x-coordinates, each sorted in ascending order.
+    ys: Sequence of 1D arrays of y-coordinates with the same sizes as xs. The
+        medians are computed in the common dtype of all arrays.
+    num_bins: The number of bins per light curve. Must be at least 2.
+    bin_width: Scalar or 1D array with the bin width of each light curve.
+        Defaults to (x_max - x_min) / num_bins.
+    x_min: Scalar or 1D array with the inclusive leftmost x-value of each light
+        curve. Defaults to the first element of each x.
+    x_max: Scalar or 1D array with the exclusive rightmost x-value of each
+        light curve. Defaults to the last element of each x.
 
-    if j_end > j_start:
-      # Compute and insert the median bin value.
-      result[i] = np.median(y[j_start:j_end])
+  Returns:
+    2D NumPy array of shape [len(xs), num_bins]. Row i is equal to
+    median_filter(xs[i], ys[i], num_bins, bin_width[i], x_min[i], x_max[i]),
+    or all NaN if median_filter() would raise SparseLightCurveError or find
+    only invalid values.
 
-    # Advance the bin.
-    bin_min += bin_spacing
-    bin_max += bin_spacing
+  Raises:
+    ValueError: If an argument has an inappropriate value.
+  """
+  if num_bins < 2:
+    raise ValueError("num_bins must be at least 2. Got: %d" % num_bins)
+  batch_size = len(xs)
+  if len(ys) != batch_size:
+    raise ValueError("len(xs) (got: %d) must equal len(ys) (got: %d)" %
+                     (batch_size, len(ys)))
+  result = np.full((batch_size, num_bins), np.nan)
+  if not batch_size:
+    return result
 
-  result = fill_empty_bin(result)
+  xs = [np.asarray(x) for x in xs]
+  ys = [np.asarray(y) for y in ys]
+  lengths = np.array([len(x) for x in xs])
+  if np.any(lengths != [len(y) for y in ys]):
+    raise ValueError("xs and ys must have the same lengths")
+
+  # Light curves with fewer than 2 points are sparse; their first and last
+  # points are arbitrary placeholders.
+  x_first = np.array([x[0] if len(x) else np.nan for x in xs])
+  x_last = np.array([x[-1] if len(x) else np.nan for x in xs])
+  x_min = np.broadcast_to(x_min if x_min is not None else x_first,
+                          (batch_size,))
+  x_max = np.broadcast_to(x_max if x_max is not None else x_last,
+                          (batch_size,))
+  valid = lengths >= 2
+  if np.any(x_min[valid] >= x_max[valid]):
+    raise ValueError("x_min must be less than x_max")
+  span = x_max - x_min
+  bin_width = np.broadcast_to(
+      bin_width if bin_width is not None else span / num_bins, (batch_size,))
+
+  bin_spacing = (span - bin_width) / (num_bins - 1)
+  steps = np.repeat(bin_spacing[:, np.newaxis], num_bins - 1, axis=1)
+  bin_min = np.add.accumulate(
+      np.concatenate([x_min[:, np.newaxis], steps], axis=1), axis=1)
+  bin_max = np.add.accumulate(
+      np.concatenate([(x_min + bin_width)[:, np.newaxis], steps], axis=1),
+      axis=1)
+
+  # Bin boundaries as indices into the concatenated light curves. The last
+  # two columns count the points in [x_min, x_max].
+  offsets = np.cumsum(lengths) - lengths
+  bounds = np.zeros((batch_size, 2 * num_bins + 2), dtype=np.int64)
+  for i in np.nonzero(valid)[0]:
+    bounds[i, :-1] = np.searchsorted(
+        xs[i], np.concatenate([bin_min[i], bin_max[i], x_min[i:i + 1]]))
+    bounds[i, -1] = np.searchsorted(xs[i], x_max[i], side="right")
+
+  # Same conditions as in median_filter().
+  valid &= bounds[:, -1] - bounds[:, -2] >= 5
+  valid &= x_last - x_first >= span / 2
+  if np.any(bin_width[valid] <= 0):
+    raise ValueError("bin_width must be positive")
+  if np.any(bin_width[valid] >= span[valid]):
+    raise ValueError("bin_width must be less than x_max - x_min")
+
+  rows = np.nonzero(valid)[0]
+  if not len(rows):
+    return result
+
+  # Only the points inside the bins are gathered, so that (e.g. for local
+  # views) the medians don't have to rank whole light curves.
+  lo = bounds[rows, 0]
+  counts = np.maximum(bounds[rows, 2 * num_bins - 1] - lo, 0)
+  used_offsets = np.cumsum(counts) - counts
+  index = np.arange(np.sum(counts)) + np.repeat(
+      offsets[rows] + lo - used_offsets, counts)
+  shift = (used_offsets - lo)[:, np.newaxis]
+  medians = bin_medians(
+      np.concatenate(ys)[index], (bounds[rows, :num_bins] + shift).ravel(),
+      (bounds[rows, num_bins:2 * num_bins] + shift).ravel())
+  medians = medians.reshape(len(rows), num_bins)
+  filled = ~np.all(np.isnan(medians), axis=1)
+  result[rows[filled]] = fill_empty_bin(medians[filled])
   return result
 
 
+def bin_medians(y, starts, ends):
+  """Computes the medians of many (possibly overlapping) slices of an array.
+
+  The slices are gathered into the rows of a 2D array, padded with +inf to the
+  size of the largest one, and the rows are sorted all at once. If that would
+  more than double the number of elements, the slices are first grouped by
+  size, within a factor of 2, and each group is sorted separately.
+
+  Args:
+    y: 1D array.
+    starts: 1D integer array; the inclusive start index of each slice.
+    ends: 1D integer array; the exclusive end index of each slice.
+
+  Returns:
+    1D NumPy array with np.median(y[starts[i]:ends[i]]) at index i, or NaN if
+    the slice is empty.
+  """
+  y = np.asarray(y)
+  starts = np.asarray(starts)
+  counts = np.maximum(np.asarray(ends) - starts, 0)
+  result = np.repeat(np.nan, len(counts))
+  nonempty = np.nonzero(counts)[0]
+  if not len(nonempty):
+    return result
+  starts = starts[nonempty]
+  counts = counts[nonempty]
+
+  if np.max(counts) * len(counts) <= 2 * np.sum(counts):
+    result[nonempty] = _padded_medians(y, starts, counts)
+    return result
+
+  # Grouping the slices keeps the padding below the size of the slices, even
+  # when e.g. the bins of several light curves have very different sizes.
+  size_class = np.ceil(np.log2(counts)).astype(np.int64)
+  medians = np.empty(len(counts))
+  for k in np.unique(size_class):
+    group = np.nonzero(size_class == k)[0]
+    medians[group] = _padded_medians(y, starts[group], counts[group])
+  result[nonempty] = medians
+  return result
+
+
+def _padded_medians(y, starts, counts):
+  """Computes the medians of nonempty slices by sorting them in a 2D array."""
+  max_count = np.max(counts)
+  columns = np.arange(max_count)
+  index = np.minimum(starts[:, np.newaxis] + columns, len(y) - 1)
+  values = np.where(columns < counts[:, np.newaxis], y[index], np.inf)
+  values.sort(axis=1)
+
+  rows = np.arange(len(counts))
+  medians = (values[rows, (counts - 1) // 2] + values[rows, counts // 2]) / 2
+  # NaNs are sorted after the padding. Like np.median, a slice containing NaN
+  # has a NaN median.
+  medians[np.isnan(values[:, -1])] = np.nan
+  return medians
+
+
 def fill_empty_bin(y):
-  """Fill empty bins by interpolating between adjacent bins.
+  """Fill empty bins by interpolating linearly between adjacent bins.
+
+  Empty bins before the first or after the last non-empty bin take the value of
+  that bin.
+
+  Args:
+    y: 1D array, or 2D array with one view per row. Empty bins should have NaN
+        values. Modified in place.
 
-  :param y: 1D array of y-coordinates with the same size as x. Empty bins should have NaN values.
-  :return: same as y, but with NaNs replaced with interpolated values.
+  Returns:
+    y, with NaNs replaced with interpolated values.
+
+  Raises:
+    ValueError: If y (or a row of y) consists only of NaNs.
   """
+  y = np.asarray(y)
+  empty = np.isnan(y)
+  if not np.any(empty):
+    return y
+  if np.any(np.all(empty, axis=-1)):
+    raise ValueError('Light curve consists only of invalid values')
+
+  # Index of the nearest non-empty bin on each side of every bin, or of the
+  # nearest one on the other side at the edges.
+  num_bins = y.shape[-1]
+  index = np.arange(num_bins)
+  left = np.maximum.accumulate(np.where(empty, -1, index), axis=-1)
+  right = np.flip(
+      np.minimum.accumulate(
+          np.flip(np.where(empty, num_bins, index), axis=-1), axis=-1),
+      axis=-1)
+  left, right = np.where(left < 0, right, left), np.where(right == num_bins,
+                                                          left, right)
+
+  gaps = np.nonzero(empty)
+  rows = gaps[:-1]
+  j = gaps[-1]
+  left = left[gaps]
+  right = right[gaps]
+  y_left = y[rows + (left,)]
+  y_right = y[rows + (right,)]
 
-  i = 0
-  while i < len(y):
-    if np.isnan(y[i]):
-      left = i-1
-      right = i+1
-      # Find nearest non-NaN values on both sides
-      while left >= 0 and np.isnan(y[left]):
-        left -= 1
-      while right < len(y) and np.isnan(y[right]):
-        right += 1
-      if left >= 0 and right < len(y):
-        slope = (y[right] - y[left]) / (right - left)
-        for j in range(left + 1, right):
-          y[j] = y[left] + slope*(j - left)
-      elif left < 0 and right < len(y):
-        y[:right] = y[right]
-      elif left >= 0 and right == len(y):
-        y[left+1:] = y[left]
-      else:
-        raise ValueError('Light curve consists only of invalid values')
-    i += 1
-  return y
\ No newline at end of file
+  values = y_left.copy()
+  interior = left != right
+  # Same arithmetic as interpolating one element at a time; the slope is
+  # computed in at least double precision.
+  slope = (y_right[interior] - y_left[interior]) / (
+      right[interior] - left[interior])
+  values[interior] += slope * (j[interior] - left[interior])
+  y[gaps] = values
+  return y
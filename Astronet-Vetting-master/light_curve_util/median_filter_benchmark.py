@@ -0,0 +1,137 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Benchmarks the vectorized median filter against the two-pointer loop.
+
+The views are generated as in preprocess.py: a global view over the whole
+period and a local view around the transit. The batched median filter is
+compared against calling median_filter() once per light curve.
+
+Usage:
+  python light_curve_util/median_filter_benchmark.py --points 1000 500000
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import numpy as np
+
+from light_curve_util import median_filter
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument(
+    "--points",
+    type=int,
+    nargs="+",
+    default=[1000, 10000, 100000, 500000],
+    help="Numbers of light curve points to benchmark.")
+
+parser.add_argument(
+    "--repeats",
+    type=int,
+    default=3,
+    help="Number of timing repeats; the best time is reported.")
+
+parser.add_argument(
+    "--batch_size",
+    type=int,
+    default=1000,
+    help="Number of light curves in the batched benchmark.")
+
+parser.add_argument(
+    "--batch_points",
+    type=int,
+    default=2000,
+    help="Number of points per light curve in the batched benchmark.")
+
+
+def _loop_median_filter(x, y, num_bins, bin_width, x_min, x_max):
+  """Two-pointer median filter, as previously done in median_filter()."""
+  bin_spacing = (x_max - x_min - bin_width) / (num_bins - 1)
+  result = np.repeat(np.nan, num_bins)
+  x_len = len(x)
+  x_start = 0
+  while x[x_start] < x_min:
+    x_start += 1
+  bin_min = x_min
+  bin_max = x_min + bin_width
+  j_start = x_start
+  j_end = x_start
+  for i in range(num_bins):
+    while j_start < x_len and x[j_start] < bin_min:
+      j_start += 1
+    while j_end < x_len and x[j_end] < bin_max:
+      j_end += 1
+    if j_end > j_start:
+      result[i] = np.median(y[j_start:j_end])
+    bin_min += bin_spacing
+    bin_max += bin_spacing
+  return median_filter.fill_empty_bin(result)
+
+
+def main():
+  flags = parser.parse_args()
+  rng = np.random.RandomState(0)
+  period = 3.
+  duration = 0.1
+  views = [
+      ("global", 201, period * 1.2 / 201, -period / 2, period / 2),
+      ("local", 61, duration * 0.16, -2 * duration, 2 * duration),
+  ]
+
+  print("%10s %8s %12s %12s %10s" % ("points", "view", "loop (s)",
+                                     "vector (s)", "speedup"))
+  for num_points in flags.points:
+    x = np.sort(rng.uniform(-period / 2, period / 2, num_points))
+    y = rng.normal(size=num_points).astype(np.float32)
+    for name, num_bins, bin_width, x_min, x_max in views:
+      args = (x, y, num_bins, bin_width, x_min, x_max)
+      loop_time = min(timeit.repeat(
+          lambda: _loop_median_filter(*args), number=1, repeat=flags.repeats))
+      vector_time = min(timeit.repeat(
+          lambda: median_filter.median_filter(*args),
+          number=1, repeat=flags.repeats))
+      print("%10d %8s %12.4f %12.4f %9.1fx" % (num_points, name, loop_time,
+                                               vector_time,
+                                               loop_time / vector_time))
+
+  print()
+  print("%10s %8s %12s %12s %10s" % ("curves", "view", "single (s)",
+                                     "batch (s)", "speedup"))
+  xs = [np.sort(rng.uniform(-period / 2, period / 2, flags.batch_points))
+        for _ in range(flags.batch_size)]
+  ys = [rng.normal(size=flags.batch_points).astype(np.float32)
+        for _ in range(flags.batch_size)]
+  for name, num_bins, bin_width, x_min, x_max in views:
+    single_time = min(timeit.repeat(
+        lambda: [median_filter.median_filter(x, y, num_bins, bin_width, x_min,
+                                             x_max) for x, y in zip(xs, ys)],
+        number=1, repeat=flags.repeats))
+    batch_time = min(timeit.repeat(
+        lambda: median_filter.median_filter_batch(xs, ys, num_bins, bin_width,
+                                                  x_min, x_max),
+        number=1, repeat=flags.repeats))
+    print("%10d %8s %12.4f %12.4f %9.1fx" % (flags.batch_size, name,
+                                             single_time, batch_time,
+                                             single_time / batch_time))
+
+
+if __name__ == "__main__":
+  main()
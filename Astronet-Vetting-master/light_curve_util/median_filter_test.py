@@ -124,5 +124,153 @@ class MedianFilterTest(absltest.TestCase):
     #np.testing.assert_array_equal([7, 1, 5, 2, 3], result)
 
 
+  def testBinMedians(self):
+    y = np.array([5., 1., 4., 2., 3., np.nan, 6.])
+    result = median_filter.bin_medians(y, [0, 1, 2, 3, 0, 4], [3, 5, 2, 7, 7, 5])
+    np.testing.assert_array_equal([4, 2.5, np.nan, np.nan, np.nan, 3], result)
+
+  def testBinMediansUnevenSizes(self):
+    rng = np.random.RandomState(0)
+    y = rng.normal(size=5000)
+    y[1234] = np.nan
+    starts = rng.randint(0, 5000, size=300)
+    ends = np.minimum(starts + np.concatenate([rng.randint(0, 4, size=290),
+                                               rng.randint(500, 2000, size=10)]),
+                      len(y))
+    result = median_filter.bin_medians(y, starts, ends)
+    expected = [np.median(y[i:j]) if j > i else np.nan
+                for i, j in zip(starts, ends)]
+    np.testing.assert_array_equal(expected, result)
+
+  def testMatchesReference(self):
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+      num_points = rng.randint(50, 500)
+      x = np.sort(rng.uniform(-1, 1, num_points))
+      x[rng.randint(num_points - 10, size=5)] = x[-5]  # Duplicate x values.
+      x = np.sort(x)
+      y = rng.normal(size=num_points).astype(rng.choice([np.float32,
+                                                         np.float64]))
+      if rng.uniform() < 0.3:
+        y[rng.randint(num_points)] = np.nan
+      num_bins = rng.randint(2, 100)
+      x_min = rng.uniform(-1, -0.5)
+      x_max = rng.uniform(0.5, 1)
+      bin_width = rng.uniform(0.01, 0.5) * (x_max - x_min)
+
+      # Brute force: compare x against the endpoints of every bin.
+      expected = np.repeat(np.nan, num_bins)
+      bin_spacing = (x_max - x_min - bin_width) / (num_bins - 1)
+      bin_min = x_min
+      bin_max = x_min + bin_width
+      for i in range(num_bins):
+        in_bin = (x >= bin_min) & (x < bin_max)
+        if np.any(in_bin):
+          expected[i] = np.median(y[in_bin])
+        bin_min += bin_spacing
+        bin_max += bin_spacing
+      if np.all(np.isnan(expected)):
+        continue
+      expected = median_filter.fill_empty_bin(expected)
+
+      result = median_filter.median_filter(x, y, num_bins, bin_width, x_min,
+                                           x_max)
+      np.testing.assert_array_equal(expected, result)
+
+  def testFillEmptyBin(self):
+    nan = np.nan
+    y = np.array([nan, nan, 1, nan, nan, 4, 5, nan, 3, nan])
+    result = median_filter.fill_empty_bin(y)
+    self.assertIs(y, result)
+    np.testing.assert_array_equal([1, 1, 1, 2, 3, 4, 5, 4, 3, 3], result)
+
+    # Each row of a 2D array is filled independently.
+    y = np.array([[nan, 2, nan, 4], [1, nan, nan, nan], [1, 2, 3, 4]])
+    np.testing.assert_array_equal([[2, 2, 3, 4], [1, 1, 1, 1], [1, 2, 3, 4]],
+                                  median_filter.fill_empty_bin(y))
+
+    with self.assertRaises(ValueError):
+      median_filter.fill_empty_bin(np.array([nan, nan]))
+    with self.assertRaises(ValueError):
+      median_filter.fill_empty_bin(np.array([[1, 2], [nan, nan]]))
+
+  def testViews(self):
+    rng = np.random.RandomState(2)
+    x = np.sort(rng.uniform(-1, 1, 500))
+    y = rng.normal(size=500)
+    views = [(201, 0.012, -1, 1), (61, 0.02, -0.2, 0.2), (7, None, None, None)]
+    result = median_filter.median_filter_views(x, y, views)
+    self.assertLen(result, 3)
+    for view, actual in zip(views, result):
+      np.testing.assert_array_equal(
+          median_filter.median_filter(x, y, *view), actual)
+
+    with self.assertRaises(median_filter.SparseLightCurveError):
+      median_filter.median_filter_views(x, y, [views[0], (61, 0.1, 2, 3)])
+
+  def testBinCounts(self):
+    x = np.arange(-6, 7)
+    y = np.arange(1, 14)
+    counts = median_filter.bin_counts(
+        x, y, num_bins=5, bin_width=3, x_min=-5, x_max=5)
+    np.testing.assert_array_equal([3, 3, 3, 3, 3], counts)
+
+    counts = median_filter.bin_counts(
+        x, y, num_bins=9, bin_width=0.5, x_min=-5, x_max=5)
+    np.testing.assert_array_equal([1, 0, 0, 1, 1, 1, 0, 0, 0], counts)
+
+    with self.assertRaises(median_filter.SparseLightCurveError):
+      median_filter.bin_counts(x, y, num_bins=5, bin_width=1, x_min=7, x_max=9)
+
+  def testViewBinCounts(self):
+    x = np.arange(-6, 7)
+    y = np.arange(1, 14)
+    views = [(5, 3, -5, 5), (9, 0.5, -5, 5)]
+    counts = median_filter.view_bin_counts(x, y, views)
+    self.assertLen(counts, 2)
+    for view, actual in zip(views, counts):
+      np.testing.assert_array_equal(median_filter.bin_counts(x, y, *view),
+                                    actual)
+    self.assertEmpty(median_filter.view_bin_counts(x, y, []))
+
+    with self.assertRaises(median_filter.SparseLightCurveError):
+      median_filter.view_bin_counts(x, y, [views[0], (5, 1, 7, 9)])
+
+  def testBatch(self):
+    rng = np.random.RandomState(1)
+    xs = []
+    ys = []
+    for num_points in [100, 3, 250, 40]:
+      xs.append(np.sort(rng.uniform(-1, 1, num_points)))
+      ys.append(rng.normal(size=num_points))
+    ys[2][7] = np.nan
+    x_min = np.array([-1, -1, -0.5, -0.8])
+    x_max = np.array([1, 1, 0.5, 0.9])
+    bin_width = 0.2 * (x_max - x_min)
+
+    result = median_filter.median_filter_batch(xs, ys, 21, bin_width, x_min,
+                                               x_max)
+    self.assertEqual((4, 21), result.shape)
+    for i in [0, 2, 3]:
+      np.testing.assert_array_equal(
+          median_filter.median_filter(xs[i], ys[i], 21, bin_width[i], x_min[i],
+                                      x_max[i]), result[i])
+    # Too few points.
+    self.assertTrue(np.all(np.isnan(result[1])))
+
+    # Default arguments.
+    result = median_filter.median_filter_batch(xs[:1], ys[:1], 10)
+    np.testing.assert_array_equal(
+        median_filter.median_filter(xs[0], ys[0], 10), result[0])
+
+    with self.assertRaises(ValueError):
+      median_filter.median_filter_batch(xs, ys[:2], 10)
+    with self.assertRaises(ValueError):
+      median_filter.median_filter_batch(xs, ys, 10, x_min=0, x_max=0)
+    self.assertEqual((0, 10),
+                     median_filter.median_filter_batch([], [], 10).shape)
+
+
+
 if __name__ == '__main__':
   absltest.main()
@@ -0,0 +1,121 @@
+# Copyright 2018 The TensorFlow Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Robust statistics for cleaning and normalizing light curves.
+
+Each median is computed with a single np.partition() of the input, and 2D
+inputs (e.g. the magnitudes of several apertures) are processed row by row in
+one call.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+# Median absolute deviation of the standard normal distribution, the inverse
+# normal CDF at 3/4. Dividing by it makes the median absolute deviation a
+# consistent estimator of the standard deviation, as in
+# statsmodels.robust.scale.mad().
+NORMAL_MAD = 0.6744897501960817
+
+
+def median(x, axis=-1):
+  """Computes the median of an array along an axis.
+
+  Equal to np.median(x, axis), computed with a single np.partition().
+
+  Args:
+    x: Numpy array.
+    axis: Axis along which to compute the median.
+
+  Returns:
+    Numpy array with the shape of x without axis; the median. NaN if x is empty
+    along axis or contains NaN.
+  """
+  x = np.asarray(x)
+  n = x.shape[axis]
+  if not n:
+    return np.full(np.delete(x.shape, axis), np.nan)
+
+  # The selection also moves any NaN values to the end.
+  x = np.partition(x, sorted({(n - 1) // 2, n // 2, n - 1}), axis=axis)
+  result = (np.take(x, (n - 1) // 2, axis=axis) +
+            np.take(x, n // 2, axis=axis)) / 2
+  if np.issubdtype(x.dtype, np.inexact):
+    result = np.where(np.isnan(np.take(x, n - 1, axis=axis)), np.nan,
+                      result)[()]
+  return result
+
+
+def median_and_mad(x, axis=-1):
+  """Computes the median and median absolute deviation of an array.
+
+  Args:
+    x: Numpy array.
+    axis: Axis along which to compute the statistics.
+
+  Returns:
+    center: Numpy array with the shape of x without axis; the median.
+    mad: Numpy array with the shape of center; the median absolute deviation
+        divided by NORMAL_MAD, an estimate of the standard deviation. Equal to
+        statsmodels.robust.scale.mad(x, axis=axis).
+  """
+  x = np.asarray(x)
+  center = median(x, axis=axis)
+  absdev = np.abs(x - np.expand_dims(center, axis))
+  return center, median(absdev, axis=axis) / NORMAL_MAD
+
+
+def sigma_clip(x, lower=None, upper=None, axis=-1):
+  """Identifies values within a number of robust standard deviations.
+
+  Args:
+    x: Numpy array.
+    lower: Values less than or equal to median - lower * mad are clipped, where
+        mad is the scaled median absolute deviation of median_and_mad(). If
+        None, no values are clipped below the median.
+    upper: Values greater than or equal to median + upper * mad are clipped. If
+        None, no values are clipped above the median.
+    axis: Axis along which to compute the median and median absolute deviation.
+
+  Returns:
+    Boolean numpy array with the same shape as x; False for clipped values.
+  """
+  x = np.asarray(x)
+  center, mad = median_and_mad(x, axis=axis)
+  center = np.expand_dims(center, axis)
+  mad = np.expand_dims(mad, axis)
+  mask = np.ones_like(x, dtype=bool)
+  if lower is not None:
+    mask &= x > center - lower * mad
+  if upper is not None:
+    mask &= x < center + upper * mad
+  return mask
+
+
+def subtract_median(x, axis=-1):
+  """Subtracts the median of an array along an axis.
+
+  Args:
+    x: Numpy array.
+    axis: Axis along which to compute the median. For a 2D array and axis -1,
+        the median of each row is subtracted from that row.
+
+  Returns:
+    Numpy array with the same shape as x; x minus its median.
+  """
+  x = np.asarray(x)
+  return x - np.expand_dims(median(x, axis=axis), axis)
@@ -0,0 +1,286 @@
+# Copyright 2018 Liang Yu.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Index of the TESS light curve files in a data directory.
+
+The index is built by scanning the data directory once and parsing the file
+names, so lookups by TIC ID never touch the filesystem. It can be persisted to
+a compact .npz file; when it is loaded again only the directories whose
+modification time changed (e.g. the data directory itself, when a new sector
+directory appears) are listed again.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import os
+import re
+import tempfile
+import threading
+
+import numpy as np
+
+# Increment to invalidate persisted indexes when the file format changes.
+_INDEX_VERSION = 1
+
+# SPOC target pixel and light curve files, e.g.
+# tess2021258175143-s0043-0000000012345678-0214-s_lc.fits.
+_SPOC_RE = re.compile(r"^tess\d{13}-s(?P<sector>\d{4})-(?P<tic>\d{16})-\d{4}-"
+                      r"[a-z]_(?P<fast>fast-)?(?P<product>lc|tp)\.fits(\.gz)?$")
+
+# TESS-SPOC FFI light curves, e.g.
+# hlsp_tess-spoc_tess_phot_0000000012345678-s0043_tess_v1_lc.fits.
+_TESS_SPOC_RE = re.compile(r"^hlsp_tess-spoc_tess_phot_(?P<tic>\d{16})-"
+                           r"s(?P<sector>\d{4})_tess_v\d+_(?P<product>lc|tp)"
+                           r"\.fits(\.gz)?$")
+
+# Camera and CCD, if the data is organized in per-CCD directories.
+_CAMERA_CCD_RE = re.compile(r"cam(?P<camera>[1-4])[-_]?ccd(?P<ccd>[1-4])")
+
+TessFile = collections.namedtuple(
+    "TessFile", ["tic", "sector", "camera", "ccd", "cadence", "product", "path"])
+
+_Directory = collections.namedtuple("_Directory",
+                                    ["mtime", "subdirs", "entries"])
+
+# Entry fields stored per file; the path is reconstructed from the directory.
+_Entry = collections.namedtuple(
+    "_Entry", ["name", "tic", "sector", "camera", "ccd", "cadence", "product"])
+
+
+def parse_filename(name, dirname=""):
+  """Parses the name of a TESS light curve file.
+
+  Args:
+    name: Base name of the file.
+    dirname: Directory containing the file, used to find the camera and CCD.
+
+  Returns:
+    A TessFile with path set to name, or None if name is not a recognized TESS
+    file. The camera and CCD are 0 if unknown, and the cadence is "120s", "20s"
+    or "ffi".
+  """
+  match = _SPOC_RE.match(name)
+  if match:
+    cadence = "20s" if match.group("fast") else "120s"
+  else:
+    match = _TESS_SPOC_RE.match(name)
+    if not match:
+      return None
+    cadence = "ffi"
+
+  camera_ccd = _CAMERA_CCD_RE.findall(dirname)
+  camera, ccd = camera_ccd[-1] if camera_ccd else (0, 0)
+  return TessFile(
+      tic=int(match.group("tic")),
+      sector=int(match.group("sector")),
+      camera=int(camera),
+      ccd=int(ccd),
+      cadence=cadence,
+      product=match.group("product"),
+      path=name)
+
+
+class TessIndex(object):
+  """Lookup table from TIC ID to the TESS files in a data directory."""
+
+  def __init__(self, base_dir, index_file=None):
+    """Initializes the TessIndex, loading index_file and refreshing it.
+
+    Args:
+      base_dir: Base directory containing TESS data, on a local or mounted
+          filesystem. All subdirectories are scanned.
+      index_file: Optional path of the persisted index. It is read if it exists
+          and was built for base_dir, and rewritten whenever a refresh finds
+          changes. It should live outside base_dir; otherwise every save
+          changes the modification time of the directory containing it.
+    """
+    self._base_dir = os.path.abspath(base_dir)
+    self._index_file = index_file
+    self._dirs = {}
+    self._by_tic = {}
+    self._lock = threading.Lock()
+    if index_file and os.path.exists(index_file):
+      self._load()
+    self.refresh()
+
+  @property
+  def base_dir(self):
+    return self._base_dir
+
+  def __len__(self):
+    return sum(len(d.entries) for d in self._dirs.values())
+
+  def refresh(self):
+    """Lists the directories that changed since the index was last refreshed.
+
+    Safe to call concurrently with lookup() from other threads.
+
+    Returns:
+      True if the index changed.
+    """
+    with self._lock:
+      return self._refresh()
+
+  def _refresh(self):
+    changed = False
+    seen = set()
+    stack = [""]
+    while stack:
+      rel_dir = stack.pop()
+      path = os.path.join(self._base_dir, rel_dir)
+      try:
+        mtime = os.stat(path).st_mtime_ns
+      except OSError:
+        continue
+      seen.add(rel_dir)
+
+      old = self._dirs.get(rel_dir)
+      if old is not None and old.mtime == mtime:
+        stack.extend(old.subdirs)
+        continue
+
+      subdirs = []
+      entries = []
+      for dir_entry in os.scandir(path):
+        if dir_entry.is_dir():
+          subdirs.append(os.path.join(rel_dir, dir_entry.name))
+          continue
+        tess_file = parse_filename(dir_entry.name, rel_dir)
+        if tess_file is not None:
+          entries.append(_Entry(dir_entry.name, *tess_file[:-1]))
+      self._dirs[rel_dir] = _Directory(mtime, subdirs, entries)
+      stack.extend(subdirs)
+      changed = True
+
+    for rel_dir in set(self._dirs) - seen:
+      del self._dirs[rel_dir]
+      changed = True
+
+    if changed or not self._by_tic:
+      # Replaced in a single assignment, so lookups never see a partial dict.
+      self._by_tic = self._build_lookup()
+    if changed and self._index_file:
+      self._save()
+    return changed
+
+  def lookup(self, tic, sector=None, product=None, cadence=None):
+    """Returns the files for a TIC ID.
+
+    If there are none, the index is refreshed first: every indexed directory
+    is stat-ed, and those whose modification time changed (e.g. because a new
+    file or sector directory appeared) are listed again.
+
+    Args:
+      tic: TIC of the target star. May be an int or a possibly zero-padded
+          string.
+      sector: Optional int; only return files from this sector.
+      product: Optional "lc" or "tp"; only return files of this product.
+      cadence: Optional "120s", "20s" or "ffi"; only return files with this
+          cadence.
+
+    Returns:
+      A list of TessFile sorted by sector and path.
+    """
+    files = self._lookup(int(tic), sector, product, cadence)
+    if not files and self.refresh():
+      files = self._lookup(int(tic), sector, product, cadence)
+    return files
+
+  def _lookup(self, tic, sector, product, cadence):
+    files = self._by_tic.get(tic, [])
+    if sector is not None:
+      files = [f for f in files if f.sector == int(sector)]
+    if product is not None:
+      files = [f for f in files if f.product == product]
+    if cadence is not None:
+      files = [f for f in files if f.cadence == cadence]
+    return files
+
+  def _build_lookup(self):
+    by_tic = collections.defaultdict(list)
+    for rel_dir, directory in self._dirs.items():
+      for entry in directory.entries:
+        path = os.path.join(self._base_dir, rel_dir, entry.name)
+        by_tic[entry.tic].append(TessFile(path=path, *entry[1:]))
+    for files in by_tic.values():
+      files.sort(key=lambda f: (f.sector, f.path))
+    return dict(by_tic)
+
+  def _save(self):
+    """Writes the index to index_file as a table of columns."""
+    dir_names = sorted(self._dirs)
+    dir_index = []
+    entries = []
+    for i, rel_dir in enumerate(dir_names):
+      for entry in self._dirs[rel_dir].entries:
+        dir_index.append(i)
+        entries.append(entry)
+    columns = dict(zip(_Entry._fields, zip(*entries))) if entries else {
+        field: [] for field in _Entry._fields}
+
+    # Write to a temporary file first so that concurrent readers never see a
+    # partially written index.
+    index_dir = os.path.dirname(os.path.abspath(self._index_file))
+    fd, tmp_file = tempfile.mkstemp(dir=index_dir, suffix=".npz")
+    with os.fdopen(fd, "wb") as f:
+      np.savez(
+          f,
+          version=_INDEX_VERSION,
+          base_dir=self._base_dir,
+          dir_names=np.array(dir_names, dtype=str),
+          dir_mtimes=np.array([self._dirs[d].mtime for d in dir_names],
+                              dtype=np.int64),
+          dir_index=np.array(dir_index, dtype=np.int32),
+          name=np.array(columns["name"], dtype=str),
+          tic=np.array(columns["tic"], dtype=np.int64),
+          sector=np.array(columns["sector"], dtype=np.int16),
+          camera=np.array(columns["camera"], dtype=np.int8),
+          ccd=np.array(columns["ccd"], dtype=np.int8),
+          cadence=np.array(columns["cadence"], dtype=str),
+          product=np.array(columns["product"], dtype=str))
+    os.rename(tmp_file, self._index_file)
+
+  def _load(self):
+    """Reads the index from index_file, unless it is stale or corrupt."""
+    try:
+      with np.load(self._index_file) as data:
+        if (int(data["version"]) != _INDEX_VERSION or
+            str(data["base_dir"]) != self._base_dir):
+          return
+        columns = [data[field] for field in _Entry._fields]
+        dir_names = data["dir_names"]
+        dir_mtimes = data["dir_mtimes"]
+        dir_index = data["dir_index"]
+    except (IOError, OSError, KeyError, ValueError):
+      return
+
+    dir_entries = [[] for _ in dir_names]
+    for i, values in zip(dir_index, zip(*columns)):
+      name, tic, sector, camera, ccd, cadence, product = values
+      dir_entries[i].append(
+          _Entry(str(name), int(tic), int(sector), int(camera), int(ccd),
+                 str(cadence), str(product)))
+
+    dir_names = [str(d) for d in dir_names]
+    subdirs = collections.defaultdict(list)
+    for rel_dir in dir_names:
+      if rel_dir:
+        subdirs[os.path.dirname(rel_dir)].append(rel_dir)
+    self._dirs = {
+        rel_dir: _Directory(int(mtime), subdirs[rel_dir], entries)
+        for rel_dir, mtime, entries in zip(dir_names, dir_mtimes, dir_entries)
+    }
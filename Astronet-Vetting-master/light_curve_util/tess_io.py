@@ -25,16 +25,112 @@ import numpy as np
 from tensorflow import io
 
 
+def _is_local_path(filename):
+    """Returns True if filename refers to the local filesystem."""
+    return "://" not in filename
+
+
+def open_fits(filename, memmap=True):
+    """Opens a FITS file exactly once.
+
+    Local files are memory-mapped so only the pages backing the columns that are
+    actually accessed get read. Other paths (e.g. gs://) are streamed through
+    GFile, which astropy cannot memory-map.
+
+    Args:
+      filename: str name of the fits file.
+      memmap: Whether to memory-map local files.
+
+    Returns:
+      An astropy HDUList.
+    """
+    if memmap and _is_local_path(filename):
+        return fits.open(filename, memmap=True, lazy_load_hdus=True)
+    return fits.open(io.gfile.GFile(filename, mode="rb"))
+
+
+def _to_native(array):
+    """Copies a (big-endian) FITS column into a native byte order array."""
+    array = np.asarray(array)
+    return np.array(array, dtype=array.dtype.newbyteorder("="))
+
+
+def time_window(time, t_min=None, t_max=None):
+    """Returns the slice of rows of a time column within [t_min, t_max].
+
+    The time column of a light curve is ascending apart from NaN gaps, so the
+    window is found by binary search rather than by comparing every row. Rows
+    with NaN time inside the window are part of the slice.
+
+    Args:
+      time: 1D Numpy array of time values, ascending apart from NaNs.
+      t_min: Optional minimum time, inclusive.
+      t_max: Optional maximum time, inclusive.
+
+    Returns:
+      A slice object.
+    """
+    if t_min is None and t_max is None:
+        return slice(None)
+    # Running maximum with NaNs skipped, which is non-decreasing.
+    running_max = np.fmax.accumulate(np.where(np.isnan(time), -np.inf, time))
+    start = 0 if t_min is None else np.searchsorted(running_max, t_min, side='left')
+    end = len(time) if t_max is None else np.searchsorted(running_max, t_max, side='right')
+    return slice(start, max(start, end))
+
+
+# Bits of the aperture image (the third HDU) of a TESS target pixel file.
+APERTURE_COLLECTED = 1  # Pixel was collected by the spacecraft.
+APERTURE_OPTIMAL = 2  # Pixel is in the optimal photometric aperture.
+APERTURE_BACKGROUND = 4  # Pixel was used to estimate the background.
+APERTURE_CENTROID = 8  # Pixel was used for the flux-weighted centroid.
+APERTURE_PRF_CENTROID = 16  # Pixel was used for the PRF-based centroid.
+APERTURE_OUTPUT_A = 32  # Pixel is on CCD output A.
+APERTURE_OUTPUT_B = 64  # Pixel is on CCD output B.
+APERTURE_OUTPUT_C = 128  # Pixel is on CCD output C.
+APERTURE_OUTPUT_D = 256  # Pixel is on CCD output D.
+
+
+def aperture_mask(ap, bits=APERTURE_OPTIMAL, require_all=False):
+    """Decodes pixel masks from a TESS aperture bitmask image.
+
+    Args:
+      ap: 2D integer array; the aperture image of a target pixel file.
+      bits: Int bit set, e.g. APERTURE_OPTIMAL | APERTURE_CENTROID, or a
+          sequence of bit sets to decode several masks at once.
+      require_all: If True, a pixel is in a mask only if all of its bits are set;
+          otherwise any one of them suffices.
+
+    Returns:
+      Boolean array of the same shape as ap, or of shape [len(bits)] + ap.shape
+      if bits is a sequence.
+    """
+    ap = np.asarray(ap)
+    bits = np.asarray(bits, dtype=ap.dtype)
+    set_bits = ap & bits.reshape(bits.shape + (1,) * ap.ndim)
+    if require_all:
+        return set_bits == bits.reshape(bits.shape + (1,) * ap.ndim)
+    return set_bits != 0
+
+
 def define_aperture(ap, get_optval, app_size):
+    """Returns the optimal aperture, or a square aperture centered in ap.
+
+    Args:
+      ap: 2D array; the aperture image of a target pixel file.
+      get_optval: If True, return the optimal aperture. Otherwise, return an
+          app_size x app_size square at the center of the image.
+      app_size: Int size of the square aperture.
+
+    Returns:
+      2D array of the same shape as ap; 1 inside the aperture and 0 outside.
+    """
     ap_c_rowpos = ap.shape[0]//2
     ap_c_colpos = ap.shape[1]//2
     rangeval = app_size//2
 
     if get_optval:
-        bitmask_arr = np.array(list(map(np.binary_repr, ap.flatten())))
-        opttest = np.array([binval[-2] for binval in bitmask_arr])
-        bitmask2_set = np.where(opttest == '1', 1, 0)
-        bitmask2_set = bitmask2_set.reshape(ap.shape)
+        bitmask2_set = aperture_mask(ap, APERTURE_OPTIMAL).astype(int)
 
     if not get_optval:
         bitmask2_set = np.zeros(ap.shape)
@@ -50,12 +146,181 @@ def flux_aperture(app_array, iflux_arr):
 
     return flux_val
 
+
+# Maximum number of pixel values converted to float64 at once in
+# aperture_photometry().
+_PHOTOMETRY_CHUNK_SIZE = 2**20
+
+
+def aperture_photometry(flux_cube, apertures, centroid_apertures=None):
+    """Sums the flux inside several apertures for every cadence at once.
+
+    This is a batched equivalent of calling flux_aperture() once per aperture
+    and per cadence. The aperture masks are stacked into a single weight array
+    and contracted with the cube in chunks of cadences, so only one chunk at a
+    time is converted to float64 (e.g. of a memory-mapped float32 cube).
+
+    Args:
+      flux_cube: 3D array of shape [num_cadences, num_rows, num_cols]; the FLUX
+          column of a target pixel file.
+      apertures: Sequence of 2D arrays of shape [num_rows, num_cols]. Pixels equal
+          to 1 are inside the aperture.
+      centroid_apertures: Optional sequence of apertures like apertures. If given,
+          the flux-weighted centroid inside each of them is computed in the same
+          pass, by adding the row- and column-weighted masks to the weights.
+
+    Returns:
+      sums: 2D NumPy array of shape [num_apertures, num_cadences] containing the
+          summed flux inside each aperture.
+      centroids: Only returned if centroid_apertures is not None. 3D NumPy array
+          of shape [num_centroid_apertures, 2, num_cadences] containing the row
+          and column of the flux-weighted centroid, in pixels of the cutout.
+    """
+    masks = [np.asarray(ap) == 1 for ap in apertures]
+    num_apertures = len(masks)
+    if centroid_apertures is not None:
+        rows, cols = np.indices(flux_cube.shape[1:])
+        for ap in centroid_apertures:
+            mask = np.asarray(ap) == 1
+            masks.extend([mask, mask * rows, mask * cols])
+    weights = np.stack(masks).reshape(len(masks), -1).astype(np.float64)
+    inside = weights != 0
+    pixels = flux_cube.reshape(len(flux_cube), -1)
+    sums = np.empty((len(weights), len(pixels)))
+    chunk_size = max(1, _PHOTOMETRY_CHUNK_SIZE // max(pixels.shape[1], 1))
+    for start in range(0, len(pixels), chunk_size):
+        chunk = pixels[start:start + chunk_size]
+
+        # Non-finite pixels outside an aperture must not leak into its sum, so
+        # they are zeroed before the contraction and handled separately below.
+        finite = np.isfinite(chunk)
+        all_finite = finite.all()
+        if not all_finite:
+            chunk = np.where(finite, chunk, 0)
+
+        sums[:, start:start + len(chunk)] = np.dot(weights, chunk.T.astype(np.float64))
+
+        if not all_finite:
+            # Recompute the few cadences with non-finite pixels inside an
+            # aperture so they propagate NaN/inf exactly as flux_aperture() does.
+            bad = np.dot(inside.astype(np.int64), (~finite).T.astype(np.int64)) > 0
+            for i, d in zip(*np.nonzero(bad)):
+                d += start
+                sums[i, d] = np.sum(np.where(inside[i], weights[i] * flux_cube[d].ravel(), 0))
+
+    if centroid_apertures is None:
+        return sums
+
+    moments = sums[num_apertures:].reshape(-1, 3, len(flux_cube))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centroids = moments[:, 1:] / moments[:, :1]
+    return sums[:num_apertures], centroids
+
+
+def summed_area_table(flux_cube):
+    """Builds the summed-area table (2D cumulative sum) of every cadence.
+
+    Args:
+      flux_cube: 3D array of shape [num_cadences, num_rows, num_cols].
+
+    Returns:
+      3D float64 array of shape [num_cadences, num_rows + 1, num_cols + 1],
+      where sat[d, i, j] is the sum of flux_cube[d, :i, :j].
+    """
+    num_cadences, num_rows, num_cols = flux_cube.shape
+    sat = np.zeros((num_cadences, num_rows + 1, num_cols + 1))
+    np.cumsum(flux_cube, axis=1, dtype=np.float64, out=sat[:, 1:, 1:])
+    np.cumsum(sat[:, 1:, 1:], axis=2, out=sat[:, 1:, 1:])
+    return sat
+
+
+def box_sum(sat, row_min, row_max, col_min, col_max):
+    """Sums the pixels in flux_cube[:, row_min:row_max, col_min:col_max].
+
+    Each sum costs four lookups per cadence in the summed-area table.
+
+    Args:
+      sat: Summed-area table, as returned by summed_area_table().
+      row_min: Inclusive first row of the box.
+      row_max: Exclusive last row of the box.
+      col_min: Inclusive first column of the box.
+      col_max: Exclusive last column of the box.
+
+    Returns:
+      1D NumPy array of length num_cadences.
+    """
+    return (sat[:, row_max, col_max] - sat[:, row_min, col_max] -
+            sat[:, row_max, col_min] + sat[:, row_min, col_min])
+
+
+def _centered_box(shape, app_size):
+    """Returns the (start, stop) rows and columns of a centered aperture.
+
+    The box is the one set by define_aperture(), including its slicing at the
+    frame edges: a start before the first pixel counts from the end of the
+    frame, as in Python slicing.
+    """
+    bounds = []
+    for size, app in zip(shape, np.broadcast_to(app_size, 2)):
+        center = size // 2
+        app_range = app // 2
+        start, stop, _ = slice(center - app_range, center + app_range + 1).indices(size)
+        bounds.append((start, max(start, stop)))
+    return bounds
+
+
+def centered_box_photometry(flux_cube, app_sizes):
+    """Sums the flux inside centered square or rectangular apertures.
+
+    Apertures are centered like define_aperture(): an aperture of size s spans
+    2 * (s // 2) + 1 pixels around the central pixel. The sums are computed
+    from a summed-area table of the pixels covered by any of the apertures,
+    built for one chunk of cadences at a time. Cadences with a non-finite pixel
+    inside an aperture are summed directly, so NaN and inf propagate as in
+    flux_aperture().
+
+    Args:
+      flux_cube: 3D array of shape [num_cadences, num_rows, num_cols].
+      app_sizes: Sequence of aperture sizes. Each is an int for a square
+          aperture or a (num_rows, num_cols) pair for a rectangular aperture.
+
+    Returns:
+      2D NumPy array of shape [len(app_sizes), num_cadences].
+    """
+    boxes = [_centered_box(flux_cube.shape[1:], app_size) for app_size in app_sizes]
+    sums = np.zeros((len(boxes), len(flux_cube)))
+    boxes = [(i, box) for i, box in enumerate(boxes)
+             if box[0][0] < box[0][1] and box[1][0] < box[1][1]]
+    if not boxes:
+        return sums
+
+    # Only the bounding box of the apertures is read and tabulated.
+    row_min = min(rows[0] for _, (rows, _) in boxes)
+    row_max = max(rows[1] for _, (rows, _) in boxes)
+    col_min = min(cols[0] for _, (_, cols) in boxes)
+    col_max = max(cols[1] for _, (_, cols) in boxes)
+    chunk_size = max(1, _PHOTOMETRY_CHUNK_SIZE // ((row_max - row_min) * (col_max - col_min)))
+    for start in range(0, len(flux_cube), chunk_size):
+        chunk = flux_cube[start:start + chunk_size, row_min:row_max, col_min:col_max]
+        finite = np.isfinite(chunk)
+        all_finite = finite.all()
+        sat = summed_area_table(chunk if all_finite else np.where(finite, chunk, 0))
+        for i, ((r0, r1), (c0, c1)) in boxes:
+            r0, r1, c0, c1 = r0 - row_min, r1 - row_min, c0 - col_min, c1 - col_min
+            sums[i, start:start + len(chunk)] = box_sum(sat, r0, r1, c0, c1)
+            if not all_finite:
+                for d in np.nonzero(~finite[:, r0:r1, c0:c1].all(axis=(1, 2)))[0]:
+                    sums[i, start + d] = np.sum(chunk[d, r0:r1, c0:c1])
+    return sums
+
+
 def tess_filenames(tic,
                      base_dir='D:/ExoplanetMLFiles/Alt_Exoplanet/TESSExoplanetData/Astronet-Vetting-master/Astronet-Vetting-master/astronet/tess',
                      sector=43,
                      injected=False,
                      inject_dir='/sector-43',
-                     check_existence=True):
+                     check_existence=True,
+                     index=None):
     """Returns the light curve filename for a TESS target star.
 
     Args:
@@ -69,10 +334,18 @@ def tess_filenames(tic,
       injected_dir: Directory containing light curves with injected transits.
       check_existence: If True, only return filenames corresponding to files that
           exist.
+      index: Optional tess_index.TessIndex of base_dir. If given, the filename
+          is looked up in the index instead of being built from a fixed pattern
+          and checked for existence, and the latest file for the sector is
+          returned.
 
     Returns:
       filename for given TIC.
     """
+    if index is not None and not injected:
+        files = index.lookup(tic, sector=sector, product='tp')
+        return files[-1].path if files else None
+
     tic = str(tic).rjust(16, '0')
 
     if not injected:
@@ -88,49 +361,78 @@ def tess_filenames(tic,
     return
 
 
-def read_tess_light_curve(filename, flux_key='KSPMagnitude', invert=True):
+def read_tess_light_curve(filename, flux_key='KSPMagnitude', invert=True, app_sizes=None, memmap=True,
+                          t_min=None, t_max=None, centroids=False):
     """Reads time and flux measurements for a TESS target star.
 
     Args:
       filename: str name of fits file containing light curve.
       flux_key: Key of fits column containing detrended flux.
       invert: Whether to invert the flux measurements by multiplying by -1.
+      app_sizes: Optional sequence of additional centered aperture sizes; see
+          centered_box_photometry(). All centered apertures are summed from the
+          same summed-area tables, so extra sizes are almost free.
+      memmap: Whether to memory-map local files. See open_fits().
+      t_min: Optional minimum time. If t_min or t_max is given, only the rows of
+          the FITS table within [t_min, t_max] are decoded (see time_window()),
+          and cadences without a valid time are dropped.
+      t_max: Optional maximum time.
+      centroids: Whether to also return the flux-weighted centroid in the optimal
+          aperture. It is computed in the same pass as the optimal aperture flux.
 
     Returns:
       time: Numpy array; the time values of the light curve.
       mag: Numpy array corresponding to magnitudes at each time step (optimal aperture).
       mag_small: Numpy array corresponding to magnitudes at each time step (aperture).
+      mag_big: Numpy array corresponding to magnitudes at each time step (big aperture).
+      mag_apertures: Only returned if app_sizes is not None. 2D Numpy array with
+          one row of magnitudes for each entry of app_sizes.
+      centroid: Only returned if centroids is True. 2D Numpy array of shape
+          [2, num_cadences]; the row and column of the flux-weighted centroid.
     """
-    with fits.open(io.gfile.GFile(filename, mode="rb")) as hdu_list:
-        apgroup = hdu_list[2].data
-        flux_array = hdu_list[1].data['FLUX']
+    if app_sizes is None:
+        extra_sizes = []
+    else:
+        extra_sizes = list(app_sizes)
+
+    with open_fits(filename, memmap=memmap) as hdu_list:
+        apgroup = _to_native(hdu_list[2].data)
+        table = hdu_list[1].data
+        time = _to_native(table['TIME'])
+        rows = time_window(time, t_min, t_max)
+        # Only the rows in the window are decoded from here on.
+        table = table[rows]
+        time = time[rows]
+        # The flux cube is left as a (big-endian, possibly memory-mapped) view
+        # of the FITS column. The photometry converts it a chunk at a time.
+        flux_array = table['FLUX']
         api = define_aperture(apgroup, True, 0)
 
         small_ap = 3
         big_ap = 5
 
-        ap_small = define_aperture(apgroup, False, small_ap)
-        ap_big = define_aperture(apgroup, False, big_ap)
-
-        cad = flux_array.shape[0]
-        mag = np.zeros(cad)
-        mag_small = np.zeros(cad)
-        mag_big = np.zeros(cad)
-
-        time = np.array(hdu_list[1].data['TIME'])
-        for d in range(cad):
-            mag[d] = flux_aperture(api, flux_array[d,:,:])
-            mag_small[d] = flux_aperture(ap_small, flux_array[d,:,:])
-            mag_big[d] = flux_aperture(ap_big, flux_array[d,:,:])
+        if centroids:
+            mags, centroid = aperture_photometry(flux_array, [api], centroid_apertures=[api])
+            mag = mags[0]
+            centroid = centroid[0]
+        else:
+            mag = aperture_photometry(flux_array, [api])[0]
+            centroid = np.empty((0, len(time)))
+        box_mags = centered_box_photometry(flux_array, [small_ap, big_ap] + extra_sizes)
+        mag_small = box_mags[0]
+        mag_big = box_mags[1]
+        mag_apertures = box_mags[2:]
 
-        if 'QUALITY' in fits.getdata(filename, ext=1).columns.names:
-            quality_flag = np.where(np.array(hdu_list[1].data['QUALITY']) == 0)
+        if 'QUALITY' in hdu_list[1].columns.names:
+            quality_flag = np.where(_to_native(table['QUALITY']) == 0)
 
             # Remove outliers
             time = time[quality_flag]
             mag = mag[quality_flag]
             mag_small = mag_small[quality_flag]
             mag_big = mag_big[quality_flag]
+            mag_apertures = mag_apertures[:, quality_flag[0]]
+            centroid = centroid[:, quality_flag[0]]
 
             # Remove NaN flux values.
             valid_indices = np.where(np.isfinite(mag) & np.isfinite(mag_small) & np.isfinite(mag_big)
@@ -140,6 +442,8 @@ def read_tess_light_curve(filename, flux_key='KSPMagnitude', invert=True):
                 mag = mag[valid_indices]
                 mag_small = mag_small[valid_indices]
                 mag_big = mag_big[valid_indices]
+                mag_apertures = mag_apertures[:, valid_indices[0]]
+                centroid = centroid[:, valid_indices[0]]
 
         else:
             # manually remove sector 1 outliers
@@ -167,7 +471,9 @@ def read_tess_light_curve(filename, flux_key='KSPMagnitude', invert=True):
                 1208, 1209, 1210, 1214, 1225, 1226, 1231, 1232, 1233, 1235, 1258,
                 1278, 1279, 1280])
 
-            bad = bad[bad < len(time)]
+            # The indices are rows of the full table.
+            bad = bad - (rows.start or 0)
+            bad = bad[(bad >= 0) & (bad < len(time))]
             mask = np.ones(len(time))
             mask[bad] = 0
             mask = mask.astype(bool)
@@ -175,15 +481,32 @@ def read_tess_light_curve(filename, flux_key='KSPMagnitude', invert=True):
             mag = mag[mask]
             mag_small = mag_small[mask]
             mag_big = mag_big[mask]
+            mag_apertures = mag_apertures[:, mask]
+            centroid = centroid[:, mask]
 
             valid_indices = np.where(np.isfinite(mag) & np.isfinite(mag_small) & np.isfinite(mag_big))
             time = time[valid_indices]
             mag = mag[valid_indices]
             mag_small = mag_small[valid_indices]
             mag_big = mag_big[valid_indices]
-
+            mag_apertures = mag_apertures[:, valid_indices[0]]
+            centroid = centroid[:, valid_indices[0]]
+
+    if t_min is not None or t_max is not None:
+        timed = np.isfinite(time)
+        time = time[timed]
+        mag = mag[timed]
+        mag_small = mag_small[timed]
+        mag_big = mag_big[timed]
+        mag_apertures = mag_apertures[:, timed]
+        centroid = centroid[:, timed]
 
     if invert:
         mag *= -1
 
-    return time, mag, mag_small, mag_big
+    outputs = [time, mag, mag_small, mag_big]
+    if app_sizes is not None:
+        outputs.append(mag_apertures)
+    if centroids:
+        outputs.append(centroid)
+    return tuple(outputs)
@@ -0,0 +1,92 @@
+# Copyright 2018 Liang Yu.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Benchmarks batched aperture photometry against the per-cadence loop.
+
+Usage:
+  python light_curve_util/tess_io_benchmark.py --cadences 1000 5000 20000
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import numpy as np
+
+from light_curve_util import tess_io
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument(
+    "--cadences",
+    type=int,
+    nargs="+",
+    default=[1000, 5000, 20000],
+    help="Numbers of cadences to benchmark.")
+
+parser.add_argument(
+    "--shape",
+    type=int,
+    nargs=2,
+    default=[11, 11],
+    help="Number of rows and columns of each target pixel frame.")
+
+parser.add_argument(
+    "--repeats",
+    type=int,
+    default=3,
+    help="Number of timing repeats; the best time is reported.")
+
+
+def _loop_photometry(flux_cube, apertures):
+  """Per-cadence photometry, as previously done in read_tess_light_curve()."""
+  sums = np.zeros((len(apertures), len(flux_cube)))
+  for d in range(len(flux_cube)):
+    for i, ap in enumerate(apertures):
+      sums[i, d] = tess_io.flux_aperture(ap, flux_cube[d, :, :])
+  return sums
+
+
+def main():
+  flags = parser.parse_args()
+  rng = np.random.RandomState(0)
+  num_rows, num_cols = flags.shape
+  ap_opt = (rng.uniform(size=(num_rows, num_cols)) > 0.5).astype(int)
+  apertures = [
+      ap_opt,
+      tess_io.define_aperture(ap_opt, False, 3),
+      tess_io.define_aperture(ap_opt, False, 5),
+  ]
+
+  print("%10s %12s %12s %10s" % ("cadences", "loop (s)", "batched (s)",
+                                 "speedup"))
+  for num_cadences in flags.cadences:
+    flux_cube = rng.normal(
+        100, 5, size=(num_cadences, num_rows, num_cols)).astype(">f4")
+    loop_time = min(timeit.repeat(
+        lambda: _loop_photometry(flux_cube, apertures),
+        number=1, repeat=flags.repeats))
+    batch_time = min(timeit.repeat(
+        lambda: tess_io.aperture_photometry(flux_cube, apertures),
+        number=1, repeat=flags.repeats))
+    print("%10d %12.4f %12.4f %9.1fx" % (num_cadences, loop_time, batch_time,
+                                         loop_time / batch_time))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,211 @@
+# Copyright 2018 Liang Yu.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for tess_io.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+
+from absl.testing import absltest
+from astropy.io import fits
+import numpy as np
+
+from light_curve_util import tess_io
+
+
+class TessIoTest(absltest.TestCase):
+
+  def testApertureMask(self):
+    rng = np.random.RandomState(3)
+    ap = rng.randint(0, 512, size=(6, 8)).astype(np.int32)
+
+    optimal = tess_io.aperture_mask(ap)
+    expected = np.array([np.binary_repr(v, width=9)[-2] == "1"
+                         for v in ap.flatten()]).reshape(ap.shape)
+    np.testing.assert_array_equal(expected, optimal)
+    np.testing.assert_array_equal(
+        expected.astype(int), tess_io.define_aperture(ap, True, 0))
+
+    bits = [
+        tess_io.APERTURE_BACKGROUND,
+        tess_io.APERTURE_CENTROID | tess_io.APERTURE_OPTIMAL,
+    ]
+    masks = tess_io.aperture_mask(ap, bits)
+    self.assertEqual((2, 6, 8), masks.shape)
+    np.testing.assert_array_equal(ap & 4 != 0, masks[0])
+    np.testing.assert_array_equal(ap & 10 != 0, masks[1])
+    np.testing.assert_array_equal(
+        ap & 10 == 10, tess_io.aperture_mask(ap, bits[1], require_all=True))
+
+    # Big-endian FITS data.
+    np.testing.assert_array_equal(optimal,
+                                  tess_io.aperture_mask(ap.astype(">i4")))
+
+  def testAperturePhotometry(self):
+    rng = np.random.RandomState(0)
+    flux_cube = rng.normal(100, 5, size=(50, 11, 11)).astype(np.float32)
+    flux_cube[3, 0, 0] = np.nan  # Outside all apertures.
+    flux_cube[7, 5, 5] = np.nan  # Inside all apertures.
+    flux_cube[9, 4, 4] = np.inf  # Inside the 3x3 and 5x5 apertures.
+
+    ap_opt = (rng.uniform(size=(11, 11)) > 0.5).astype(int)
+    ap_opt[5, 5] = 1
+    ap_opt[0, 0] = 0
+    ap_opt[4, 4] = 0
+    apertures = [
+        ap_opt,
+        tess_io.define_aperture(ap_opt, False, 3),
+        tess_io.define_aperture(ap_opt, False, 5),
+    ]
+
+    sums = tess_io.aperture_photometry(flux_cube, apertures)
+    self.assertEqual(sums.shape, (3, 50))
+    for i, ap in enumerate(apertures):
+      expected = [tess_io.flux_aperture(ap, frame) for frame in flux_cube]
+      np.testing.assert_allclose(expected, sums[i], rtol=1e-6)
+
+    self.assertTrue(np.isfinite(sums[:, 3]).all())
+    self.assertTrue(np.isnan(sums[:, 7]).all())
+    self.assertTrue(np.isfinite(sums[0, 9]))
+    self.assertEqual(sums[1, 9], np.inf)
+
+    # Contract the cube in chunks of a few cadences.
+    self.addCleanup(setattr, tess_io, "_PHOTOMETRY_CHUNK_SIZE",
+                    tess_io._PHOTOMETRY_CHUNK_SIZE)
+    tess_io._PHOTOMETRY_CHUNK_SIZE = 500
+    np.testing.assert_array_equal(
+        sums, tess_io.aperture_photometry(flux_cube, apertures))
+
+  def testAperturePhotometryCentroids(self):
+    rng = np.random.RandomState(4)
+    flux_cube = rng.uniform(1, 2, size=(30, 6, 5)).astype(np.float32)
+    flux_cube[2, 4, 3] = np.nan  # Inside the aperture.
+    flux_cube[5, 0, 0] = np.nan  # Outside the aperture.
+    ap = np.zeros((6, 5), dtype=int)
+    ap[1:5, 1:4] = 1
+
+    sums, centroids = tess_io.aperture_photometry(
+        flux_cube, [ap], centroid_apertures=[ap])
+    np.testing.assert_array_equal(tess_io.aperture_photometry(flux_cube, [ap]),
+                                  sums)
+    self.assertEqual((1, 2, 30), centroids.shape)
+
+    rows, cols = np.indices(ap.shape)
+    for d in range(30):
+      if d == 2:
+        self.assertTrue(np.isnan(centroids[0, :, d]).all())
+        continue
+      weights = np.where(ap == 1, flux_cube[d], 0)
+      np.testing.assert_allclose(
+          [np.sum(weights * rows) / np.sum(weights),
+           np.sum(weights * cols) / np.sum(weights)],
+          centroids[0, :, d],
+          rtol=1e-6)
+
+  def testCenteredBoxPhotometry(self):
+    rng = np.random.RandomState(1)
+    flux_cube = rng.normal(100, 5, size=(20, 11, 9)).astype(np.float32)
+    flux_cube[4, 0, 0] = np.nan  # Outside all apertures.
+    flux_cube[6, 5, 4] = np.nan  # Inside all apertures.
+    flux_cube[8, 4, 3] = np.inf  # Inside the 3x3 and 5x5 apertures.
+
+    sums = tess_io.centered_box_photometry(flux_cube, [1, 3, 5, (3, 7)])
+    self.assertEqual(sums.shape, (4, 20))
+
+    for i, app_size in enumerate([1, 3, 5]):
+      ap = tess_io.define_aperture(flux_cube[0], False, app_size)
+      expected = [tess_io.flux_aperture(ap, frame) for frame in flux_cube]
+      np.testing.assert_allclose(expected, sums[i], rtol=1e-6)
+
+    expected = np.sum(flux_cube[:, 4:7, 1:8], axis=(1, 2), dtype=np.float64)
+    np.testing.assert_allclose(expected, sums[3], rtol=1e-6)
+
+    self.assertTrue(np.isfinite(sums[:, 4]).all())
+    self.assertTrue(np.isnan(sums[:, 6]).all())
+    np.testing.assert_array_equal([np.inf] * 3, sums[1:, 8])
+
+    # Sum the pixels in chunks of a few cadences.
+    self.addCleanup(setattr, tess_io, "_PHOTOMETRY_CHUNK_SIZE",
+                    tess_io._PHOTOMETRY_CHUNK_SIZE)
+    tess_io._PHOTOMETRY_CHUNK_SIZE = 100
+    np.testing.assert_array_equal(
+        sums, tess_io.centered_box_photometry(flux_cube, [1, 3, 5, (3, 7)]))
+
+  def testCenteredBoxPhotometryFrameEdges(self):
+    rng = np.random.RandomState(3)
+    flux_cube = rng.normal(100, 5, size=(10, 6, 5)).astype(np.float32)
+    flux_cube[2, 5, 4] = np.nan
+    flux_cube[3, 3, 4] = -np.inf
+
+    # Apertures as big as or bigger than the frame are sliced as in
+    # define_aperture().
+    app_sizes = [3, 5, 7, 9, 13]
+    sums = tess_io.centered_box_photometry(flux_cube, app_sizes)
+    for i, app_size in enumerate(app_sizes):
+      ap = tess_io.define_aperture(flux_cube[0], False, app_size)
+      expected = [tess_io.flux_aperture(ap, frame) for frame in flux_cube]
+      np.testing.assert_allclose(expected, sums[i], rtol=1e-6)
+
+  def testCenteredBoxPhotometryRectangles(self):
+    flux_cube = np.ones((3, 5, 5))
+    sums = tess_io.centered_box_photometry(flux_cube, [(1, 3), (3, 5), (5, 1)])
+    np.testing.assert_array_equal([[3, 3, 3], [15, 15, 15], [5, 5, 5]], sums)
+
+  def testTimeWindow(self):
+    time = np.array([1., 2., np.nan, np.nan, 5., 6., np.nan, 8.])
+    self.assertEqual(slice(None), tess_io.time_window(time))
+    self.assertEqual(slice(1, 7), tess_io.time_window(time, 1.5, 6))
+    self.assertEqual(slice(4, 8), tess_io.time_window(time, 3))
+    self.assertEqual(slice(0, 4), tess_io.time_window(time, t_max=4))
+    self.assertEqual(slice(8, 8), tess_io.time_window(time, 9))
+
+  def testReadTessLightCurveTimeWindow(self):
+    tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmp_dir)
+    filename = os.path.join(tmp_dir, "tp.fits")
+
+    rng = np.random.RandomState(2)
+    num_cadences = 100
+    time = 1000 + np.arange(num_cadences) * 0.1
+    time[[10, 60]] = np.nan
+    flux = rng.normal(100, 5, size=(num_cadences, 7, 7)).astype(np.float32)
+    quality = np.zeros(num_cadences, dtype=np.int32)
+    quality[[20, 70]] = 16
+    aperture = np.full((7, 7), 1 | 4, dtype=np.int32)
+    aperture[2:5, 2:5] |= 2
+    fits.HDUList([
+        fits.PrimaryHDU(),
+        fits.BinTableHDU.from_columns([
+            fits.Column("TIME", "D", array=time),
+            fits.Column("FLUX", "49E", dim="(7,7)", array=flux),
+            fits.Column("QUALITY", "J", array=quality),
+        ]),
+        fits.ImageHDU(aperture),
+    ]).writeto(filename)
+
+    full = tess_io.read_tess_light_curve(filename, app_sizes=[1])
+    window = tess_io.read_tess_light_curve(filename, app_sizes=[1], t_min=1005)
+    in_window = full[0] >= 1005
+    self.assertEqual(np.sum(in_window), len(window[0]))
+    for expected, actual in zip(full, window):
+      np.testing.assert_array_equal(expected[..., in_window], actual)
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -18,6 +18,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+
 import numpy as np
 from six.moves import range  # pylint:disable=redefined-builtin
 
@@ -67,17 +69,20 @@ def split(all_time, all_flux, gap_width=0.75):
   out_time = []
   out_flux = []
   for time, flux in zip(all_time, all_flux):
-    start = 0
-    for end in range(1, len(time) + 1):
-      # Choose the largest endpoint such that time[start:end] has no gaps.
-      if end == len(time) or time[end] - time[end - 1] > gap_width:
-        out_time.append(time[start:end])
-        out_flux.append(flux[start:end])
-        start = end
+    if not len(time):
+      continue
+    # Split after each point that is followed by a gap.
+    ends = np.flatnonzero(np.diff(time) > gap_width) + 1
+    out_time.extend(np.split(time, ends))
+    out_flux.extend(np.split(flux, ends))
 
   return out_time, out_flux
 
 
+# Maximum number of elements of the (event, point) arrays in remove_events().
+_EVENT_MASK_CHUNK_SIZE = 2**22
+
+
 def remove_events(all_time, all_flux, events, width_factor=1.0):
   """Removes events from a light curve.
 
@@ -106,22 +111,30 @@ def remove_events(all_time, all_flux, events, width_factor=1.0):
   else:
     single_segment = False
 
-  output_time = []
-  output_flux = []
-  for time, flux in zip(all_time, all_flux):
-    mask = np.ones_like(time, dtype=np.bool)
-    for event in events:
-      transit_dist = np.abs(phase_fold_time(time, event.period, event.t0))
-      mask = np.logical_and(mask,
-                            transit_dist > 0.5 * width_factor * event.duration)
-
-    if single_segment:
-      output_time = time[mask]
-      output_flux = flux[mask]
-    else:
-      output_time.append(time[mask])
-      output_flux.append(flux[mask])
-
+  # All segments are masked at once, and the events in chunks small enough to
+  # bound the memory of the (event, point) arrays.
+  lengths = [len(time) for time in all_time]
+  time = np.concatenate(all_time) if lengths else np.array([])
+  mask = np.ones_like(time, dtype=np.bool_)
+  period = np.array([event.period for event in events], dtype=np.float64)
+  t0 = np.array([event.t0 for event in events], dtype=np.float64)
+  half_width = np.array(
+      [0.5 * width_factor * event.duration for event in events],
+      dtype=np.float64)
+  chunk = max(1, _EVENT_MASK_CHUNK_SIZE // max(len(time), 1))
+  for i in range(0, len(events), chunk):
+    # Same arithmetic as phase_fold_time().
+    half_period = period[i:i + chunk, np.newaxis] / 2
+    transit_dist = np.abs(
+        np.mod(time + (half_period - t0[i:i + chunk, np.newaxis]),
+               period[i:i + chunk, np.newaxis]) - half_period)
+    mask &= np.all(transit_dist > half_width[i:i + chunk, np.newaxis], axis=0)
+
+  masks = np.split(mask, np.cumsum(lengths)[:-1])
+  output_time = [time[mask] for time, mask in zip(all_time, masks)]
+  output_flux = [flux[mask] for flux, mask in zip(all_flux, masks)]
+  if single_segment:
+    return output_time[0], output_flux[0]
   return output_time, output_flux
 
 
@@ -145,59 +158,353 @@ def interpolate_masked_spline(all_time, all_masked_time, all_masked_spline):
     if masked_time.size:
       interp_spline.append(np.interp(time, masked_time, masked_spline))
     else:
-      interp_spline.append(np.array([np.nan] * len(time)))
+      interp_spline.append(np.full(len(time), np.nan))
   return interp_spline
 
 
-def count_transit_points(time, event):
+def _transit_midpoints(time, event, max_transits):
+  """Returns the midpoints of the transits between the first and last times."""
+  t_min = np.min(time)
+  t_max = np.max(time)
+
+  # Tiny periods or erroneous time values could exhaust memory.
+  if (t_max - t_min) / event.period > max_transits:
+    raise ValueError(
+        "Too many transits! Time range is [%.2f, %.2f] and period is %.2e." %
+        (t_min, t_max, event.period))
+
+  # Make sure t0 is in [t_min, t_min + period).
+  t0 = np.mod(event.t0 - t_min, event.period) + t_min
+  return np.arange(t0, t_max, event.period)
+
+
+def count_transit_points(time, event, max_transits=10**6):
   """Computes the number of points in each transit of a given event.
 
   Args:
     time: Sorted numpy array of time values.
     event: An Event object.
+    max_transits: Maximum number of transits between the first and last time
+        values.
 
   Returns:
     A numpy array containing the number of time points "in transit" for each
     transit occurring between the first and last time values.
 
   Raises:
-    ValueError: If there are more than 10**6 transits.
+    ValueError: If there are more than max_transits transits.
   """
-  t_min = np.min(time)
-  t_max = np.max(time)
+  midpoints = _transit_midpoints(time, event, max_transits)
 
-  # Tiny periods or erroneous time values could make this loop take forever.
-  if (t_max - t_min) / event.period > 10**6:
-    raise ValueError(
-        "Too many transits! Time range is [%.2f, %.2f] and period is %.2e." %
-        (t_min, t_max, event.period))
+  # The points in transit k are time[begin[k]:end[k]], including the points
+  # exactly at the ends of the transit.
+  begin = np.searchsorted(time, midpoints - event.duration / 2, side="left")
+  end = np.searchsorted(time, midpoints + event.duration / 2, side="right")
+  return end - begin
 
-  # Make sure t0 is in [t_min, t_min + period).
-  t0 = np.mod(event.t0 - t_min, event.period) + t_min
 
-  # Prepare loop variables.
-  points_in_transit = []
-  i, j = 0, 0
+# Statistics of the individual transits of an event; see transit_stats().
+TransitStats = collections.namedtuple("TransitStats", [
+    "midpoint", "num_points", "mean_flux", "baseline", "num_baseline_points",
+    "snr"
+])
 
-  for transit_midpoint in np.arange(t0, t_max, event.period):
-    transit_begin = transit_midpoint - event.duration / 2
-    transit_end = transit_midpoint + event.duration / 2
 
-    # Move time[i] to the first point >= transit_begin.
-    while time[i] < transit_begin:
-      # transit_begin is guaranteed to be < np.max(t) (provided duration >= 0).
-      # Therefore, i cannot go out of range.
-      i += 1
+def transit_stats(time, flux, event, baseline_durations=1.0,
+                  max_transits=10**6):
+  """Computes statistics of each individual transit of a given event.
 
-    # Move time[j] to the first point > transit_end.
-    while time[j] <= transit_end:
-      j += 1
-      # j went out of range. We're finished.
-      if j >= len(time):
-        break
+  The windows of all transits are found with np.searchsorted, and the flux
+  sums over each window are differences of prefix sums, so the cost is
+  O(len(time) + number of transits) regardless of the period.
 
-    # The points in the current transit duration are precisely time[i:j].
-    # Since j is an exclusive index, there are exactly j-i points in transit.
-    points_in_transit.append(j - i)
+  The baseline of a transit is the mean flux in the windows of
+  baseline_durations * event.duration just before and just after it. The
+  single-transit SNR is the depth below the baseline divided by its standard
+  error, estimated from the scatter of the baseline points. If the period is
+  shorter than (1 + 2 * baseline_durations) * event.duration, the baseline
+  windows overlap the neighboring transits.
 
-  return np.array(points_in_transit)
+  Args:
+    time: Sorted numpy array of time values.
+    flux: Numpy array of flux values with the same size as time. Points with
+        non-finite flux are ignored.
+    event: An Event object.
+    baseline_durations: Width of the baseline windows on each side of a
+        transit, in units of the event duration.
+    max_transits: Maximum number of transits between the first and last time
+        values.
+
+  Returns:
+    A TransitStats of numpy arrays with one element for each transit occurring
+    between the first and last time values:
+      midpoint: The time of the center of the transit.
+      num_points: The number of points in transit with finite flux.
+      mean_flux: The mean in-transit flux, or NaN if there are no points.
+      baseline: The mean flux in the baseline windows, or NaN if there are no
+          points.
+      num_baseline_points: The number of points in the baseline windows.
+      snr: (baseline - mean_flux) / (baseline_std / sqrt(num_points)), or NaN
+          if there are fewer than 2 baseline points.
+
+  Raises:
+    ValueError: If there are more than max_transits transits.
+  """
+  time = np.asarray(time)
+  flux = np.asarray(flux, dtype=np.float64)
+  valid = np.isfinite(flux)
+  if not np.all(valid):
+    time = time[valid]
+    flux = flux[valid]
+  midpoints = _transit_midpoints(time, event, max_transits)
+
+  half_duration = event.duration / 2
+  baseline_width = baseline_durations * event.duration
+  left = np.searchsorted(
+      time,
+      np.concatenate([midpoints - half_duration - baseline_width,
+                      midpoints - half_duration]),
+      side="left")
+  right = np.searchsorted(
+      time,
+      np.concatenate([midpoints + half_duration,
+                      midpoints + half_duration + baseline_width]),
+      side="right")
+  # The points in transit k are time[begin[k]:end[k]], and its baseline points
+  # are time[before[k]:begin[k]] and time[end[k]:after[k]].
+  before, begin = np.split(left, 2)
+  end, after = np.split(right, 2)
+
+  # Prefix sums about the mean flux, to limit cancellation in the variances.
+  mean_flux = np.mean(flux)
+  residual = flux - mean_flux
+  cum_flux = np.concatenate([[0], np.cumsum(residual)])
+  cum_squares = np.concatenate([[0], np.cumsum(residual**2)])
+
+  num_points = end - begin
+  num_baseline = (begin - before) + (after - end)
+  sum_in = cum_flux[end] - cum_flux[begin]
+  sum_baseline = (cum_flux[begin] - cum_flux[before]) + (
+      cum_flux[after] - cum_flux[end])
+  squares_baseline = (cum_squares[begin] - cum_squares[before]) + (
+      cum_squares[after] - cum_squares[end])
+
+  with np.errstate(divide="ignore", invalid="ignore"):
+    mean_in = sum_in / num_points
+    baseline = sum_baseline / num_baseline
+    baseline_var = np.maximum(squares_baseline - sum_baseline * baseline,
+                              0) / (num_baseline - 1)
+    snr = (baseline - mean_in) / np.sqrt(baseline_var / num_points)
+  snr[num_baseline < 2] = np.nan
+
+  return TransitStats(
+      midpoint=midpoints,
+      num_points=num_points,
+      mean_flux=mean_in + mean_flux,
+      baseline=baseline + mean_flux,
+      num_baseline_points=num_baseline,
+      snr=snr)
+
+
+def stitch(segments):
+  """Concatenates light curve segments into a single time-sorted light curve.
+
+  Each output array is allocated once and filled segment by segment, with the
+  segments ordered by their first time value. The output is only re-sorted if
+  the segments overlap in time.
+
+  Args:
+    segments: Non-empty sequence of tuples (time, values_1, ..., values_k) with
+        the same structure. time is a 1D numpy array, and each values array has
+        the time axis as its last axis.
+
+  Returns:
+    A tuple (time, values_1, ..., values_k) of numpy arrays, sorted by time
+    apart from any NaN time values.
+  """
+  starts = []
+  for segment in segments:
+    finite_time = segment[0][np.isfinite(segment[0])]
+    starts.append(finite_time[0] if finite_time.size else np.inf)
+  order = np.argsort(starts, kind="mergesort")
+  lengths = np.array([len(segments[i][0]) for i in order])
+  offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+  stitched = []
+  for k in range(len(segments[0])):
+    arrays = [np.asarray(segment[k]) for segment in segments]
+    result = np.empty(arrays[0].shape[:-1] + (offsets[-1],),
+                      dtype=np.result_type(*arrays))
+    for i, j in enumerate(order):
+      result[..., offsets[i]:offsets[i + 1]] = arrays[j]
+    stitched.append(result)
+
+  time = stitched[0]
+  if np.any(time[1:] < time[:-1]):
+    sorted_i = np.argsort(time, kind="mergesort")
+    stitched = [array[..., sorted_i] for array in stitched]
+  return tuple(stitched)
+
+
+def box_search(time, flux, durations, step_fraction=0.1, min_points=5):
+  """Evaluates box-shaped events over a grid of trial centers and durations.
+
+  For each trial duration d, box centers t0 are placed every step_fraction * d
+  in [time[0] + d, time[-1] - d). The flux inside each box is summed from a
+  prefix sum over flux, and the box edges of all trials are found with
+  np.searchsorted, so the cost is O(len(time) + number of trials * log
+  len(time)).
+
+  Args:
+    time: 1D numpy array of time values, sorted in ascending order.
+    flux: 1D numpy array of flux values, centered at zero.
+    durations: Scalar or 1D array of trial durations.
+    step_fraction: Spacing of the trial centers, as a fraction of the duration.
+    min_points: Trials with fewer than min_points points within one duration of
+        the center are discarded.
+
+  Returns:
+    t0: 1D numpy array of trial centers, ordered by duration (as given) and
+        then by center.
+    duration: 1D numpy array; the duration of each trial.
+    r: 1D numpy array; the number of points inside each box plus one, as a
+        fraction of len(time).
+    s: 1D numpy array; the sum of flux / len(time) inside each box.
+  """
+  num_points = len(time)
+  # Prefix sums of the terms summed for s; s of the points [i, j) is
+  # cum_flux[j] - cum_flux[i].
+  cum_flux = np.concatenate([[0], np.cumsum(flux / float(num_points))])
+
+  t0 = []
+  duration = []
+  for d in np.atleast_1d(durations):
+    grid = np.arange(time[0] + d, time[-1] - d, d * step_fraction)
+    window = np.searchsorted(time, np.concatenate([grid - d, grid + d]))
+    enough = window[len(grid):] - window[:len(grid)] >= min_points
+    t0.append(grid[enough])
+    duration.append(np.full(np.sum(enough), d))
+  t0 = np.concatenate(t0)
+  duration = np.concatenate(duration)
+
+  box = np.searchsorted(time,
+                        np.concatenate([t0 - duration / 2, t0 + duration / 2]))
+  start = box[:len(t0)]
+  end = box[len(t0):]
+  r = (end - start + 1) / float(num_points)
+  s = cum_flux[end] - cum_flux[start]
+  return t0, duration, r, s
+
+
+def transit_epochs(time, period, t0):
+  """Returns the index of the transit epoch of each time value.
+
+  Epoch k consists of the times in [t0 + (k - 1/2) * period,
+  t0 + (k + 1/2) * period), so the transit at t0 is in epoch 0.
+
+  Args:
+    time: 1D numpy array of time values.
+    period: A positive real scalar; the period of the transits.
+    t0: The center of a transit.
+
+  Returns:
+    A 1D numpy array of integers.
+  """
+  return np.floor((time - (t0 - period / 2)) / period).astype(np.int64)
+
+
+def epoch_depths(time,
+                 flux,
+                 period,
+                 t0,
+                 duration,
+                 full_duration=None,
+                 groups=None,
+                 num_groups=None,
+                 min_full_points=4):
+  """Measures box-shaped transit depths in groups of transit epochs.
+
+  The depth of a group is the mean out-of-transit flux minus the mean
+  in-transit flux of its points, as in a box fit to the phase-folded light
+  curve of the group. The sums of all groups are accumulated with np.bincount,
+  so the cost is a single linear pass, without folding or sorting each group.
+
+  By default, the groups are the odd (group 0) and even (group 1) transits,
+  counted from the transit at t0. Other groupings, such as per-sector depths,
+  are given as an integer label for each point.
+
+  Args:
+    time: 1D numpy array of time values, not phase folded.
+    flux: 1D numpy array of flux values.
+    period: A positive real scalar; the period of the transits.
+    t0: The center of a transit.
+    duration: The duration of the transit. Points within duration / 2 of a
+        transit center are in transit; the others are out of transit.
+    full_duration: Optional duration of the flat bottom of the transit. If
+        given, the in-transit flux of a group is averaged within
+        full_duration / 2 of the transit centers, unless the group has fewer
+        than min_full_points points there.
+    groups: Optional 1D numpy array of non-negative integers; the group of
+        each point. Defaults to transit_epochs(time, period, t0) % 2.
+    num_groups: Number of groups. Defaults to max(groups) + 1.
+    min_full_points: See full_duration.
+
+  Returns:
+    depth: 1D numpy array of size num_groups; the depth of each group, or NaN if
+        the group has no in-transit or no out-of-transit points.
+    depth_err: 1D numpy array of size num_groups; the standard error of depth,
+        from the scatter of the in-transit and out-of-transit flux. NaN if
+        either has fewer than 2 points.
+    num_in_transit: 1D numpy array of size num_groups; the number of in-transit
+        points used for each depth.
+  """
+  flux = np.asarray(flux, dtype=np.float64)
+
+  # Epochs as in transit_epochs(), and the distance of each point to the center
+  # of its epoch.
+  phase = (np.asarray(time) - (t0 - period / 2)) / period
+  epoch = np.floor(phase)
+  distance = np.abs(phase - epoch - 0.5) * period
+
+  if groups is None:
+    groups = epoch.astype(np.int64) % 2
+    num_groups = 2 if num_groups is None else num_groups
+  groups = np.asarray(groups, dtype=np.int64)
+  if num_groups is None:
+    num_groups = np.max(groups) + 1 if len(groups) else 0
+
+  # Each point falls into one of 3 classes: within full_duration / 2 of a
+  # transit center, within duration / 2 (but not full_duration / 2), or out of
+  # transit.
+  if full_duration is None:
+    full_duration = duration
+  key = 3 * groups
+  key += distance >= full_duration / 2
+  key += distance >= duration / 2
+
+  size = 3 * num_groups
+  # Sums are taken about the mean flux to limit cancellation in the variances.
+  residual = flux - np.mean(flux) if len(flux) else flux
+  counts = np.bincount(key, minlength=size).reshape(num_groups, 3)
+  sums = np.bincount(key, weights=residual, minlength=size).reshape(
+      num_groups, 3)
+  squares = np.bincount(key, weights=residual**2, minlength=size).reshape(
+      num_groups, 3)
+
+  full = counts[:, 0] >= min_full_points
+  n_in = np.where(full, counts[:, 0], counts[:, 0] + counts[:, 1])
+  sum_in = np.where(full, sums[:, 0], sums[:, 0] + sums[:, 1])
+  squares_in = np.where(full, squares[:, 0], squares[:, 0] + squares[:, 1])
+  n_out = counts[:, 2]
+  sum_out = sums[:, 2]
+  squares_out = squares[:, 2]
+
+  with np.errstate(divide="ignore", invalid="ignore"):
+    mean_in = sum_in / n_in
+    mean_out = sum_out / n_out
+    var_in = np.maximum(squares_in - sum_in * mean_in, 0) / (n_in - 1)
+    var_out = np.maximum(squares_out - sum_out * mean_out, 0) / (n_out - 1)
+    depth = mean_out - mean_in
+    depth_err = np.sqrt(var_in / n_in + var_out / n_out)
+  depth_err[(n_in < 2) | (n_out < 2)] = np.nan
+  return depth, depth_err, n_in
@@ -70,3 +70,115 @@ def robust_mean(y, cut):
   mean_stddev = sigma / np.sqrt(len(y) - 1.0)
 
   return mean, mean_stddev, mask
+
+
+def _trimmed_sigma_factor(cut):
+  """Returns the factor compensating the sample stddev for trimming at cut."""
+  sc = np.max([cut, 1.0])
+  if sc <= 4.5:
+    return 1 / (-0.15405 + 0.90723 * sc - 0.23584 * sc**2 + 0.020142 * sc**3)
+  return 1.0
+
+
+def _row_medians(y, counts):
+  """Computes the median of the first counts[i] sorted values of each row of y.
+
+  Args:
+    y: 2D numpy array. Padding values must sort after all other values, e.g.
+        they can be set to +inf.
+    counts: 1D numpy array; the number of values in each row, excluding padding.
+
+  Returns:
+    1D numpy array; the median of each row, or NaN for rows without values.
+  """
+  lower = np.maximum((counts - 1) // 2, 0)
+  upper = counts // 2
+  # A single selection over all rows finds both middle values of every row.
+  y = np.partition(y, np.unique(np.concatenate([lower, upper])), axis=1)
+  rows = np.arange(y.shape[0])
+  medians = 0.5 * (y[rows, lower] + y[rows, upper])
+  medians[counts == 0] = np.nan
+  return medians
+
+
+def _row_std(y, mask):
+  """Computes the mean and stddev of the masked values of each row of y."""
+  weights = mask.astype(y.dtype)
+  counts = np.sum(weights, axis=1)
+  with np.errstate(invalid="ignore", divide="ignore"):
+    mean = np.einsum("ij,ij->i", y, weights) / counts
+    dev = y - mean[:, np.newaxis]
+    dev *= weights
+    return mean, np.sqrt(np.einsum("ij,ij->i", dev, dev) / counts)
+
+
+def robust_mean_batch(y, cut, valid=None, axis=-1):
+  """Computes robust mean estimates of many arrays in the presence of outliers.
+
+  This is a vectorized version of robust_mean(), applied independently to each
+  1D slice of y along the given axis. Ragged arrays can be processed by padding
+  them to the same length and passing a mask of the valid values. The medians
+  are computed with a single np.partition() of all slices, rather than one
+  np.median() of each slice.
+
+  Args:
+    y: Numpy array. Each slice along axis is assumed to be normally distributed
+        with outliers. Values that are not masked out by valid must be finite;
+        the others are ignored.
+    cut: Points more than this number of standard deviations from the median are
+        ignored.
+    valid: Optional boolean numpy array with the same shape as y. Values of y
+        corresponding to False are ignored, e.g. padding.
+    axis: The axis of y along which to compute the robust mean.
+
+  Returns:
+    mean: Numpy array with the shape of y without axis; a robust estimate of
+        the mean of each slice, or NaN if the slice has no valid values.
+    mean_stddev: Numpy array with the shape of mean; the standard deviation of
+        the mean of each slice.
+    mask: Boolean array with the same shape as y. Values corresponding to
+        outliers or invalid values of y are False. All other values are True.
+  """
+  y = np.moveaxis(np.asarray(y, dtype=np.float64), axis, -1)
+  shape = y.shape
+  y = y.reshape(-1, shape[-1])
+
+  # Robust estimate of the standard deviation of each slice from the median
+  # absolute deviation, as in robust_mean(). Invalid values are set to +inf so
+  # that they are sorted after all valid values.
+  if valid is None:
+    counts = np.full(y.shape[0], y.shape[1])
+    median = _row_medians(y, counts)
+    absdev = np.abs(y - median[:, np.newaxis])
+  else:
+    valid = np.moveaxis(np.asarray(valid, dtype=bool), axis, -1)
+    valid = valid.reshape(y.shape)
+    counts = np.sum(valid, axis=1)
+    median = _row_medians(np.where(valid, y, np.inf), counts)
+    y = np.where(valid, y, 0)  # Padding may be non-finite.
+    absdev = np.where(valid, np.abs(y - median[:, np.newaxis]), np.inf)
+  sigma = 1.4826 * _row_medians(absdev, counts)
+
+  # Fall back to the mean absolute deviation where the median absolute
+  # deviation is zero.
+  fallback = sigma < 1.0e-24
+  if np.any(fallback):
+    finite_absdev = absdev if valid is None else np.where(valid, absdev, 0)
+    with np.errstate(invalid="ignore"):
+      mean_absdev = np.sum(finite_absdev, axis=1) / counts
+    sigma = np.where(fallback, 1.253 * mean_absdev, sigma)
+
+  # Twice identify outliers and recompute the compensated standard deviation
+  # of the non-outlier points.
+  sigma_factor = _trimmed_sigma_factor(cut)
+  mask = absdev <= cut * sigma[:, np.newaxis]
+  sigma = _row_std(y, mask)[1] * sigma_factor
+  mask = absdev <= cut * sigma[:, np.newaxis]
+  mean, sigma = _row_std(y, mask)
+  sigma *= sigma_factor
+
+  with np.errstate(invalid="ignore", divide="ignore"):
+    mean_stddev = sigma / np.sqrt(counts - 1.0)
+
+  mask = np.moveaxis(mask.reshape(shape), -1, axis)
+  return mean.reshape(shape[:-1]), mean_stddev.reshape(shape[:-1]), mask
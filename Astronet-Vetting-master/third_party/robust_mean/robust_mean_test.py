@@ -60,6 +60,47 @@ class RobustMeanTest(absltest.TestCase):
     self.assertEqual(np.sum(mask), 1000)
     self.assertFalse(mask[1000])
 
+  def testRobustMeanBatch(self):
+    y = np.array(random_normal.RANDOM_NORMAL)
+    rows = [
+        y,
+        np.concatenate([y, [10] * 10]),
+        np.concatenate([y, [-1000]]),
+        y[:500],
+        np.concatenate([[1] * 600, [2] * 10]),  # Median absolute deviation 0.
+    ]
+
+    # Pad the rows with NaN.
+    padded = np.full((len(rows), 1010), np.nan)
+    valid = np.zeros_like(padded, dtype=bool)
+    for i, row in enumerate(rows):
+      padded[i, :len(row)] = row
+      valid[i, :len(row)] = True
+
+    mean, mean_stddev, mask = robust_mean.robust_mean_batch(
+        padded, cut=3, valid=valid)
+    self.assertEqual((5,), mean.shape)
+    self.assertEqual((5,), mean_stddev.shape)
+    self.assertEqual((5, 1010), mask.shape)
+    self.assertFalse(np.any(mask[~valid]))
+    for i, row in enumerate(rows):
+      expected_mean, expected_mean_stddev, expected_mask = (
+          robust_mean.robust_mean(row, cut=3))
+      self.assertAlmostEqual(expected_mean, mean[i])
+      self.assertAlmostEqual(expected_mean_stddev, mean_stddev[i])
+      np.testing.assert_array_equal(expected_mask, mask[i, :len(row)])
+
+    # Compute along the first axis, without padding.
+    y = np.stack([y, y[::-1] * 2, y + 10], axis=1)
+    mean, mean_stddev, mask = robust_mean.robust_mean_batch(y, cut=3, axis=0)
+    self.assertEqual((1000, 3), mask.shape)
+    for i in range(3):
+      expected_mean, expected_mean_stddev, expected_mask = (
+          robust_mean.robust_mean(y[:, i], cut=3))
+      self.assertAlmostEqual(expected_mean, mean[i])
+      self.assertAlmostEqual(expected_mean_stddev, mean_stddev[i])
+      np.testing.assert_array_equal(expected_mask, mask[:, i])
+
 
 if __name__ == "__main__":
   absltest.main()